@@ -0,0 +1,191 @@
+from itertools import combinations
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from func import batch_spearman_correlation
+from load import RaggedSeries, make_time_grid, record_user_ids
+
+COMPOSER_LABEL = "KOMPOZYTOR"
+UNKNOWN_TAG = "unknown"
+ALL_GROUPS = "*"  # Wartość tagu spoza kombinacji (wiersz zbiorczy)
+
+
+def record_correlations(
+    series_all: RaggedSeries,
+    series: Optional[RaggedSeries] = None,
+    align_rate_hz: float = 10,
+) -> pd.DataFrame:
+    """Spearman's rho of every record vs KOMPOZYTOR, computed once.
+
+    Records are aligned to the composer's time grid and first-differenced
+    (Z-score does not change ranks), then correlated in one batch.
+
+    Args:
+        series_all: all records, including KOMPOZYTOR
+        series: records to correlate (default: all except KOMPOZYTOR)
+        align_rate_hz: rate of the shared time grid
+
+    Returns:
+        DataFrame: record_id, label, correlation, p_value
+    """
+    if series is None:
+        series = series_all
+    series = series[series.index.get_level_values(1) != COMPOSER_LABEL]
+    composer = series_all.xs(COMPOSER_LABEL, level=1)
+
+    # Wyrównanie do wspólnej siatki czasu kompozytora (próbki są zdarzeniowe,
+    # więc porównywanie po pozycji w tablicy nie ma sensu)
+    start, end = composer.time_span()
+    grid = make_time_grid(start, end, align_rate_hz)
+    composer_diff = np.diff(composer.align_to_grid(grid)[:, 0])
+    aligned = np.diff(series.align_to_grid(grid), axis=0)
+
+    print(f"KOMPOZYTOR aligned length: {len(composer_diff)} (grid: {len(grid)})")
+
+    corr, p_value = batch_spearman_correlation(aligned, composer_diff)
+    return pd.DataFrame(
+        {
+            "record_id": series.index.get_level_values(0),
+            "label": series.index.get_level_values(1),
+            "correlation": corr,
+            "p_value": p_value,
+        }
+    )
+
+
+def age_bands(values: pd.Series, edges: Sequence[float]) -> pd.Series:
+    """Bin numeric ages into "low-high" bands; non-numeric answers are kept.
+
+    Forms that already store a band (e.g. "20-25") pass through unchanged.
+    """
+    numeric = pd.to_numeric(values, errors="coerce")
+    labels = [f"{low:g}-{high:g}" for low, high in zip(edges[:-1], edges[1:])]
+    banded = pd.cut(numeric, bins=list(edges), labels=labels, right=False)
+    return banded.astype(object).where(numeric.notna(), values)
+
+
+def join_tags(
+    df_corr: pd.DataFrame,
+    tags_df: pd.DataFrame,
+    tag_columns: Sequence[str],
+    age_column: Optional[str] = None,
+    age_edges: Optional[Sequence[float]] = None,
+) -> pd.DataFrame:
+    """Attach respondent tags (by userId parsed from record_id) to correlations.
+
+    Missing tags become UNKNOWN_TAG; records without a correlation are dropped.
+    """
+    tags_df = tags_df.reindex(columns=list(tag_columns))
+    if age_column in tags_df.columns and age_edges:
+        tags_df[age_column] = age_bands(tags_df[age_column], age_edges)
+
+    user_ids = record_user_ids(pd.Index(df_corr["record_id"]))
+    metadata = tags_df.reindex(user_ids).fillna(UNKNOWN_TAG)
+
+    joined = pd.concat(
+        [df_corr.reset_index(drop=True), metadata.reset_index(drop=True)], axis=1
+    )
+    return joined[~np.isnan(joined["correlation"])].reset_index(drop=True)
+
+
+def cohort_sweep(
+    df: pd.DataFrame,
+    tag_columns: Sequence[str],
+    alpha: float = 0.05,
+    max_order: Optional[int] = None,
+):
+    """Grouped correlation statistics for every combination of tag columns.
+
+    One group-by over the finest cells (all tags) collects sufficient
+    statistics: count, sum and sum of squares of rho, number of significant
+    records and the sum of global ranks of rho. Every coarser combination is
+    a sum over those cells, including the Kruskal-Wallis H test between its
+    groups (global ranks with tie correction, so the result equals
+    scipy.stats.kruskal on the same groups).
+
+    Args:
+        df: output of join_tags (correlation, p_value and tag columns)
+        tag_columns: tags to combine
+        alpha: significance threshold of the per-record p-value
+        max_order: largest number of tags in a combination (default: all)
+
+    Returns:
+        tuple: (groups, tests) DataFrames. groups - one row per group with
+        tag values (ALL_GROUPS for tags outside the combination), n, mean_rho,
+        std_rho, share_significant; tests - one row per combination with
+        n_groups, kruskal_h, kruskal_p.
+    """
+    from scipy.stats import chi2, rankdata
+
+    tag_columns = list(tag_columns)
+    max_order = len(tag_columns) if max_order is None else max_order
+
+    rho = df["correlation"].to_numpy(dtype=float)
+    ranks = rankdata(rho)
+    n_total = len(rho)
+    tie_correction = 0.0  # Mniej niż 2 rekordy - testy pomijane (kruskal_h = NaN)
+    if n_total > 1:
+        _, ties = np.unique(rho, return_counts=True)
+        tie_correction = 1 - (ties**3 - ties).sum() / (n_total**3 - n_total)
+
+    frame = (
+        df[tag_columns]
+        .astype(str)
+        .assign(
+            n=1,
+            rho_sum=rho,
+            rho_sq=rho**2,
+            n_significant=(df["p_value"].to_numpy() < alpha).astype(int),
+            rank_sum=ranks,
+        )
+    )
+    cells = frame.groupby(tag_columns, sort=False).sum().reset_index()
+
+    groups, tests = [], []
+    for order in range(max_order + 1):
+        for combo in combinations(tag_columns, order):
+            if combo:
+                stats = cells.groupby(list(combo), sort=True).sum(numeric_only=True)
+                stats = stats.reset_index()
+            else:
+                stats = cells.sum(numeric_only=True).to_frame().T
+            name = " × ".join(combo) if combo else "all"
+
+            n = stats["n"].to_numpy(dtype=float)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = stats["rho_sum"].to_numpy() / n
+                var = (stats["rho_sq"].to_numpy() - n * mean**2) / (n - 1)
+                share = stats["n_significant"].to_numpy() / n
+            block = pd.DataFrame(
+                {"combination": name, "order": order}, index=stats.index
+            )
+            for tag in tag_columns:
+                block[tag] = stats[tag] if tag in combo else ALL_GROUPS
+            block["n"] = stats["n"].astype(int)
+            block["mean_rho"] = mean
+            block["std_rho"] = np.sqrt(np.clip(var, 0, None))
+            block["share_significant"] = share
+            groups.append(block)
+
+            # Kruskal-Wallis z sum rang grup (rangi globalne)
+            n_groups = len(stats)
+            h_stat, p_value = np.nan, np.nan
+            if n_groups > 1 and tie_correction > 0:
+                h_stat = 12.0 / (n_total * (n_total + 1)) * np.sum(
+                    stats["rank_sum"].to_numpy() ** 2 / n
+                ) - 3 * (n_total + 1)
+                h_stat /= tie_correction
+                p_value = chi2.sf(h_stat, n_groups - 1)
+            tests.append(
+                {
+                    "combination": name,
+                    "order": order,
+                    "n_groups": n_groups,
+                    "kruskal_h": h_stat,
+                    "kruskal_p": p_value,
+                }
+            )
+
+    return pd.concat(groups, ignore_index=True), pd.DataFrame(tests)
@@ -56,3 +56,31 @@ def calculate_spearman_correlation(arr1, arr2):
         p_value = 2 * sp_stats.t.sf(abs(t_stat), n - 2)
 
     return rho, p_value
+
+
+def batch_spearman_correlation(matrix, reference):
+    """Spearman's rho with p-value of every column of ``matrix`` vs ``reference``.
+
+    All columns are ranked and correlated in one call (Pearson on average
+    ranks, so ties are handled exactly). Constant columns give NaN.
+    """
+    from scipy import stats as sp_stats
+
+    matrix = np.asarray(matrix, dtype=float)
+    n = len(reference)
+    if n < 3:
+        return np.zeros(matrix.shape[1]), np.ones(matrix.shape[1])
+
+    ranks = sp_stats.rankdata(matrix, axis=0)
+    ref_ranks = sp_stats.rankdata(reference)
+    ranks -= ranks.mean(axis=0)
+    ref_ranks -= ref_ranks.mean()
+
+    denom = np.sqrt((ranks**2).sum(axis=0) * (ref_ranks**2).sum())
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rho = np.clip((ranks.T @ ref_ranks) / denom, -1.0, 1.0)
+        t_stat = rho * np.sqrt((n - 2) / (1 - rho**2))
+    p_value = 2 * sp_stats.t.sf(np.abs(t_stat), n - 2)
+    p_value[np.abs(rho) == 1.0] = 0.0
+
+    return rho, p_value
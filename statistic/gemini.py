@@ -17,9 +17,106 @@ CONFIG = {
     "GRANGER_MAX_LAG_SEC": 4.0,  # Szukamy opóźnienia w zakresie 0-4s
     "GRANGER_P_VALUE_THRESHOLD": 0.05,
     "CLUSTER_THRESHOLD": 0.5,
+    "ROLLING_STABLE": True,  # Centrowanie kolumn przed sumami (False - bez centrowania)
 }
 
 
+def _window_sums(a, window, chunk=None):
+    """
+    Sumy w oknie przesuwnym (kolumnami) z sum prefiksowych.
+    Wiersz t zawiera sumę a[t - window + 1 : t + 1]; pierwsze window-1 wierszy = NaN.
+
+    chunk: jeśli podany, sumy prefiksowe są liczone od nowa w blokach
+    (wartości skumulowane nie rosną z długością nagrania, lepsze użycie cache).
+    """
+    T = a.shape[0]
+    out = np.full(a.shape, np.nan)
+    chunk = chunk or T
+
+    for start in range(window - 1, T, chunk):
+        end = min(start + chunk, T)
+        base = start - window + 1
+        csum = np.zeros((end - base + 1,) + a.shape[1:])
+        np.cumsum(a[base:end], axis=0, out=csum[1:])
+        out[start:end] = csum[window:] - csum[:-window]
+
+    return out
+
+
+def rolling_pearson(data, reference, lags, window, stable=True):
+    """
+    Korelacja Pearsona w oknie przesuwnym dla wszystkich słuchaczy w jednym przebiegu.
+
+    Args:
+        data: macierz (T, N) - słuchacze w kolumnach
+        reference: wektor (T,) - kompozytor
+        lags: opóźnienia (N,) w próbkach; kompozytor przesunięty jak Series.shift(lag)
+        window: długość okna w próbkach
+        stable: centrowanie kolumn przed sumowaniem (długie nagrania, duże offsety)
+
+    Returns:
+        Macierz (T, N); NaN gdy okno nie jest pełne (jak rolling(window).corr)
+    """
+    data = np.asarray(data, dtype=float)
+    reference = np.asarray(reference, dtype=float)
+    lags = np.asarray(lags, dtype=int)
+    T = data.shape[0]
+
+    # Macierz 2D kompozytora dopasowana do lagów przez przesunięcie indeksu
+    src = np.arange(T)[:, None] - lags[None, :]
+    y = reference[np.clip(src, 0, T - 1)]
+    y[(src < 0) | (src >= T)] = np.nan
+
+    valid = np.isfinite(data) & np.isfinite(y)
+    x = np.where(valid, data, 0.0)
+    y = np.where(valid, y, 0.0)
+
+    if stable:
+        counts = np.maximum(valid.sum(axis=0), 1)
+        x -= np.where(valid, x.sum(axis=0) / counts, 0.0)
+        y -= np.where(valid, y.sum(axis=0) / counts, 0.0)
+
+    chunk = max(4 * window, 4096)
+
+    n = _window_sums(valid.astype(float), window, chunk)
+    sx = _window_sums(x, window, chunk)
+    sy = _window_sums(y, window, chunk)
+    sxx = _window_sums(x * x, window, chunk)
+    syy = _window_sums(y * y, window, chunk)
+    sxy = _window_sums(x * y, window, chunk)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sy / window
+        var_x = sxx - sx * sx / window
+        var_y = syy - sy * sy / window
+        corr = cov / np.sqrt(var_x * var_y)
+
+    # Tylko pełne okna i niezerowa wariancja
+    corr[(n < window - 0.5) | ~(var_x > 0) | ~(var_y > 0)] = np.nan
+
+    return np.clip(corr, -1.0, 1.0)
+
+
+def plot_cloud(ax, x, values, max_points=2400, **line_kw):
+    """
+    Rysuje wszystkie kolumny macierzy (T × N) jako jedną LineCollection.
+    Każda seria jest decymowana min/max do max_points kubełków
+    (zachowuje obwiednię sygnału).
+    """
+    from matplotlib.collections import LineCollection
+    from raport.plotting import minmax_decimate
+
+    if len(values) > max_points:
+        x_out, y = minmax_decimate(x, values, max_points)
+    else:
+        x_out = np.broadcast_to(np.asarray(x)[:, None], values.shape)
+        y = values
+
+    segments = np.stack([x_out.T, y.T], axis=-1)
+    ax.add_collection(LineCollection(segments, **line_kw))
+    ax.autoscale_view()
+
+
 class MusicalTensionAnalyzer:
     def __init__(self, config):
         self.cfg = config
@@ -105,17 +202,25 @@ class MusicalTensionAnalyzer:
         print("--- [3/5] Rolling Correlation (Adaptacyjne Opóźnienie) ---")
 
         window_size = int(self.cfg["WINDOW_SECONDS"] * self.cfg["SAMPLING_RATE_HZ"])
-        rolling_corrs = pd.DataFrame(index=self.df_diff.index)
+        listeners = list(self.causal_listeners_lags.keys())
+        lags = [self.causal_listeners_lags[listener] for listener in listeners]
 
         composer_series = self.df_diff[self.cfg["COMPOSER_ID"]]
 
-        for listener, lag_samples in self.causal_listeners_lags.items():
-            # Indywidualne dopasowanie: Przesuwamy kompozytora o lag konkretnego słuchacza
-            # Shift dodatni na kompozytorze oznacza, że porównujemy Composer(t) z Listener(t+lag)
-            comp_shifted = composer_series.shift(lag_samples)
-
-            rc = self.df_diff[listener].rolling(window=window_size).corr(comp_shifted)
-            rolling_corrs[listener] = rc
+        # Indywidualne dopasowanie: Przesuwamy kompozytora o lag konkretnego słuchacza
+        # Shift dodatni na kompozytorze oznacza, że porównujemy Composer(t) z Listener(t+lag)
+        # Wszyscy słuchacze naraz (sumy prefiksowe x, y, x², y², xy)
+        rolling_corrs = pd.DataFrame(
+            rolling_pearson(
+                self.df_diff[listeners].to_numpy(dtype=float),
+                composer_series.to_numpy(dtype=float),
+                lags,
+                window_size,
+                stable=self.cfg.get("ROLLING_STABLE", True),
+            ),
+            index=self.df_diff.index,
+            columns=listeners,
+        )
 
         self.causal_avg_corr = rolling_corrs.mean(axis=1)
 
@@ -130,14 +235,15 @@ class MusicalTensionAnalyzer:
         )
 
         # Opcjonalnie: Rysujemy "chmurę" wszystkich korelacji, by pokazać dyspersję
-        for col in rolling_corrs.columns:
-            plt.plot(
-                self.df_pivot.index,
-                rolling_corrs[col],
-                color="green",
-                alpha=0.1,
-                linewidth=0.5,
-            )
+        # (jedna LineCollection, serie zdecymowane min/max do szerokości wykresu)
+        plot_cloud(
+            plt.gca(),
+            np.asarray(self.df_pivot.index, dtype=float),
+            rolling_corrs.to_numpy(dtype=float),
+            color="green",
+            alpha=0.1,
+            linewidth=0.5,
+        )
 
         plt.axhline(0, color="black", linestyle="--")
         plt.title(
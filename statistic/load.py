@@ -19,49 +19,198 @@ def read_csv_to_dict(filename: str) -> dict:
     return data_dict
 
 
-def load_ready_data(filepath) -> pd.Series:
+class RaggedSeries:
+    """Compact ragged container of per-record arrays.
+
+    All samples live in one contiguous ``values`` buffer (with a parallel
+    ``timestamps`` buffer). Segment ``i`` spans
+    ``values[starts[i]:starts[i] + lengths[i]]`` and is labelled by ``index[i]``
+    (a ``(record_id, label)`` MultiIndex). Filtering only selects segments -
+    the buffers are shared, never copied.
+    """
+
+    def __init__(
+        self, values, starts, lengths, index: pd.MultiIndex, timestamps=None
+    ):
+        self.values = values
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.index = index
+        self.timestamps = timestamps
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        keys=("record_id", "label"),
+        value_col: str = "value",
+        time_col: str = "timestamp",
+    ) -> "RaggedSeries":
+        """Build the container with a single sort and split of the long frame."""
+        keys = list(keys)
+        df = df.dropna(subset=keys)
+
+        grouped = df.groupby(keys, sort=True)
+        codes = grouped.ngroup().to_numpy()
+        sizes = grouped.size()
+
+        order = np.lexsort((df[time_col].to_numpy(), codes))
+        values = df[value_col].to_numpy()[order]
+        timestamps = df[time_col].to_numpy()[order]
+        lengths = sizes.to_numpy()
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+        return cls(values, starts, lengths, sizes.index, timestamps)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, key):
+        """``(record_id, label)`` -> array view; boolean mask -> filtered container."""
+        if isinstance(key, tuple):
+            return self.segment(self.index.get_loc(key))
+        mask = np.asarray(key, dtype=bool)
+        return RaggedSeries(
+            self.values,
+            self.starts[mask],
+            self.lengths[mask],
+            self.index[mask],
+            self.timestamps,
+        )
+
+    def segment(self, i: int) -> np.ndarray:
+        start = self.starts[i]
+        return self.values[start : start + self.lengths[i]]
+
+    def items(self):
+        for i, key in enumerate(self.index):
+            yield key, self.segment(i)
+
+    def xs(self, key, level: int = 1) -> "RaggedSeries":
+        """Segments whose index ``level`` equals ``key`` (no value copy)."""
+        return self[self.index.get_level_values(level) == key]
+
+    def to_series(self) -> pd.Series:
+        """Legacy view: Series of per-record array views."""
+        return pd.Series([arr for _, arr in self.items()], index=self.index)
+
+    def is_compact(self) -> bool:
+        expected = np.concatenate([[0], np.cumsum(self.lengths)[:-1]])
+        return len(self.values) == self.lengths.sum() and np.array_equal(
+            self.starts, expected
+        )
+
+    def compact(self) -> "RaggedSeries":
+        """Gather selected segments into a fresh contiguous buffer (one copy)."""
+        if self.is_compact():
+            return self
+        total = int(self.lengths.sum())
+        new_starts = np.concatenate([[0], np.cumsum(self.lengths)[:-1]])
+        gather = np.repeat(self.starts - new_starts, self.lengths) + np.arange(total)
+        timestamps = None if self.timestamps is None else self.timestamps[gather]
+        return RaggedSeries(
+            self.values[gather], new_starts, self.lengths, self.index, timestamps
+        )
+
+    def segment_ids(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def zscore(self) -> "RaggedSeries":
+        """Segment-wise Z-score (population std, like ``ndarray.std``)."""
+        rs = self.compact()
+        vals = rs.values.astype(float)
+        seg = rs.segment_ids()
+        n = np.maximum(rs.lengths, 1)
+
+        means = np.bincount(seg, weights=vals, minlength=len(rs)) / n
+        vals -= means[seg]
+        stds = np.sqrt(np.bincount(seg, weights=vals * vals, minlength=len(rs)) / n)
+        # Stałe segmenty zostają tylko wycentrowane
+        vals /= np.where(stds == 0, 1.0, stds)[seg]
+
+        return RaggedSeries(vals, rs.starts, rs.lengths, rs.index, rs.timestamps)
+
+    def first_difference(self) -> "RaggedSeries":
+        """Segment-wise first difference, 0 prepended to keep each length."""
+        rs = self.compact()
+        vals = rs.values.astype(float)
+        out = np.empty_like(vals)
+        out[1:] = np.diff(vals)
+
+        starts = rs.starts[rs.lengths > 0]
+        out[starts] = 0.0
+        # Segmenty jednoelementowe zostają bez zmian (jak wcześniej)
+        single = rs.starts[rs.lengths == 1]
+        out[single] = vals[single]
+
+        return RaggedSeries(out, rs.starts, rs.lengths, rs.index, rs.timestamps)
+
+    def time_span(self):
+        """(first, last) timestamp over all selected segments."""
+        rs = self.compact()
+        return rs.timestamps.min(), rs.timestamps.max()
+
+    def align_to_grid(self, grid) -> np.ndarray:
+        """Sample-and-hold every segment onto a shared time grid.
+
+        Slider samples are event-driven, so the value at grid point ``t`` is the
+        last sample at or before ``t``; grid points before a record's first
+        sample take that first sample (like ``bfill``).
+
+        Returns:
+            Matrix of shape (len(grid), len(self)), one column per segment
+        """
+        rs = self.compact()
+        grid = np.asarray(grid, dtype=float)
+
+        # Jeden searchsorted dla wszystkich segmentów: klucz (segment, czas)
+        origin = min(rs.timestamps.min(), grid.min())
+        ts = rs.timestamps.astype(float) - origin
+        rel_grid = grid - origin
+        span = max(ts.max(), rel_grid.max()) + 1.0
+
+        keys = rs.segment_ids() * span + ts
+        queries = np.arange(len(rs))[None, :] * span + rel_grid[:, None]
+        pos = np.searchsorted(keys, queries, side="right") - 1
+        pos = np.maximum(pos, rs.starts[None, :])
+
+        return rs.values[pos].astype(float)
+
+
+def make_time_grid(start, end, rate_hz: float) -> np.ndarray:
+    """Regular grid of millisecond timestamps covering [start, end]."""
+    step = 1000.0 / rate_hz
+    return np.arange(start, end + step / 2, step)
+
+
+def load_ready_data(filepath) -> RaggedSeries:
     print(f"--- 1. Wczytywanie danych: {filepath} ---")
     df = pd.read_csv(filepath, low_memory=False)
 
-    df = df.sort_values("timestamp")
-
-    # Group by record_id and label, convert to numpy arrays
-    # Result: Series with (record_id, label) as index, numpy array of values
-    grouped = df.groupby(["record_id", "label"])["value"].apply(
-        lambda x: np.array(x.values)
-    )
-    
-    return grouped
+    # Result: one values buffer split by (record_id, label), sorted by timestamp.
+    # Timestamps are kept alongside for time-grid alignment.
+    return RaggedSeries.from_frame(df)
 
 
-def standardize_data(series: pd.Series) -> pd.Series:
+def standardize_data(series: RaggedSeries) -> RaggedSeries:
     # STANDARYZACJA (Z-score) do obliczeń korelacji
-    # Apply standardization to each numpy array in the series
-    def standardize_array(arr):
-        # Convert to float to avoid integer division issues
-        arr = arr.astype(float)
-        mean = arr.mean()
-        std = arr.std()
-        if std == 0:
-            return arr - mean  # All values are the same
-        return (arr - mean) / std
-    
-    return series.apply(standardize_array)
+    return series.zscore()
 
 
-def difference_data(series: pd.Series) -> pd.Series:
+def difference_data(series: RaggedSeries) -> RaggedSeries:
     # Różnicowanie danych (First Difference)
-    # Apply first difference to each numpy array in the series
-    def diff_array(arr):
-        # Convert to float for calculations
-        arr = arr.astype(float)
-        if len(arr) <= 1:
-            return arr
-        diff = np.diff(arr)
-        # Prepend 0 to keep same length
-        return np.concatenate([[0.0], diff])
-    
-    return series.apply(diff_array)
+    return series.first_difference()
+
+
+def read_tags_frame(filename: str) -> pd.DataFrame:
+    """Read tags CSV into a DataFrame indexed by parsed userId."""
+    return pd.DataFrame.from_dict(read_csv_to_dict(filename), orient="index")
+
+
+def record_user_ids(index: pd.MultiIndex) -> pd.Index:
+    """Extract userId from record_id (format: "global:<userId>")."""
+    record_ids = index.get_level_values(0).astype(str)
+    return record_ids.str.replace(r"^global:", "", regex=True)
 
 
 def load_tags_config(filename: str) -> dict:
@@ -106,21 +255,21 @@ def load_tags_config(filename: str) -> dict:
 
 
 def filter_by_tags(
-    series: pd.Series,
+    series: RaggedSeries,
     tags_csv_file: str,
     tag_filters: Optional[dict] = None,
     tags_config: Optional[dict] = None,
-) -> pd.Series:
+) -> RaggedSeries:
     """Filter series by matching record_id to global:<id> tags.
     
     Args:
-        series: Series with (record_id, label) as index
+        series: RaggedSeries with (record_id, label) as index
         tags_csv_file: Path to CSV file with userId and tag columns
         tag_filters: Dict of tag filters e.g. {'answers.gender': 'kobieta'}
         tags_config: Optional tag validation rules from load_tags_config
     
     Returns:
-        Filtered Series keeping only matching user records
+        Filtered RaggedSeries keeping only matching user records
     """
     # Load tags from CSV file
     tags_dict = read_csv_to_dict(tags_csv_file)
@@ -170,14 +319,6 @@ def filter_by_tags(
             valid_user_ids.add(user_id)
     
     # Filter series by matching record_ids to valid user IDs
-    mask = []
-    for record_id, label in series.index:
-        # Extract userId from record_id (format: "global:<userId>")
-        if isinstance(record_id, str) and record_id.startswith("global:"):
-            user_id = record_id.split(":", 1)[1]
-        else:
-            user_id = str(record_id)
-        
-        mask.append(user_id in valid_user_ids)
-    
-    return series[mask]
+    user_ids = record_user_ids(series.index)
+
+    return series[np.asarray(user_ids.isin(valid_user_ids))]
@@ -1,31 +1,62 @@
+import os
+
 from load import (
     load_ready_data,
     load_tags_config,
     filter_by_tags,
-    standardize_data,
-    difference_data,
+    read_tags_frame,
 )
-import numpy as np
 
 
-from func import calculate_spearman_correlation
+from cohort import cohort_sweep, join_tags, record_correlations
 
 
 CONFIG = {
     "FILE_PATH": "",  # global-data.csv
     "TAGS_CONFIG_FILE": "",  # config_sample.txt
     "TAGS_CSV_FILE": "",  # examination_form.csv || Formularz - Arkusz.csv
+    "ALIGN_RATE_HZ": 10,  # Wspólna siatka czasu (kompozytor + słuchacze)
+    "COHORT_SWEEP": False,  # Statystyki dla wszystkich kombinacji TAG_COLUMNS
+    "COHORT_OUTPUT_DIR": "output",
+    "AGE_BANDS": None,  # np. [0, 20, 26, 36, 51, 120] - przedziały wieku [a, b)
 }
 
+TAG_COLUMNS = ["płeć", "wiek", "wykształcenie", "wykszt. muz."]
+AGE_COLUMN = "wiek"
+
+
+def run_cohort_sweep(series_all):
+    """Correlations computed once, then statistics for all tag combinations."""
+    df_corr = record_correlations(series_all, align_rate_hz=CONFIG["ALIGN_RATE_HZ"])
+    df = join_tags(
+        df_corr,
+        read_tags_frame(CONFIG["TAGS_CSV_FILE"]),
+        TAG_COLUMNS,
+        age_column=AGE_COLUMN,
+        age_edges=CONFIG["AGE_BANDS"],
+    )
+    groups, tests = cohort_sweep(df, TAG_COLUMNS)
+
+    os.makedirs(CONFIG["COHORT_OUTPUT_DIR"], exist_ok=True)
+    for name, frame in (("cohort_groups", groups), ("cohort_tests", tests)):
+        path = os.path.join(CONFIG["COHORT_OUTPUT_DIR"], f"{name}.csv")
+        frame.to_csv(path, index=False)
+        print(f"Saved: {path}")
+
+    print(f"\nRecords: {len(df)}, combinations: {len(tests)}, groups: {len(groups)}")
+    print(tests.sort_values("kruskal_p").head(10).to_string(index=False))
+
+
 if __name__ == "__main__":
     try:
-        # Load data with record_id preserved
+        # Load data with record_id and timestamps preserved
         series = load_ready_data(CONFIG["FILE_PATH"])
+        if CONFIG["COHORT_SWEEP"]:
+            run_cohort_sweep(series)
+            exit()
 
-        series = standardize_data(series)
-        series = difference_data(series)
-
-        series_copy = series.copy()
+        # Kontener współdzieli bufor wartości - filtrowanie nie kopiuje danych
+        series_all = series
         # Load tags config .txt file (optional)
         """contig_sample.txt
         płeć: mężczyzna, kobieta
@@ -42,54 +73,17 @@ if __name__ == "__main__":
             tags_config=config,
         )
 
-        # Calculate Spearman correlation with KOMPOZYTOR
-        kompozytor_series = series_copy.xs("KOMPOZYTOR", level=1)
-        komp_arr = kompozytor_series.iloc[0]
-
-        print(f"KOMPOZYTOR array length: {len(komp_arr)}")
-
-        # Load tags to get user metadata
-        from load import read_csv_to_dict
-
-        tags_dict = read_csv_to_dict(CONFIG["TAGS_CSV_FILE"])
-
-        # Calculate correlations with metadata
-        correlation_data = []
-        for idx, arr in series.items():
-            record_id, label = idx
-            if label != "KOMPOZYTOR":
-                # Extract user_id from record_id
-                if isinstance(record_id, str) and record_id.startswith("global:"):
-                    user_id = record_id.split(":", 1)[1]
-                else:
-                    user_id = str(record_id)
-
-                # Get user tags
-                user_data = tags_dict.get(user_id, {})
-
-                # Calculate correlation with p-value
-                corr, p_value = calculate_spearman_correlation(arr, komp_arr)
-
-                if not np.isnan(corr):
-                    correlation_data.append(
-                        {
-                            "record_id": record_id,
-                            "label": label,
-                            "correlation": corr,
-                            "p_value": p_value,
-                            "płeć": user_data.get("płeć", "unknown"),
-                            "wiek": user_data.get("wiek", "unknown"),
-                            "wykształcenie": user_data.get("wykształcenie", "unknown"),
-                            "wykszt. muz.": user_data.get("wykszt. muz.", "unknown"),
-                        }
-                    )
+        # Calculate Spearman correlation with KOMPOZYTOR (shared time grid)
+        df_corr = record_correlations(
+            series_all, series, align_rate_hz=CONFIG["ALIGN_RATE_HZ"]
+        )
+
+        # Load tags to get user metadata (joined, no per-row lookups)
+        tags_df = read_tags_frame(CONFIG["TAGS_CSV_FILE"])
+        df_corr = join_tags(df_corr, tags_df, TAG_COLUMNS)
 
         import matplotlib.pyplot as plt
-        import pandas as pd
 
-        # Convert to DataFrame
-        df_corr = pd.DataFrame(correlation_data)
-        
         # Filter significant correlations (p < 0.05)
         df_significant = df_corr[df_corr['p_value'] < 0.05]
         
@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+
+# Statystyki klastrów liczone jednym iloczynem z rzadką macierzą przynależności
+# M (sygnały × klastry): sumy w czasie X @ M, spójność z M^T S M.
+CONFIDENCE_LEVEL = 0.95
+
+
+class ClusterStatistics:
+    def __init__(self, data, cluster_labels, similarity=None, confidence=None):
+        """
+        Średnia, odchylenie standardowe, przedział ufności i liczebność wszystkich
+        klastrów naraz oraz spójność wewnątrzklastrowa (średnie rho par członków).
+
+        Args:
+            data: DataFrame (czas × sygnały), kolumny w kolejności cluster_labels
+            cluster_labels: numery klastrów dla kolejnych kolumn data
+            similarity: macierz podobieństwa (N × N) w tej samej kolejności (opcjonalna)
+            confidence: poziom ufności pasma (domyślnie CONFIDENCE_LEVEL)
+        """
+        from scipy import sparse
+        from scipy.stats import t as student_t
+
+        self.confidence = confidence or CONFIDENCE_LEVEL
+        cluster_labels = np.asarray(cluster_labels)
+        self.cluster_ids, codes = np.unique(cluster_labels, return_inverse=True)
+        n_signals, n_clusters = len(codes), len(self.cluster_ids)
+
+        membership = sparse.csr_matrix(
+            (np.ones(n_signals), (np.arange(n_signals), codes)),
+            shape=(n_signals, n_clusters),
+        )
+        self.counts = np.asarray(membership.sum(axis=0)).ravel().astype(int)
+
+        # Sumy w czasie: X @ M (braki danych pomijane jak w DataFrame.mean)
+        values = data.to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+        n_t = np.asarray(membership.T @ valid.T.astype(float)).T
+        sums = np.asarray(membership.T @ filled.T).T
+        squares = np.asarray(membership.T @ (filled**2).T).T
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sums / n_t
+            var = (squares - n_t * mean**2) / (n_t - 1)
+            std = np.sqrt(np.clip(var, 0, None))
+            half_width = (
+                student_t.ppf((1 + self.confidence) / 2, n_t - 1) * std / np.sqrt(n_t)
+            )
+
+        columns = pd.Index(self.cluster_ids, name="cluster_id")
+        self.mean = pd.DataFrame(mean, index=data.index, columns=columns)
+        self.std = pd.DataFrame(std, index=data.index, columns=columns)
+        self.ci_low = self.mean - half_width
+        self.ci_high = self.mean + half_width
+
+        # Spójność: suma rho par wewnątrz klastra = (M^T S M)_kk - ślad bloku
+        self.coherence = np.full(n_clusters, np.nan)
+        self.between = None
+        if similarity is not None:
+            sim = np.asarray(similarity, dtype=float)
+            block_sums = np.asarray(membership.T @ (membership.T @ sim).T)
+            diagonal = np.bincount(codes, weights=np.diag(sim), minlength=n_clusters)
+            pairs = self.counts * (self.counts - 1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                self.coherence = np.where(
+                    pairs > 0, (np.diag(block_sums) - diagonal) / pairs, np.nan
+                )
+                between = block_sums / np.outer(self.counts, self.counts)
+            np.fill_diagonal(between, self.coherence)
+            self.between = pd.DataFrame(between, index=columns, columns=columns)
+
+    def summary(self, composer_cluster=None, references=None):
+        """
+        Tabela klastrów: liczebność, spójność, klaster kompozytora.
+
+        Args:
+            composer_cluster: klaster referencji głównej
+            references: dict etykieta referencji -> klaster (kolumna "references")
+
+        Returns:
+            DataFrame indeksowany cluster_id
+        """
+        summary = pd.DataFrame(
+            {
+                "n_members": self.counts,
+                "coherence_rho": self.coherence,
+                "contains_composer": self.cluster_ids == composer_cluster,
+            },
+            index=pd.Index(self.cluster_ids, name="cluster_id"),
+        )
+        if references:
+            summary["references"] = [
+                ",".join(label for label, c in references.items() if c == cid)
+                for cid in self.cluster_ids
+            ]
+        return summary
+
+    def bands(self):
+        """Średnia, odchylenie i pasmo ufności wszystkich klastrów w jednej ramce."""
+        parts = {
+            "Mean": self.mean,
+            "Std": self.std,
+            "CI_Low": self.ci_low,
+            "CI_High": self.ci_high,
+        }
+        columns = {
+            f"Profile_{cid}_{name}": frame[cid]
+            for cid in self.cluster_ids
+            for name, frame in parts.items()
+        }
+        return pd.DataFrame(columns, index=self.mean.index)
+
+
+def silhouette_scores(distance, labels):
+    """
+    Współczynniki sylwetki wszystkich sygnałów z gotowej macierzy dystansów
+    (jeden iloczyn D @ M zamiast pętli po parach).
+
+    Args:
+        distance: macierz dystansów (N × N)
+        labels: numery klastrów (N,)
+
+    Returns:
+        numpy array (N,) - singletony mają 0 (konwencja scikit-learn)
+    """
+    _, codes = np.unique(labels, return_inverse=True)
+    n_clusters = codes.max() + 1
+    membership = np.zeros((len(codes), n_clusters))
+    membership[np.arange(len(codes)), codes] = 1.0
+    counts = membership.sum(axis=0)
+
+    sums = distance @ membership
+    own = np.arange(len(codes)), codes
+    own_size = counts[codes]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        a = sums[own] / (own_size - 1)
+        mean_other = sums / counts
+    mean_other[own] = np.inf
+    b = mean_other.min(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = (b - a) / np.maximum(a, b)
+    return np.where(own_size > 1, np.nan_to_num(scores), 0.0)
+
+
+def dunn_index(distance, labels):
+    """Indeks Dunna: najmniejszy dystans między klastrami / największa średnica."""
+    labels = np.asarray(labels)
+    same = labels[:, None] == labels[None, :]
+    diameter = np.where(same, distance, -np.inf).max()
+    separation = np.where(same, np.inf, distance).min()
+    if not np.isfinite(separation) or diameter <= 0:
+        return np.nan
+    return separation / diameter
+
+
+def sweep_thresholds(linkage_matrix, distance, max_clusters=20, steps=50):
+    """
+    Przecina gotową macierz linkage na wielu wysokościach i ocenia każdy podział
+    (sylwetka, indeks Dunna). Korelacje i linkage nie są liczone ponownie.
+
+    Wysokości cięcia to środki przedziałów między kolejnymi wysokościami połączeń
+    (każda daje inny podział) dla 2 .. max_clusters klastrów; gdy jest ich więcej
+    niż ``steps``, wybierane równomiernie.
+
+    Args:
+        linkage_matrix: macierz linkage (scipy)
+        distance: macierz dystansów (N × N) użyta do linkage
+        max_clusters: największa rozważana liczba klastrów
+        steps: maksymalna liczba ocenianych cięć
+
+    Returns:
+        DataFrame: threshold, n_clusters, silhouette, dunn (rosnąco po progu)
+    """
+    from scipy.cluster.hierarchy import fcluster
+
+    distance = np.asarray(distance, dtype=float)
+    heights = np.unique(linkage_matrix[:, 2])
+    cuts = (heights[:-1] + heights[1:]) / 2  # od najwyższego: 2, 3, ... klastrów
+    cuts = cuts[-max(1, max_clusters - 1) :]
+    if len(cuts) > steps:
+        cuts = cuts[np.linspace(0, len(cuts) - 1, steps).round().astype(int)]
+
+    rows = []
+    for threshold in np.unique(cuts):
+        labels = fcluster(linkage_matrix, t=threshold, criterion="distance")
+        rows.append(
+            {
+                "threshold": threshold,
+                "n_clusters": len(np.unique(labels)),
+                "silhouette": silhouette_scores(distance, labels).mean(),
+                "dunn": dunn_index(distance, labels),
+            }
+        )
+    return pd.DataFrame(rows, columns=["threshold", "n_clusters", "silhouette", "dunn"])
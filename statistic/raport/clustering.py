@@ -1,9 +1,10 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.cluster.hierarchy import linkage, fcluster
-from scipy.spatial.distance import squareform
+from export import export_matrix
+from cluster_stats import ClusterStatistics, sweep_thresholds
+
+# Kryteria wyboru progu cięcia dendrogramu w trybie CLUSTER_THRESHOLD_SWEEP
+SWEEP_CRITERIA = ("silhouette", "dunn")
 
 
 class ClusteringModule:
@@ -31,15 +32,24 @@ class ClusteringModule:
         self.similarity_matrix = None
         self.linkage_matrix = None
         self.valid_cols = []
+        self.cluster_labels = None  # Numery klastrów w kolejności valid_cols
+        self.composer_cluster = None
+        self.reference_clusters = {}  # Referencja -> numer klastra
+        self.stats = None  # ClusterStatistics - wspólne dla eksportów
+        self.threshold = None
+        self.threshold_sweep = None  # Krzywa jakości podziałów (tryb sweep)
 
     def run_analysis(self):
+        from scipy.cluster.hierarchy import linkage, fcluster
+        from scipy.spatial.distance import squareform
+
         print("--- [Moduł Clustering] Profilowanie (Spearman + Kompozytor) ---")
 
         if self.raw_data is None or self.raw_data.empty:
             print("   (!) Brak danych wejściowych.")
             return None
 
-        composer_id = self.cfg["COMPOSER_ID"]
+        references = self.parent.get_reference_ids()
 
         # 1. Wybór kolumn: Słuchacze + Kompozytor
         # Filtrujemy sygnały płaskie (brak wariancji uniemożliwia korelację)
@@ -47,10 +57,12 @@ class ClusteringModule:
             c for c in self.raw_data.columns if self.raw_data[c].std() > 1e-4
         ]
 
-        if composer_id not in self.valid_cols:
-            print(
-                f"   (!) Ostrzeżenie: Kompozytor {composer_id} ma płaski sygnał lub brak danych."
-            )
+        for reference in references:
+            if reference not in self.valid_cols:
+                print(
+                    f"   (!) Ostrzeżenie: Referencja {reference} ma płaski sygnał "
+                    "lub brak danych."
+                )
 
         if len(self.valid_cols) < 3:
             print("   (!) Zbyt mało aktywnych sygnałów do klastrowania (< 3).")
@@ -83,9 +95,9 @@ class ClusteringModule:
             self.linkage_matrix = linkage(squareform(dist_matrix), method="ward")
 
             # 4. Wyodrębnienie grup
-            threshold = 0.7 * max(self.linkage_matrix[:, 2])
+            self.threshold = self._select_threshold(dist_matrix.to_numpy())
             cluster_labels = fcluster(
-                self.linkage_matrix, t=threshold, criterion="distance"
+                self.linkage_matrix, t=self.threshold, criterion="distance"
             )
 
             # Wyniki - używamy labeli zamiast record_id jeśli skonfigurowano
@@ -96,13 +108,19 @@ class ClusteringModule:
                 {"record_id": record_labels, "cluster_id": cluster_labels}
             )
 
-            # Lokalizacja kompozytora
-            comp_cluster = "Brak"
-            if composer_id in self.valid_cols:
-                comp_label = self.parent.get_record_label(composer_id)
-                comp_row = self.cluster_df[self.cluster_df["record_id"] == comp_label]
-                if not comp_row.empty:
-                    comp_cluster = comp_row["cluster_id"].values[0]
+            # Lokalizacja referencji (wspólna macierz i linkage dla wszystkich)
+            self.cluster_labels = cluster_labels
+            self.reference_clusters = {
+                ref: cluster_labels[self.valid_cols.index(ref)]
+                for ref in references
+                if ref in self.valid_cols
+            }
+            self.composer_cluster = (
+                self.reference_clusters.get(references[0]) if references else None
+            )
+            comp_cluster = (
+                self.composer_cluster if self.composer_cluster is not None else "Brak"
+            )
 
             self.cluster_df = self.cluster_df.sort_values(
                 by=["cluster_id", "record_id"]
@@ -111,6 +129,20 @@ class ClusteringModule:
             num_clusters = self.cluster_df["cluster_id"].nunique()
             print(f"   -> Zidentyfikowano {num_clusters} profili.")
             print(f"   -> KOMPOZYTOR znajduje się w Klastrze nr: {comp_cluster}")
+            for ref in references[1:]:
+                print(
+                    f"   -> Referencja {self.parent.get_record_label(ref)}: "
+                    f"Klaster nr {self.reference_clusters.get(ref, 'Brak')}"
+                )
+
+            # 5. Statystyki klastrów (raz, wspólne dla eksportów)
+            self.stats = ClusterStatistics(
+                subset_df, cluster_labels, similarity=self.similarity_matrix
+            )
+            for cid, n, rho in zip(
+                self.stats.cluster_ids, self.stats.counts, self.stats.coherence
+            ):
+                print(f"      Klaster {cid}: n={n}, spójność rho={rho:.3f}")
 
         except Exception as e:
             print(f"   (!) Błąd obliczeń klasteryzacji: {str(e)}")
@@ -118,6 +150,45 @@ class ClusteringModule:
 
         return self.cluster_df
 
+    def _select_threshold(self, distance):
+        """
+        Próg cięcia dendrogramu. Domyślnie CLUSTER_THRESHOLD_RATIO × najwyższe
+        połączenie; w trybie CLUSTER_THRESHOLD_SWEEP - najlepszy podział wg
+        kryterium, oceniany na gotowym linkage i macierzy dystansów.
+        """
+        default = self.cfg.get("CLUSTER_THRESHOLD_RATIO", 0.7) * max(
+            self.linkage_matrix[:, 2]
+        )
+        if not self.cfg.get("CLUSTER_THRESHOLD_SWEEP", False):
+            return default
+
+        criterion = self.cfg.get("CLUSTER_SWEEP_CRITERION", "silhouette")
+        if criterion not in SWEEP_CRITERIA:
+            print(f"   (!) Nieznane kryterium '{criterion}', używam silhouette.")
+            criterion = "silhouette"
+
+        distance = np.array(distance, dtype=float)
+        np.fill_diagonal(distance, 0.0)
+        self.threshold_sweep = sweep_thresholds(
+            self.linkage_matrix,
+            distance,
+            max_clusters=self.cfg.get("CLUSTER_SWEEP_MAX_CLUSTERS", 20),
+            steps=self.cfg.get("CLUSTER_SWEEP_STEPS", 50),
+        )
+        scores = self.threshold_sweep[criterion]
+        if scores.isna().all():
+            print("   (!) Brak podziałów do oceny - próg domyślny.")
+            return default
+
+        best = self.threshold_sweep.loc[scores.idxmax()]
+        self.threshold_sweep["optimal"] = self.threshold_sweep.index == scores.idxmax()
+        print(
+            f"   -> Sweep progu ({len(self.threshold_sweep)} cięć, {criterion}): "
+            f"próg={best['threshold']:.3f}, klastrów={int(best['n_clusters'])}, "
+            f"{criterion}={best[criterion]:.3f}"
+        )
+        return best["threshold"]
+
     def export_results(self):
         if self.cluster_df is None:
             return
@@ -129,50 +200,52 @@ class ClusteringModule:
         self.cluster_df.to_csv(mapping_path, index=False)
         print(f"   -> Mapa profili zapisana: {mapping_path}")
 
-        # --- B. Średnie Przebiegi (Archetypy) - CSV ---
+        if self.threshold_sweep is not None:
+            sweep_path = self.parent.get_output_path(
+                base_name="cluster_threshold_sweep", prefix="03_", extension=".csv"
+            )
+            self.threshold_sweep.to_csv(sweep_path, index=False)
+            print(f"   -> Krzywa progu cięcia zapisana: {sweep_path}")
+
+        # --- B. Średnie Przebiegi (Archetypy) ---
         try:
-            unique_clusters = sorted(self.cluster_df["cluster_id"].unique())
             means_df = pd.DataFrame(index=self.raw_data.index)
 
-            composer_id = self.cfg["COMPOSER_ID"]
-            if composer_id in self.raw_data.columns:
-                comp_label = self.parent.get_record_label(composer_id)
-                means_df[f"COMPOSER_RAW_{comp_label}"] = self.raw_data[composer_id]
+            for reference in self.parent.get_reference_ids():
+                if reference in self.raw_data.columns:
+                    comp_label = self.parent.get_record_label(reference)
+                    means_df[f"COMPOSER_RAW_{comp_label}"] = self.raw_data[reference]
 
-            # Map back from labels to record_ids for data access
-            label_to_rid = {
-                self.parent.get_record_label(rid): rid for rid in self.valid_cols
-            }
+            for cid in self.stats.cluster_ids:
+                suffix = "_(CONTAINS_COMPOSER)" if cid == self.composer_cluster else ""
+                means_df[f"Profile_{cid}_Mean{suffix}"] = self.stats.mean[cid]
 
-            for cid in unique_clusters:
-                member_labels = self.cluster_df[self.cluster_df["cluster_id"] == cid][
-                    "record_id"
-                ]
-                # Convert labels back to record_ids to access data
-                member_rids = [
-                    label_to_rid.get(lbl, lbl)
-                    for lbl in member_labels
-                    if lbl in label_to_rid or lbl in self.raw_data.columns
-                ]
-
-                suffix = ""
-                comp_label = (
-                    self.parent.get_record_label(composer_id)
-                    if composer_id in self.raw_data.columns
-                    else None
-                )
-                if comp_label in member_labels.values:
-                    suffix = "_(CONTAINS_COMPOSER)"
+            export_matrix(
+                self.parent,
+                means_df,
+                base_name="profiles_archetypes_spearman",
+                prefix="03_",
+            )
 
-                means_df[f"Profile_{cid}_Mean{suffix}"] = self.raw_data[
-                    member_rids
-                ].mean(axis=1)
+            # --- C. Pasma (odchylenie, przedział ufności) i podsumowanie ---
+            export_matrix(
+                self.parent,
+                self.stats.bands(),
+                base_name="profiles_bands_spearman",
+                prefix="03_",
+            )
 
-            means_path = self.parent.get_output_path(
-                base_name="profiles_archetypes_spearman", prefix="03_", extension=".csv"
+            summary_path = self.parent.get_output_path(
+                base_name="profiles_summary_spearman", prefix="03_", extension=".csv"
+            )
+            reference_labels = {
+                self.parent.get_record_label(ref): cid
+                for ref, cid in self.reference_clusters.items()
+            }
+            self.stats.summary(self.composer_cluster, reference_labels).to_csv(
+                summary_path
             )
-            means_df.to_csv(means_path, index=True)
-            print(f"   -> Archetypy profili zapisane: {means_path}")
+            print(f"   -> Podsumowanie klastrów zapisane: {summary_path}")
 
         except Exception as e:
             print(f"   (!) Błąd eksportu archetypów: {e}")
@@ -180,58 +253,41 @@ class ClusteringModule:
     def export_heatmap(self):
         """
         Eksportuje heatmapę macierzy podobieństwa (Spearman) z dendrogramem.
+        Kolejność z gotowej macierzy linkage; dla dużych N bez adnotacji i etykiet.
         """
         if self.similarity_matrix is None or self.linkage_matrix is None:
             print("   (!) Brak danych do heatmapy.")
             return
 
+        from plotting import render_similarity_heatmap
+
         print("   Generowanie heatmapy macierzy podobieństwa...")
 
         try:
-            g = sns.clustermap(
-                self.similarity_matrix,
-                row_linkage=self.linkage_matrix,
-                col_linkage=self.linkage_matrix,
-                cmap="RdBu_r",
-                center=0,
-                vmin=-1,
-                vmax=1,
-                figsize=(16, 16),  # Zwiększony rozmiar z 12x12 do 16x16
-                dendrogram_ratio=(
-                    0.12,
-                    0.12,
-                ),  # Zmniejszony dendrogram dla lepszych proporcji
-                cbar_pos=(
-                    0.02,
-                    0.9,
-                    0.03,
-                    0.08,
-                ),  # Przesunięta wyżej i zmniejszona legenda kolorów
-                cbar_kws={"label": "Korelacja Rangowa Spearmana"},
-                xticklabels=True,
-                yticklabels=True,
-                annot=True,  # Dodanie wartości liczbowych
-                fmt=".2f",  # Format: 2 miejsca po przecinku
-                annot_kws={"size": 6, "weight": "normal"},  # Rozmiar i styl czcionki
-            )
-
-            g.fig.suptitle(
-                f"Macierz Podobieństwa (Spearman): {self.cfg.get('NAME', '')}",
-                y=1.01,  # Przesunięty niżej tytuł
-                fontsize=14,
-            )
-
-            # Formatowanie etykiet
-            plt.setp(g.ax_heatmap.get_xticklabels(), fontsize=8)
-            plt.setp(g.ax_heatmap.get_yticklabels(), fontsize=8)
-
             img_path = self.parent.get_output_path(
                 base_name="profiles_heatmap_spearman", prefix="03_", extension=".png"
             )
-            g.savefig(img_path, dpi=150, bbox_inches="tight")
-            plt.close("all")
+            render_similarity_heatmap(
+                self.similarity_matrix,
+                self.linkage_matrix,
+                img_path,
+                title=f"Macierz Podobieństwa (Spearman): {self.cfg.get('NAME', '')}",
+                cfg=self.cfg,
+            )
             print(f"   -> Heatmapa zapisana: {img_path}")
 
+            # Pełna macierz (kolejność dendrogramu) do inspekcji z przybliżaniem
+            if self.cfg.get("HEATMAP_EXPORT_MATRIX", False):
+                from scipy.cluster.hierarchy import leaves_list
+
+                order = self.similarity_matrix.index[leaves_list(self.linkage_matrix)]
+                export_matrix(
+                    self.parent,
+                    self.similarity_matrix.loc[order, order],
+                    base_name="profiles_similarity_ordered",
+                    prefix="03_",
+                )
+
         except Exception as e:
             print(f"   (!) Błąd grafiki heatmapy: {e}")
 
@@ -244,73 +300,51 @@ class ClusteringModule:
             print("   (!) Brak danych klastrów do wykresu.")
             return
 
+        import matplotlib.pyplot as plt
+
         print("   Generowanie wykresu średnich klastrów...")
 
         try:
-            composer_id = self.cfg["COMPOSER_ID"]
-            unique_clusters = sorted(self.cluster_df["cluster_id"].unique())
+            stats = self.stats
+            unique_clusters = list(stats.cluster_ids)
 
             # Używamy danych standaryzowanych (Z-Score) ponieważ klasteryzacja była na Z-Score
             df_pivot = self.parent.df_pivot
             time_seconds = self.parent.get_time_axis_seconds(df_pivot.index)
 
-            # Mapowanie label -> record_id
-            label_to_rid = {
-                self.parent.get_record_label(rid): rid for rid in self.valid_cols
-            }
-
-            # Znajdź klaster kompozytora
-            comp_label = (
-                self.parent.get_record_label(composer_id)
-                if composer_id in df_pivot.columns
-                else None
-            )
-            composer_cluster_id = None
-            if comp_label:
-                comp_row = self.cluster_df[self.cluster_df["record_id"] == comp_label]
-                if not comp_row.empty:
-                    composer_cluster_id = comp_row["cluster_id"].values[0]
-
             # Tworzenie wykresu
             fig, ax = plt.subplots(figsize=(16, 9))
 
             colors = plt.cm.tab10(np.linspace(0, 1, len(unique_clusters)))
 
-            for idx, cid in enumerate(unique_clusters):
-                member_labels = self.cluster_df[self.cluster_df["cluster_id"] == cid][
-                    "record_id"
-                ]
-                member_rids = [
-                    label_to_rid.get(lbl, lbl)
-                    for lbl in member_labels
-                    if lbl in label_to_rid or lbl in df_pivot.columns
-                ]
-
-                if not member_rids:
-                    continue
-
-                cluster_mean = df_pivot[member_rids].mean(axis=1)
-
+            for idx, (cid, n_members) in enumerate(zip(unique_clusters, stats.counts)):
                 # Oznaczenie klastra kompozytora
-                if cid == composer_cluster_id:
-                    ax.plot(
-                        time_seconds,
-                        cluster_mean,
-                        color="red",
-                        linewidth=3.5,
-                        alpha=0.9,
-                        label=f"Klaster {cid} ★ KOMPOZYTOR ★ (n={len(member_rids)})",
-                        zorder=10,
-                    )
+                if cid == self.composer_cluster:
+                    color, linewidth, alpha, zorder = "red", 3.5, 0.9, 10
+                    label = f"Klaster {cid} ★ KOMPOZYTOR ★ (n={n_members})"
                 else:
-                    ax.plot(
-                        time_seconds,
-                        cluster_mean,
-                        color=colors[idx],
-                        linewidth=2.5,
-                        alpha=0.8,
-                        label=f"Klaster {cid} (n={len(member_rids)})",
-                    )
+                    color, linewidth, alpha, zorder = colors[idx], 2.5, 0.8, 2
+                    label = f"Klaster {cid} (n={n_members})"
+
+                ax.plot(
+                    time_seconds,
+                    stats.mean[cid],
+                    color=color,
+                    linewidth=linewidth,
+                    alpha=alpha,
+                    label=label,
+                    zorder=zorder,
+                )
+                # Pasmo ufności średniej
+                ax.fill_between(
+                    time_seconds,
+                    stats.ci_low[cid],
+                    stats.ci_high[cid],
+                    color=color,
+                    alpha=0.15,
+                    linewidth=0,
+                    zorder=zorder - 1,
+                )
 
             # Konfiguracja osi
             self.parent.setup_time_axis(ax, df_pivot.index)
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from core import MusicalMetaAnalyzer
+
+T0 = 1765194266519.0  # Timestamp UTC [ms] początku nagrania
+
+
+def _responses(n_listeners=6, seconds=60.0, rate=20, lag=3, seed=0):
+    """
+    Długa ramka jak eksport CSV (timestamp, record_id, value): kompozytor
+    "comp" (błądzenie losowe 0-100) i słuchacze - co drugi
+    powtarza kompozytora z opóźnieniem lag próbek, pozostali to szum.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * rate)
+    walk = np.cumsum(rng.normal(size=n + lag))
+    composer = np.clip(50 + 15 * walk / np.sqrt(n), 0, 100)
+    timestamps = T0 + np.arange(n) * 1000.0 / rate
+
+    frames = [pd.DataFrame({"record_id": "comp", "value": composer[lag : lag + n]})]
+    for i in range(n_listeners):
+        if i % 2 == 0:
+            value = composer[:n] + rng.normal(0, 0.3, size=n)
+        else:
+            value = 50 + 10 * np.cumsum(rng.normal(size=n)) / np.sqrt(n)
+        frames.append(
+            pd.DataFrame({"record_id": f"u{i}", "value": np.clip(value, 0, 100)})
+        )
+    for frame in frames:
+        frame.insert(0, "timestamp", timestamps)
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.fixture
+def response_frame():
+    """Generator syntetycznych danych odpowiedzi (patrz _responses)."""
+    return _responses
+
+
+@pytest.fixture
+def make_analyzer(tmp_path):
+    """
+    Zapisuje ramkę do CSV w tmp_path i zwraca MusicalMetaAnalyzer po
+    preprocessingu; dodatkowe klucze konfiguracji jako argumenty.
+    """
+
+    def build(df, preprocess=True, **cfg):
+        csv_path = tmp_path / cfg.pop("csv_name", "data.csv")
+        df.to_csv(csv_path, index=False)
+        config = {
+            "NAME": "test",
+            "CSV_FILE": str(csv_path),
+            "SAMPLING_RATE_HZ": 20,
+            "WINDOW_SECONDS": 5,
+            "COMPOSER_ID": "comp",
+            "OUTPUT_DIR": str(tmp_path / "out"),
+            "RUN_ADF": False,
+            "GRANGER_MAX_LAG_SEC": 1.0,
+            "GRANGER_P_VALUE_THRESHOLD": 0.05,
+            **cfg,
+        }
+        analyzer = MusicalMetaAnalyzer(config)
+        if preprocess:
+            analyzer.load_and_preprocess()
+        return analyzer
+
+    return build
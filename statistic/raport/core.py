@@ -1,34 +1,93 @@
 import pandas as pd
 import numpy as np
 import os
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
+import re
+
+# Progi oceny jakości nagrań (nadpisywane przez QUALITY_* w konfiguracji)
+QUALITY_DEFAULTS = {
+    "QUALITY_GAP_SEC": 2.0,  # Przerwa między próbkami uznawana za lukę
+    "QUALITY_MIN_RATE_HZ": 1.0,  # Minimalna efektywna częstotliwość próbek
+    "QUALITY_MAX_INTERPOLATED": 0.5,  # Maks. odsetek czasu uzupełnianego interpolacją
+    "QUALITY_MAX_STUCK": 0.95,  # Maks. odsetek czasu bez zmiany wartości
+    "QUALITY_MIN_RANGE": 0.05,  # Minimalny wykorzystany zakres suwaka (0-1)
+}
+
+
+def sample_fingerprints(df):
+    """
+    Odcisk surowych próbek (timestamp, value) każdego nagrania, przed pivotem -
+    niezależny od pozostałych nagrań i od kolejności wierszy: suma 64-bitowych
+    skrótów wierszy (modulo 2^64) i ich liczba. Porcje CSV łączone dodawaniem.
+
+    Returns:
+        dict: record_id -> (suma skrótów, liczba próbek)
+    """
+    codes, record_ids = pd.factorize(df["record_id"], sort=True)
+    hashes = pd.util.hash_pandas_object(df[["timestamp", "value"]], index=False)
+    sums = np.zeros(len(record_ids), dtype=np.uint64)
+    np.add.at(sums, codes, hashes.to_numpy())
+    counts = np.bincount(codes, minlength=len(record_ids))
+    return {
+        rid: (int(total), int(n)) for rid, total, n in zip(record_ids, sums, counts)
+    }
 
 
 class MusicalMetaAnalyzer:
     def __init__(self, config):
         self.cfg = config
         self.df_pivot = None  # Dane Z-Score
-        self.df_diff = None  # Dane Diff
-        self.df_raw = None  # Dane surowe (przed standaryzacją)
+        self.df_diff = None  # Dane Diff (właściwość - liczona przy pierwszym użyciu)
+        self.df_raw = None  # Dane surowe (właściwość - odtwarzana z Z-Score)
+        self.zscore_mean = None  # Średnie i odchylenia użyte w standaryzacji
+        self.zscore_std = None
         self.label_map = {}  # Mapowanie record_id -> label
+        self.quality_df = None  # Raport jakości nagrań (przed interpolacją)
+        self.excluded_records = []  # Nagrania odrzucone przez ocenę jakości
+        self.record_fingerprints = {}  # record_id -> odcisk surowych próbek
+        self.plot_cache = {}  # Zdecymowane serie do wykresów (plotting.py)
 
         # Kontenery na wyniki
-        self.causal_listeners_lags = {}
+        self.causal_listeners_lags = {}  # Referencja główna: słuchacz -> lag
+        self.causal_lags_by_reference = {}  # Referencja -> {słuchacz: lag}
         self.narrative_trajectories = None
 
     def load_and_preprocess(self):
         project_name = self.cfg.get("NAME", "Unnamed")
         print(f"\n=== [PROJEKT: {project_name}] Preprocessing Danych ===")
 
-        # 1. Wczytanie
+        # get_analysis_rate przycina ANALYSIS_RATE_HZ bez zmiany konfiguracji
+        analysis_rate = self.cfg.get("ANALYSIS_RATE_HZ")
+        if analysis_rate and analysis_rate > self.cfg["SAMPLING_RATE_HZ"]:
+            print(
+                f"   (!) ANALYSIS_RATE_HZ={analysis_rate} > SAMPLING_RATE_HZ. "
+                "Pomijam decymację."
+            )
+
+        # OUT_OF_CORE: CSV porcjami do macierzy np.memmap (outofcore.py)
+        out_of_core = self.cfg.get("OUT_OF_CORE", False)
+        if out_of_core and os.path.exists(self.cfg["CSV_FILE"]):
+            from outofcore import preprocess_out_of_core
+
+            preprocess_out_of_core(self)
+            self._finish_preprocessing()
+            return
+
+        # 1. Wczytanie (LOW_MEMORY: wartości float32, identyfikatory jako kategorie)
+        read_kwargs = {}
+        if self.cfg.get("LOW_MEMORY", False):
+            read_kwargs["dtype"] = {"value": "float32", "record_id": "category"}
         try:
-            df = pd.read_csv(self.cfg["CSV_FILE"])
+            df = pd.read_csv(self.cfg["CSV_FILE"], **read_kwargs)
         except FileNotFoundError:
             print(
                 f"(!) Plik {self.cfg['CSV_FILE']} nie istnieje. Generuję dane testowe..."
             )
             df = self._generate_mock_data()
+        if isinstance(df["record_id"].dtype, pd.CategoricalDtype):
+            # Kategorie w kolejności leksykograficznej (jak kolumny pivot)
+            df["record_id"] = df["record_id"].cat.reorder_categories(
+                sorted(df["record_id"].cat.categories)
+            )
 
         # 2. Build Label Mapping (if USE_LABEL is enabled and label column exists)
         if self.cfg.get("USE_LABEL", False) and "label" in df.columns:
@@ -42,7 +101,34 @@ class MusicalMetaAnalyzer:
 
         # 3. Pivot & Interpolacja
         df = df.drop_duplicates(subset=["timestamp", "record_id"])
+        self.record_fingerprints = sample_fingerprints(df)
+
+        # Ocena jakości na surowych próbkach - odrzucone nagrania nie trafiają
+        # do interpolacji ani do żadnego modułu
+        self.quality_df = self._assess_quality(df)
+        self.export_quality_report()
+        if self.excluded_records:
+            df = df[~df["record_id"].isin(self.excluded_records)]
+
+        if self.cfg.get("LOW_MEMORY", False):
+            self._preprocess_low_memory(df)
+        else:
+            self._preprocess(df)
+        self._finish_preprocessing()
+
+    def _finish_preprocessing(self):
+        """Wspólne zakończenie preprocessingu (test ADF, podsumowanie)."""
+        # 6. Test Dickeya-Fullera (ADF) na stacjonarność
+        if self.cfg.get("RUN_ADF", True):
+            self._check_stationarity()
+
+        print(
+            f"   -> Dane gotowe i naprawione (Clip 0-100). Liczba szeregów: {self.df_pivot.shape[1]}"
+        )
+        print(f"   -> Czas trwania: {self.df_pivot.index.max():.2f}s")
 
+    def _preprocess(self, df):
+        """Pivot, clip, interpolacja, decymacja, Z-Score i różnicowanie (float64)."""
         self.df_pivot = df.pivot(index="timestamp", columns="record_id", values="value")
 
         # --- FIX: CLIPPING (NAPRAWA ARTEFAKTÓW EKSTRAPOLACJI) ---
@@ -55,18 +141,274 @@ class MusicalMetaAnalyzer:
             method="bfill"
         )
 
+        # Decymacja do ANALYSIS_RATE_HZ (filtr antyaliasingowy, wszystkie kolumny naraz)
+        if self.get_analysis_rate() != self.cfg["SAMPLING_RATE_HZ"]:
+            self.df_pivot = self._decimate(self.df_pivot)
+            # Filtr może lekko wyjść poza zakres suwaka
+            self.df_pivot = self.df_pivot.clip(lower=0, upper=100)
+
         # Store raw data before standardization
-        self.df_raw = self.df_pivot.copy()
+        if "raw" not in self._dropped_frames():
+            self.df_raw = self.df_pivot.copy()
 
         # 4. Z-Score (Standaryzacja)
-        stds = self.df_pivot.std().replace(0, 1)
-        self.df_pivot = (self.df_pivot - self.df_pivot.mean()) / stds
+        self.zscore_mean = self.df_pivot.mean()
+        self.zscore_std = self.df_pivot.std().replace(0, 1)
+        self.df_pivot = (self.df_pivot - self.zscore_mean) / self.zscore_std
         self.df_pivot = self.df_pivot.fillna(0)
 
         # 5. Różnicowanie (Diff)
-        self.df_diff = self.df_pivot.diff().fillna(0)
+        if "diff" not in self._dropped_frames():
+            self.df_diff = self.df_pivot.diff().fillna(0)
 
-        # 6. Test Dickeya-Fullera (ADF) na stacjonarność
+    def _preprocess_low_memory(self, df):
+        """
+        Wariant LOW_MEMORY: jedna macierz float32 (kolejność kolumnowa) budowana
+        bezpośrednio z danych długich, clip / interpolacja / Z-Score w miejscu.
+        df_raw i df_diff nie są przechowywane - odtwarzane przy użyciu.
+        """
+        time_codes, timestamps = pd.factorize(df["timestamp"], sort=True)
+        record_codes, record_ids = pd.factorize(df["record_id"], sort=True)
+
+        values = np.full(
+            (len(timestamps), len(record_ids)), np.nan, dtype=np.float32, order="F"
+        )
+        values[time_codes, record_codes] = df["value"].to_numpy(dtype=np.float32)
+        np.clip(values, 0, 100, out=values)
+
+        # Interpolacja liniowa po pozycjach (jak interpolate(method="linear")),
+        # brzegi stałą wartością (jak bfill / ffill interpolate)
+        positions = np.arange(len(timestamps))
+        for j in range(values.shape[1]):
+            column = values[:, j]
+            missing = np.isnan(column)
+            if missing.any() and not missing.all():
+                column[missing] = np.interp(
+                    positions[missing], positions[~missing], column[~missing]
+                )
+
+        self.df_pivot = pd.DataFrame(
+            values,
+            index=pd.Index(np.asarray(timestamps), name="timestamp"),
+            columns=pd.Index(np.asarray(record_ids), name="record_id"),
+            copy=False,
+        )
+
+        if self.get_analysis_rate() != self.cfg["SAMPLING_RATE_HZ"]:
+            self.df_pivot = self._decimate(self.df_pivot)
+            values = np.asfortranarray(self.df_pivot.to_numpy(dtype=np.float32))
+            np.clip(values, 0, 100, out=values)
+            self.df_pivot = pd.DataFrame(
+                values,
+                index=self.df_pivot.index,
+                columns=self.df_pivot.columns,
+                copy=False,
+            )
+
+        # Z-Score w miejscu (statystyki w float64)
+        mean = values.mean(axis=0, dtype=np.float64)
+        std = values.std(axis=0, ddof=1, dtype=np.float64)
+        std[~(std > 0)] = 1.0
+        values -= mean.astype(np.float32)
+        values /= std.astype(np.float32)
+        np.nan_to_num(values, copy=False)
+
+        self.zscore_mean = pd.Series(mean, index=self.df_pivot.columns)
+        self.zscore_std = pd.Series(std, index=self.df_pivot.columns)
+
+        size_mb = values.nbytes / 1024**2
+        print(f"   -> LOW_MEMORY: macierz float32 {values.shape} ({size_mb:.1f} MB)")
+
+    def _dropped_frames(self):
+        """Ramki pochodne, których bieg nie przechowuje (DROP_FRAMES / LOW_MEMORY)."""
+        dropped = set(self.cfg.get("DROP_FRAMES") or ())
+        if self.cfg.get("LOW_MEMORY", False):
+            dropped.add("raw")
+        return dropped
+
+    @property
+    def df_raw(self):
+        """
+        Dane znormalizowane 0-100 (przed Z-Score). Jeśli nie są przechowywane,
+        odtwarzane z Z-Score i zapisanych średnich / odchyleń.
+        """
+        if self._df_raw is not None or self.df_pivot is None:
+            return self._df_raw
+        if self.zscore_mean is None:
+            return None
+        dtype = self.df_pivot.to_numpy().dtype
+        std = self.zscore_std.to_numpy(dtype=dtype)
+        mean = self.zscore_mean.to_numpy(dtype=dtype)
+        return self.df_pivot * std + mean
+
+    @df_raw.setter
+    def df_raw(self, value):
+        self._df_raw = value
+
+    @property
+    def df_diff(self):
+        """
+        Pierwsze różnice Z-Score (pierwszy wiersz = 0). Liczone przy pierwszym
+        użyciu; z DROP_FRAMES=["diff"] liczone przy każdym użyciu bez zapamiętania.
+        """
+        if self._df_diff is not None or self.df_pivot is None:
+            return self._df_diff
+
+        values = self.df_pivot.to_numpy()
+        diff = np.empty_like(values, order="F")
+        diff[0] = 0
+        np.subtract(values[1:], values[:-1], out=diff[1:])
+        df_diff = pd.DataFrame(
+            diff, index=self.df_pivot.index, columns=self.df_pivot.columns, copy=False
+        )
+        if "diff" not in self._dropped_frames():
+            self._df_diff = df_diff
+        return df_diff
+
+    @df_diff.setter
+    def df_diff(self, value):
+        self._df_diff = value
+
+    def _assess_quality(self, df):
+        """
+        Ocena jakości wszystkich nagrań w jednym przebiegu (groupby na danych
+        w formacie długim, przed pivotem i interpolacją):
+        efektywna częstotliwość, luki, odsetek czasu "zawieszenia" suwaka,
+        wykorzystany zakres i odsetek czasu uzupełnianego interpolacją.
+
+        Nagrania niespełniające progów QUALITY_* trafiają do excluded_records
+        (kompozytor nigdy nie jest odrzucany).
+
+        Returns:
+            DataFrame indeksowany record_id
+        """
+        thresholds = {
+            key: self.cfg.get(key, default) for key, default in QUALITY_DEFAULTS.items()
+        }
+        gap_sec = thresholds["QUALITY_GAP_SEC"]
+
+        # Próbki uporządkowane wg (nagranie, czas); nagrania jako kody całkowite,
+        # grupy są ciągłe - statystyki przez reduceat bez tabel pośrednich
+        codes, record_ids = pd.factorize(df["record_id"], sort=True)
+        seconds = df["timestamp"].to_numpy(dtype=float) / 1000.0  # ms -> s
+        order = np.lexsort((seconds, codes))
+        codes, seconds = codes[order], seconds[order]
+        values = np.clip(df["value"].to_numpy(dtype=float)[order], 0, 100)
+        del order
+
+        group_starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        n_samples = np.diff(np.r_[group_starts, len(codes)])
+        del codes
+
+        # Różnice między kolejnymi próbkami tego samego nagrania
+        dt = np.diff(seconds, prepend=seconds[0])
+        dt[group_starts] = 0.0
+        unchanged = np.r_[False, np.abs(np.diff(values)) < 1e-9]
+        unchanged[group_starts] = False
+        is_gap = dt > gap_sec
+
+        def group_sum(x):
+            return np.add.reduceat(x, group_starts)
+
+        stats = pd.DataFrame(
+            {
+                "n_samples": n_samples,
+                "start": seconds[group_starts],
+                "end": seconds[np.r_[group_starts[1:], len(seconds)] - 1],
+                "value_min": np.minimum.reduceat(values, group_starts),
+                "value_max": np.maximum.reduceat(values, group_starts),
+                "max_gap_sec": np.maximum.reduceat(dt, group_starts),
+                "n_gaps": group_sum(is_gap.astype(np.int64)),
+                "gap_time": group_sum(np.where(is_gap, dt, 0.0)),
+                "stuck_time": group_sum(np.where(unchanged, dt, 0.0)),
+                "covered_time": group_sum(np.where(is_gap, 0.0, dt)),
+            },
+            index=pd.Index(np.asarray(record_ids), name="record_id"),
+        )
+        return self._judge_quality(stats, seconds.max() - seconds.min(), thresholds)
+
+    def _judge_quality(self, stats, duration, thresholds):
+        """
+        Miary jakości i decyzja o odrzuceniu na podstawie statystyk nagrań
+        (wspólne dla preprocessingu w pamięci i OUT_OF_CORE).
+
+        Args:
+            stats: DataFrame (record_id) z n_samples, start, end, value_min,
+                value_max, max_gap_sec, n_gaps, gap_time, stuck_time, covered_time
+            duration: długość całego nagrania [s]
+            thresholds: progi QUALITY_*
+
+        Returns:
+            DataFrame indeksowany record_id
+        """
+        span = (stats["end"] - stats["start"]).replace(0, np.nan)
+
+        quality = pd.DataFrame(index=stats.index)
+        quality["n_samples"] = stats["n_samples"]
+        quality["effective_rate_hz"] = (stats["n_samples"] - 1) / span
+        quality["n_gaps"] = stats["n_gaps"].astype(int)
+        quality["max_gap_sec"] = stats["max_gap_sec"]
+        quality["gap_fraction"] = stats["gap_time"] / span
+        quality["stuck_fraction"] = stats["stuck_time"] / span
+        quality["range_usage"] = (stats["value_max"] - stats["value_min"]) / 100.0
+        quality["interpolated_fraction"] = (
+            1.0 - stats["covered_time"] / duration if duration > 0 else 0.0
+        )
+        quality = quality.fillna(
+            {"effective_rate_hz": 0, "gap_fraction": 1, "stuck_fraction": 1}
+        )
+
+        # Kryteria odrzucenia (wektorowo, wszystkie nagrania naraz)
+        min_rate = thresholds["QUALITY_MIN_RATE_HZ"]
+        failed = pd.DataFrame(
+            {
+                "rate": quality["effective_rate_hz"] < min_rate,
+                "interpolated": quality["interpolated_fraction"]
+                > thresholds["QUALITY_MAX_INTERPOLATED"],
+                "stuck": quality["stuck_fraction"] > thresholds["QUALITY_MAX_STUCK"],
+                "range": quality["range_usage"] < thresholds["QUALITY_MIN_RANGE"],
+            }
+        )
+        quality["usable"] = ~failed.any(axis=1)
+        quality["reasons"] = [
+            ",".join(failed.columns[row]) for row in failed.to_numpy()
+        ]
+
+        references = self.get_reference_ids()
+        unusable = quality.index[~quality["usable"]]
+        for reference in unusable.intersection(references):
+            print(
+                f"   (!) Referencja {reference} nie spełnia progów jakości "
+                f"({quality.at[reference, 'reasons']}) - pozostaje w analizie."
+            )
+        if self.cfg.get("QUALITY_DROP", True):
+            self.excluded_records = [rid for rid in unusable if rid not in references]
+
+        print(
+            f"   -> Jakość danych: {int(quality['usable'].sum())}/{len(quality)} "
+            f"nagrań poprawnych, odrzucono: {len(self.excluded_records)}"
+        )
+        return quality
+
+    def export_quality_report(self):
+        """Zapisuje raport jakości nagrań (00_data_quality.csv)."""
+        if self.quality_df is None:
+            return
+
+        report = self.quality_df.copy()
+        report.insert(
+            0, "label", [self.get_record_label(rid) for rid in report.index]
+        )
+        report["excluded"] = report.index.isin(self.excluded_records)
+
+        path = self.get_output_path(
+            base_name="data_quality", prefix="00_", extension=".csv"
+        )
+        report.to_csv(path)
+        print(f"   -> Raport jakości zapisany: {path}")
+
+    def _check_stationarity(self):
+        """Test Dickeya-Fullera (ADF) dla każdego szeregu różnicowego."""
         from statsmodels.tsa.stattools import adfuller
 
         non_stationary = []
@@ -83,10 +425,77 @@ class MusicalMetaAnalyzer:
         else:
             print("   -> Wszystkie szeregi czasowe są stacjonarne według testu ADF.")
 
+    def get_analysis_rate(self):
+        """
+        Częstotliwość próbkowania danych po preprocessingu (Hz).
+
+        Returns:
+            float: ANALYSIS_RATE_HZ (jeśli ustawione, najwyżej SAMPLING_RATE_HZ)
+                lub SAMPLING_RATE_HZ
+        """
+        sampling_rate = self.cfg["SAMPLING_RATE_HZ"]
+        analysis_rate = self.cfg.get("ANALYSIS_RATE_HZ") or sampling_rate
+        return min(analysis_rate, sampling_rate)
+
+    def seconds_to_samples(self, seconds):
+        """Konwertuje czas [s] na liczbę próbek przy częstotliwości analizy."""
+        return int(seconds * self.get_analysis_rate())
+
+    def _decimate(self, df):
+        """
+        Decymacja wszystkich szeregów do ANALYSIS_RATE_HZ wzdłuż osi czasu.
+        Polifazowy filtr FIR (resample_poly) pełni rolę filtru antyaliasingowego.
+        """
+        from fractions import Fraction
+        from scipy.signal import resample_poly
+
+        ratio = Fraction(
+            self.get_analysis_rate() / self.cfg["SAMPLING_RATE_HZ"]
+        ).limit_denominator(1000)
+        up, down = ratio.numerator, ratio.denominator
+
+        values = resample_poly(
+            df.to_numpy(), up, down, axis=0, padtype="line"
+        )
+
+        if up == 1:
+            index = df.index[::down][: values.shape[0]]
+        else:
+            positions = np.arange(values.shape[0]) * down / up
+            index = pd.Index(
+                np.interp(positions, np.arange(len(df.index)), df.index),
+                name=df.index.name,
+            )
+
         print(
-            f"   -> Dane gotowe i naprawione (Clip 0-100). Liczba szeregów: {self.df_diff.shape[1]}"
+            f"   -> Decymacja {self.cfg['SAMPLING_RATE_HZ']} Hz -> "
+            f"{self.get_analysis_rate()} Hz ({len(df.index)} -> {len(index)} próbek)"
         )
-        print(f"   -> Czas trwania: {self.df_diff.index.max():.2f}s")
+        return pd.DataFrame(values, index=index, columns=df.columns)
+
+    def get_reference_ids(self):
+        """
+        Nagrania referencyjne - COMPOSER_ID jako pojedynczy ID lub lista
+        (np. oryginalne nagranie kompozytora, ponowne nagrania).
+        Pierwsza referencja jest główną (wykresy, moduły jednoreferencyjne).
+
+        Returns:
+            list: identyfikatory referencji
+        """
+        references = self.cfg.get("COMPOSER_ID")
+        if isinstance(references, (list, tuple)):
+            return [ref for ref in references if ref]
+        return [references] if references else []
+
+    def get_reference_suffix(self, reference):
+        """
+        Sufiks nazw plików wyników danej referencji ("" przy jednej referencji,
+        nazwy plików jak dotychczas).
+        """
+        if len(self.get_reference_ids()) <= 1:
+            return ""
+        label = re.sub(r"[^\w.-]+", "_", self.get_record_label(reference))
+        return f"_ref_{label}"
 
     def get_record_label(self, record_id):
         """
@@ -172,6 +581,8 @@ class MusicalMetaAnalyzer:
             ax: matplotlib axis object
             timestamps: pandas Index lub array z timestampami
         """
+        import matplotlib.ticker as ticker
+
         time_seconds = self.get_time_axis_seconds(timestamps)
         grid_size = self.cfg.get("GRID_SIZE", 10)  # domyślnie 10 sekund
 
@@ -189,36 +600,23 @@ class MusicalMetaAnalyzer:
         1. Dane standaryzowane (Z-Score) - skala używana w analizach
         2. Dane znormalizowane (0-100) - surowe wartości suwaka
         """
+        import matplotlib.pyplot as plt
+
         print("--- [Moduł Core] Generowanie wykresów odpowiedzi ---")
 
-        if self.df_pivot is None or self.df_raw is None:
+        df_raw = self.df_raw  # Odtwarzane jednorazowo, jeśli nie przechowywane
+        if self.df_pivot is None or df_raw is None:
             print("   (!) Brak danych do wizualizacji.")
             return
 
-        composer_id = self.cfg.get("COMPOSER_ID")
         time_seconds = self.get_time_axis_seconds(self.df_pivot.index)
 
+        # Liczba uczestników (bez kompozytora)
+        n_participants = len(self.df_pivot.columns.difference(self.get_reference_ids()))
+
         # === Wykres 1: Dane Standaryzowane (Z-Score) ===
         fig, ax = plt.subplots(figsize=(16, 8))
-
-        # Liczba uczestników (bez kompozytora)
-        n_participants = len(self.df_pivot.columns) - 1
-
-        for col in self.df_pivot.columns:
-            if col == composer_id:
-                label = self.get_record_label(col)
-                ax.plot(
-                    time_seconds,
-                    self.df_pivot[col],
-                    label=f"KOMPOZYTOR: {label}",
-                    linewidth=2.5,
-                    color="red",
-                    alpha=0.9,
-                    zorder=10,
-                )
-            else:
-                # Uczestnicy z kolorami, ale bez etykiet
-                ax.plot(time_seconds, self.df_pivot[col], linewidth=0.8, alpha=0.6)
+        self._plot_responses(ax, "pivot", self.df_pivot, time_seconds)
 
         self.setup_time_axis(ax, self.df_pivot.index)
         ax.set_ylabel("Wynik standaryzowany (Z-Score)", fontsize=11)
@@ -237,34 +635,11 @@ class MusicalMetaAnalyzer:
         plt.close()
         print(f"   -> Wykres standaryzowany zapisany: {img_path}")
 
-        img_path = self.get_output_path(
-            base_name="responses_normalized", prefix="00_", extension=".png"
-        )
-        plt.tight_layout()
-        plt.savefig(img_path, dpi=150, bbox_inches="tight")
-        plt.close()
-        print(f"   -> Wykres znormalizowany zapisany: {img_path}")
-
         # === Wykres 2: Dane Znormalizowane (0-100) ===
         fig, ax = plt.subplots(figsize=(16, 8))
+        self._plot_responses(ax, "raw", df_raw, time_seconds)
 
-        for col in self.df_raw.columns:
-            if col == composer_id:
-                label = self.get_record_label(col)
-                ax.plot(
-                    time_seconds,
-                    self.df_raw[col],
-                    label=f"KOMPOZYTOR: {label}",
-                    linewidth=2.5,
-                    color="red",
-                    alpha=0.9,
-                    zorder=10,
-                )
-            else:
-                # Uczestnicy z kolorami, ale bez etykiet
-                ax.plot(time_seconds, self.df_raw[col], linewidth=0.8, alpha=0.6)
-
-        self.setup_time_axis(ax, self.df_raw.index)
+        self.setup_time_axis(ax, df_raw.index)
         ax.set_ylabel("Wartość suwaka [0-100]", fontsize=11)
         ax.set_title(
             f"Odpowiedzi uczestników - Dane znormalizowane\n{self.cfg.get('NAME', '')} (N={n_participants})",
@@ -282,13 +657,51 @@ class MusicalMetaAnalyzer:
         plt.close()
         print(f"   -> Wykres znormalizowany zapisany: {img_path}")
 
+    def _plot_responses(self, ax, cache_key, frame, time_seconds):
+        """
+        Rysuje odpowiedzi wszystkich uczestników jako jedną LineCollection
+        (serie zdecymowane do rozdzielczości wykresu) i kompozytora na wierzchu.
+        """
+        from plotting import cached_decimation, draw_line_collection
+
+        references = self.get_reference_ids()
+        decimated = cached_decimation(self, cache_key, time_seconds, frame)
+        columns = decimated["columns"]
+
+        # Uczestnicy z kolorami, ale bez etykiet
+        participants = [i for i, col in enumerate(columns) if col not in references]
+        draw_line_collection(
+            ax,
+            decimated["x"][:, participants],
+            decimated["y"][:, participants],
+            linewidth=0.8,
+            alpha=0.6,
+        )
+
+        # Referencje: główna (kompozytor) na czerwono, kolejne przerywane
+        for n, reference in enumerate(references):
+            if reference not in columns:
+                continue
+            i = columns.index(reference)
+            label = self.get_record_label(reference)
+            ax.plot(
+                decimated["x"][:, i],
+                decimated["y"][:, i],
+                label=f"KOMPOZYTOR: {label}" if n == 0 else f"REFERENCJA: {label}",
+                linewidth=2.5 if n == 0 else 1.8,
+                linestyle="-" if n == 0 else "--",
+                color="red" if n == 0 else "black",
+                alpha=0.9,
+                zorder=10 - min(n, 1),
+            )
+
     def _generate_mock_data(self):
         """Generuje dane testowe z błędami (overshoot) do sprawdzenia fixa."""
         time_steps = 1000
         t = np.linspace(0, 50, time_steps)
         data = []
 
-        comp_id = self.cfg.get("COMPOSER_ID", "composer_mock")
+        comp_id = (self.get_reference_ids() or ["composer_mock"])[0]
         # Generujemy wartości wychodzące poza skalę (np. -5 do 105)
         comp_sig = np.sin(t * 0.5) * 55 + 50
 
@@ -0,0 +1,313 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from export import export_matrix
+
+# Jednostki czasu zdarzeń: "ms" - timestampy UTC jak w danych, "s" - sekundy
+# od początku nagrania
+EPOCH_TIME_UNITS = ("ms", "s")
+EPOCH_PRE_SEC = 2.0
+EPOCH_POST_SEC = 8.0
+EPOCH_LATENCY_THRESHOLD = 0.5  # Zmiana względem linii bazowej (Z-Score)
+
+
+def load_events(path, time_field="timestamp"):
+    """
+    Wczytuje zdarzenia koncertu z pliku eksportu.
+
+    JSON: lista zdarzeń w formacie eksportu device-manager (eventType, label,
+    payload, position) lub {"events": [...]}; czas z pola time_field zdarzenia
+    albo jego payloadu. CSV: kolumna time_field i opcjonalnie label.
+
+    Returns:
+        DataFrame: time, label (zdarzenia bez czasu pominięte, posortowane)
+    """
+    if os.path.splitext(path)[1].lower() == ".csv":
+        df = pd.read_csv(path)
+        if time_field not in df.columns:
+            raise ValueError(f"Brak kolumny '{time_field}' w pliku zdarzeń {path}")
+        labels = df["label"] if "label" in df.columns else df.index.astype(str)
+        events = pd.DataFrame({"time": df[time_field], "label": labels})
+    else:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get("events", [])
+        rows = []
+        for i, event in enumerate(data):
+            payload = event.get("payload") or {}
+            time = event.get(time_field, payload.get(time_field))
+            label = event.get("label") or event.get("eventType") or str(i)
+            rows.append({"time": time, "label": str(label)})
+        events = pd.DataFrame(rows, columns=["time", "label"])
+
+    events["time"] = pd.to_numeric(events["time"], errors="coerce")
+    missing = int(events["time"].isna().sum())
+    if missing:
+        print(f"   (!) Pominięto {missing} zdarzeń bez czasu ('{time_field}').")
+    return events.dropna(subset=["time"]).sort_values("time", ignore_index=True)
+
+
+def extract_epochs(values, onsets, pre, post):
+    """
+    Okna wokół zdarzeń dla wszystkich sygnałów naraz, bez kopii danych.
+
+    sliding_window_view to widok (strides) wszystkich okien długości
+    pre + post; okna zdarzeń wybierane są leniwie przez zwrócone indeksy
+    (windows[index]) - kopia E × N × L powstaje dopiero w baseline_correct
+    jako jego wynik.
+
+    Args:
+        values: macierz (T × N)
+        onsets: indeksy próbek zdarzeń (E,), pre <= onset <= T - post
+        pre, post: próbki przed / od zdarzenia
+
+    Returns:
+        tuple: (widok okien ((T - L + 1) × N × L) tylko do odczytu,
+        indeksy okien zdarzeń (E,))
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    windows = sliding_window_view(values, pre + post, axis=0)
+    return windows, np.asarray(onsets) - pre
+
+
+def baseline_correct(windows, pre, index=None):
+    """
+    Odejmuje średnią sprzed zdarzenia (osobno dla każdej pary zdarzenie × sygnał).
+
+    Args:
+        windows: epoki (E × N × L) lub widok okien z extract_epochs
+        pre: próbki przed zdarzeniem
+        index: indeksy okien zdarzeń (z extract_epochs) - wybór okien
+            i korekta w jednej alokacji wyniku
+
+    Returns:
+        numpy array (E × N × L)
+    """
+    if index is None:
+        return windows - windows[..., :pre].mean(axis=-1, keepdims=True)
+    epochs = windows[index]
+    epochs -= epochs[..., :pre].mean(axis=-1, keepdims=True)
+    return epochs
+
+
+def reaction_latencies(corrected, pre, threshold):
+    """
+    Pierwsza próbka od zdarzenia, w której |zmiana| przekracza próg, oraz
+    zmiana szczytowa (ze znakiem) - wektorowo dla zdarzeń × sygnałów.
+
+    Returns:
+        tuple: (latencje w próbkach, NaN gdy brak reakcji; zmiana szczytowa)
+    """
+    after = corrected[..., pre:]
+    crossed = np.abs(after) > threshold
+    latency = np.argmax(crossed, axis=-1).astype(float)
+    latency[~crossed.any(axis=-1)] = np.nan
+
+    peak_idx = np.argmax(np.abs(after), axis=-1)
+    peak = np.take_along_axis(after, peak_idx[..., None], axis=-1)[..., 0]
+    return latency, peak
+
+
+class EpochModule:
+    def __init__(self, analyzer_instance):
+        """
+        Analiza epok względem zdarzeń koncertu (EPOCH_EVENTS_FILE): okna
+        EPOCH_PRE_SEC / EPOCH_POST_SEC wokół każdego zdarzenia, średnie
+        z korekcją linii bazowej i latencje reakcji słuchaczy.
+        """
+        self.parent = analyzer_instance
+        self.cfg = analyzer_instance.cfg
+        self.df_pivot = analyzer_instance.df_pivot  # Dane Z-Score
+
+        self.events = None  # Zdarzenia w zakresie nagrania
+        self.listeners = []
+        self.offsets_sec = None  # Czas względem zdarzenia (oś okna)
+        self.average = None  # Średnia po zdarzeniach: czas okna × słuchacze
+        self.event_means = None  # Średnia po słuchaczach: czas okna × zdarzenia
+        self.latencies = None  # Tabela zdarzenie × słuchacz
+
+    def run_analysis(self):
+        print("--- [Moduł Epochs] Odpowiedzi względem zdarzeń koncertu ---")
+
+        path = self.cfg.get("EPOCH_EVENTS_FILE")
+        if not path:
+            print("   (!) Brak EPOCH_EVENTS_FILE. Pomijam.")
+            return None
+        if self.df_pivot is None or self.df_pivot.empty:
+            print("   (!) Brak danych wejściowych.")
+            return None
+
+        events = load_events(path, self.cfg.get("EPOCH_TIME_FIELD", "timestamp"))
+        unit = self.cfg.get("EPOCH_TIME_UNIT", "ms")
+        if unit not in EPOCH_TIME_UNITS:
+            print(f"   (!) Nieznana jednostka czasu '{unit}', używam ms.")
+            unit = "ms"
+
+        timestamps = np.asarray(self.df_pivot.index, dtype=float)
+        times = events["time"].to_numpy(dtype=float)
+        if unit == "s":
+            times = timestamps[0] + times * 1000.0
+
+        pre = self.parent.seconds_to_samples(
+            self.cfg.get("EPOCH_PRE_SEC", EPOCH_PRE_SEC)
+        )
+        post = self.parent.seconds_to_samples(
+            self.cfg.get("EPOCH_POST_SEC", EPOCH_POST_SEC)
+        )
+        if pre < 1 or post < 1:
+            print("   (!) Okno przed / po zdarzeniu krótsze niż 1 próbka.")
+            return None
+
+        # Zdarzenie -> pierwsza próbka od jego czasu; okno musi mieścić się w nagraniu
+        onsets = np.clip(np.searchsorted(timestamps, times), 0, len(timestamps) - 1)
+        inside = (
+            (times >= timestamps[0])
+            & (times <= timestamps[-1])
+            & (onsets >= pre)
+            & (onsets <= len(timestamps) - post)
+        )
+        if not inside.all():
+            print(
+                f"   (!) Pominięto {int((~inside).sum())} zdarzeń poza nagraniem "
+                "lub zbyt blisko jego brzegów."
+            )
+        self.events = events[inside].reset_index(drop=True)
+        onsets = onsets[inside]
+        if not len(onsets):
+            print("   (!) Brak zdarzeń w zakresie nagrania.")
+            return None
+
+        references = set(self.parent.get_reference_ids())
+        self.listeners = [c for c in self.df_pivot.columns if c not in references]
+        print(
+            f"   Zdarzeń: {len(onsets)}, słuchaczy: {len(self.listeners)}, "
+            f"okno: -{pre} / +{post} próbek"
+        )
+
+        values = self.df_pivot[self.listeners].to_numpy(dtype=float)
+        windows, index = extract_epochs(values, onsets, pre, post)
+        corrected = baseline_correct(windows, pre, index)
+        rate = self.parent.get_analysis_rate()
+        self.offsets_sec = (np.arange(pre + post) - pre) / rate
+
+        labels = [self.parent.get_record_label(rid) for rid in self.listeners]
+        index = pd.Index(self.offsets_sec, name="offset_sec")
+        self.average = pd.DataFrame(
+            corrected.mean(axis=0).T, index=index, columns=labels
+        )
+        self.event_means = pd.DataFrame(
+            corrected.mean(axis=1).T,
+            index=index,
+            columns=[f"{i}_{label}" for i, label in enumerate(self.events["label"])],
+        )
+
+        threshold = self.cfg.get("EPOCH_LATENCY_THRESHOLD", EPOCH_LATENCY_THRESHOLD)
+        latency, peak = reaction_latencies(corrected, pre, threshold)
+        n_events, n_listeners = latency.shape
+        self.latencies = pd.DataFrame(
+            {
+                "event": np.repeat(np.arange(n_events), n_listeners),
+                "event_label": np.repeat(self.events["label"].to_numpy(), n_listeners),
+                "event_time": np.repeat(timestamps[onsets], n_listeners),
+                "record_id": np.tile(self.listeners, n_events),
+                "label": np.tile(labels, n_events),
+                "latency_sec": latency.ravel() / rate,
+                "peak_change": peak.ravel(),
+            }
+        )
+
+        reacted = np.isfinite(latency)
+        median = np.nanmedian(latency) / rate if reacted.any() else np.nan
+        print(
+            f"   -> Reakcje powyżej progu {threshold:g}: {reacted.mean():.0%} par, "
+            f"mediana latencji {median:.2f}s"
+        )
+        return self.average
+
+    def export_results(self):
+        """Średnie względem zdarzeń (EXPORT_FORMAT) i tabela latencji CSV."""
+        if self.average is None:
+            return
+
+        average = self.average.copy()
+        average.insert(0, "EPOCH_MEAN", self.average.mean(axis=1))
+        export_matrix(self.parent, average, base_name="epochs_average", prefix="09_")
+        export_matrix(
+            self.parent, self.event_means, base_name="epochs_events", prefix="09_"
+        )
+
+        csv_path = self.parent.get_output_path(
+            base_name="epochs_latencies", prefix="09_"
+        )
+        self.latencies.to_csv(csv_path, index=False)
+        print(f"   -> Latencje zapisane: {csv_path}")
+
+    def export_graph(self):
+        """
+        Wykres: średnia odpowiedź względem zdarzenia (każde zdarzenie i średnia
+        ogólna) oraz rozkład latencji reakcji dla każdego zdarzenia.
+        """
+        if self.average is None:
+            print("   (!) Brak danych epok do wykresu.")
+            return
+
+        import matplotlib.pyplot as plt
+
+        print("   Generowanie wykresu epok...")
+        try:
+            fig, (ax_avg, ax_lat) = plt.subplots(
+                2, 1, figsize=(14, 10), gridspec_kw={"height_ratios": [3, 2]}
+            )
+
+            colors = plt.cm.viridis(np.linspace(0, 0.9, self.event_means.shape[1]))
+            for color, column in zip(colors, self.event_means.columns):
+                ax_avg.plot(
+                    self.offsets_sec,
+                    self.event_means[column],
+                    color=color,
+                    linewidth=1.0,
+                    alpha=0.6,
+                )
+            ax_avg.plot(
+                self.offsets_sec,
+                self.average.mean(axis=1),
+                color="black",
+                linewidth=2.5,
+                label="Średnia (zdarzenia × słuchacze)",
+            )
+            ax_avg.axvline(0, color="red", linestyle="--", linewidth=1.2)
+            ax_avg.axhline(0, color="gray", linestyle=":", linewidth=0.8)
+            ax_avg.set_xlabel("Czas względem zdarzenia [s]", fontsize=11)
+            ax_avg.set_ylabel("Zmiana względem linii bazowej (Z-Score)", fontsize=11)
+            ax_avg.legend(loc="upper right", fontsize=9)
+            ax_avg.set_title(
+                f"Odpowiedzi względem zdarzeń koncertu\n{self.cfg.get('NAME', '')} "
+                f"(zdarzeń: {len(self.events)}, słuchaczy: {len(self.listeners)})",
+                fontsize=13,
+                fontweight="bold",
+            )
+
+            groups = [
+                group["latency_sec"].dropna().to_numpy()
+                for _, group in self.latencies.groupby("event", sort=True)
+            ]
+            ax_lat.boxplot(groups, showfliers=False)
+            ax_lat.set_xticks(range(1, len(groups) + 1))
+            ax_lat.set_xticklabels(self.events["label"], rotation=45, ha="right")
+            ax_lat.set_ylabel("Latencja reakcji [s]", fontsize=11)
+
+            plt.tight_layout()
+            img_path = self.parent.get_output_path(
+                base_name="epochs_visual", prefix="09_", extension=".png"
+            )
+            plt.savefig(img_path, dpi=150, bbox_inches="tight")
+            plt.close(fig)
+            print(f"   -> Wykres epok zapisany: {img_path}")
+
+        except Exception as e:
+            plt.close("all")
+            print(f"   (!) Błąd wykresu epok: {e}")
@@ -0,0 +1,195 @@
+import csv
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Backendy eksportu macierzy wyników (czas × słuchacze), wybierane przez
+# EXPORT_FORMAT w konfiguracji projektu:
+#   csv     - tekst; zapis porcjami z szybkim formatowaniem liczb
+#   parquet - kolumnowy, kompresja zstd (wymaga pyarrow)
+#   npy     - macierz float32 (.npy) + indeks/kolumny w JSON
+CSV_CHUNK_ROWS = 5000
+CSV_FLOAT_FORMAT = "%.17g"  # Pełna precyzja float64 (odczyt bez strat)
+CSV_INDEX_FORMAT = "%.17g"
+
+
+def _csv_quote(value):
+    text = str(value)
+    if any(ch in text for ch in ',"\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def _blank_nan(text):
+    """NaN jako puste pole (jak pandas.to_csv) w tekście samych liczb."""
+    text = text.replace(",nan", ",")
+    return ("\n" + text).replace("\nnan", "\n")[1:]
+
+
+def _export_csv(df, path, index, cfg):
+    """
+    CSV zapisywany porcjami. Każda porcja formatowana jednym wywołaniem
+    operatora % na całym bloku (zamiast formatowania komórka po komórce).
+    NaN zapisywane jako puste pole.
+    """
+    float_format = cfg.get("CSV_FLOAT_FORMAT", CSV_FLOAT_FORMAT)
+    values = df.to_numpy(dtype=float)
+    n_cols = values.shape[1]
+
+    line_format = ",".join([float_format] * n_cols) + "\n"
+    if index:
+        if pd.api.types.is_numeric_dtype(df.index):
+            index_values = [
+                "" if np.isnan(v) else CSV_INDEX_FORMAT % v
+                for v in np.asarray(df.index, dtype=float).tolist()
+            ]
+        else:
+            # Etykiety tekstowe (np. macierz podobieństwa) - cytowanie jak w csv
+            index_values = [_csv_quote(v) for v in df.index]
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        header = [str(c) for c in df.columns]
+        if index:
+            header = [df.index.name or ""] + header
+        csv.writer(f, lineterminator="\n").writerow(header)
+
+        for start in range(0, len(values), CSV_CHUNK_ROWS):
+            block = values[start : start + CSV_CHUNK_ROWS]
+            text = (line_format * len(block)) % tuple(block.ravel().tolist())
+            if np.isnan(block).any():
+                text = _blank_nan(text)
+            if index:
+                # Indeks doklejany po zamianie NaN (etykiety nie są modyfikowane)
+                labels = index_values[start : start + CSV_CHUNK_ROWS]
+                rows = text.split("\n")
+                text = "".join(f"{label},{row}\n" for label, row in zip(labels, rows))
+            f.write(text)
+
+    return [path]
+
+
+def _export_parquet(df, path, index, cfg):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("   (!) Brak pakietu pyarrow - zapis Parquet niemożliwy, używam CSV.")
+        return _export_csv(df, os.path.splitext(path)[0] + ".csv", index, cfg)
+
+    out = df.copy(deep=False)
+    out.columns = [str(c) for c in out.columns]
+    out.to_parquet(path, compression="zstd", index=index)
+    return [path]
+
+
+def _export_npy(df, path, index, cfg):
+    np.save(path, df.to_numpy(dtype=np.float32))
+
+    index_path = os.path.splitext(path)[0] + ".json"
+    meta = {
+        "dtype": "float32",
+        "shape": list(df.shape),
+        "columns": [str(c) for c in df.columns],
+        "index_name": df.index.name,
+        "index": np.asarray(df.index).tolist() if index else None,
+    }
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    return [path, index_path]
+
+
+def export_cube(analyzer, values, axes, base_name, prefix="", attrs=None):
+    """
+    Zapisuje tablicę wielowymiarową (np. okna × czas × słuchacze) jako float32
+    .npy z opisem osi w JSON (niezależnie od EXPORT_FORMAT).
+
+    Args:
+        analyzer: instancja MusicalMetaAnalyzer (konfiguracja + ścieżki)
+        values: numpy array
+        axes: dict nazwa osi -> etykiety (w kolejności wymiarów values)
+        base_name, prefix: jak w get_output_path
+        attrs: dodatkowe pola opisu (np. sposób liczenia wartości)
+
+    Returns:
+        list: ścieżki zapisanych plików
+    """
+    path = analyzer.get_output_path(
+        base_name=base_name, prefix=prefix, extension=".npy"
+    )
+    np.save(path, np.asarray(values, dtype=np.float32))
+
+    axes_path = os.path.splitext(path)[0] + ".json"
+    meta = {
+        "dtype": "float32",
+        "shape": list(np.shape(values)),
+        "axes": {name: list(labels) for name, labels in axes.items()},
+        **(attrs or {}),
+    }
+    with open(axes_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    size_mb = (os.path.getsize(path) + os.path.getsize(axes_path)) / 1024**2
+    print(f"   -> Wyniki zapisano: {path} ({size_mb:.1f} MB)")
+    return [path, axes_path]
+
+
+EXPORT_BACKENDS = {
+    "csv": (".csv", _export_csv),
+    "parquet": (".parquet", _export_parquet),
+    "npy": (".npy", _export_npy),
+}
+
+
+def export_matrix(analyzer, df, base_name, prefix="", index=True):
+    """
+    Zapisuje macierz wyników w formacie EXPORT_FORMAT projektu.
+    Raportuje czas zapisu i rozmiar plików.
+
+    Args:
+        analyzer: instancja MusicalMetaAnalyzer (konfiguracja + ścieżki)
+        df: DataFrame z wartościami liczbowymi
+        base_name, prefix: jak w get_output_path
+
+    Returns:
+        list: ścieżki zapisanych plików
+    """
+    fmt = analyzer.cfg.get("EXPORT_FORMAT", "csv")
+    if fmt not in EXPORT_BACKENDS:
+        print(f"   (!) Nieznany format eksportu '{fmt}', używam CSV.")
+        fmt = "csv"
+
+    extension, backend = EXPORT_BACKENDS[fmt]
+    path = analyzer.get_output_path(
+        base_name=base_name, prefix=prefix, extension=extension
+    )
+
+    start = time.time()
+    paths = backend(df, path, index, analyzer.cfg)
+    elapsed = time.time() - start
+
+    size_mb = sum(os.path.getsize(p) for p in paths) / 1024**2
+    print(f"   -> Wyniki zapisano: {paths[0]} ({size_mb:.1f} MB, {elapsed:.2f}s)")
+    return paths
+
+
+def read_matrix(path):
+    """Wczytuje macierz zapisaną przez export_matrix (csv / parquet / npy)."""
+    extension = os.path.splitext(path)[1]
+
+    if extension == ".npy":
+        with open(os.path.splitext(path)[0] + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        values = np.load(path, mmap_mode="r")
+        index = None
+        if meta["index"] is not None:
+            index = pd.Index(meta["index"], name=meta["index_name"])
+        return pd.DataFrame(values, index=index, columns=meta["columns"])
+
+    if extension == ".parquet":
+        return pd.read_parquet(path)
+
+    # round_trip - dokładny odczyt zapisu %.17g (domyślny parser gubi ostatni bit)
+    return pd.read_csv(path, index_col=0, float_precision="round_trip")
@@ -1,8 +1,239 @@
+import hashlib
+import json
+import os
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from statsmodels.tsa.stattools import grangercausalitytests
-from tqdm import tqdm
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Kierunek netto przy teście dwukierunkowym (GRANGER_BIDIRECTIONAL):
+# (istotny referencja -> słuchacz, istotny słuchacz -> referencja) -> etykieta
+NET_DIRECTIONS = {
+    (True, False): "reference->listener",
+    (False, True): "listener->reference",
+    (True, True): "bidirectional",
+    (False, False): "none",
+}
+
+# Strategie wyboru opóźnienia:
+#   full   - wszystkie lagi 1..maxlag (dotychczasowe zachowanie)
+#   coarse - rzadka siatka lagów, potem doprecyzowanie wokół najlepszego
+#   ic     - kolejne lagi aż kryterium BIC przestanie się poprawiać
+LAG_SEARCH_STRATEGIES = ("full", "coarse", "ic")
+
+
+class GrangerCache:
+    def __init__(self, path, references, params):
+        """
+        Wyniki testu Grangera per para (słuchacz, referencja) w pliku JSONL
+        (jedna linia na parę, dopisywana od razu po obliczeniu - przerwany bieg
+        wznawia się od miejsca przerwania, nowe nagrania liczone są tylko raz).
+
+        Klucz: SHA-1 odcisku słuchacza, odcisku referencji i parametrów testu
+        (maxlag, próg p, strategia lagów, częstotliwość analizy). Zmiana danych
+        lub parametrów unieważnia wpis bez kasowania pliku.
+
+        Args:
+            path: ścieżka pliku .jsonl
+            references: dict referencja -> odcisk (bytes)
+            params: dict parametrów wpływających na wynik
+        """
+        self.path = path
+        self.hits = 0
+        base = hashlib.sha1(json.dumps(params, sort_keys=True).encode())
+        self._bases = {}
+        for reference, fingerprint in references.items():
+            self._bases[reference] = base.copy()
+            self._bases[reference].update(fingerprint)
+
+        self.entries = {}
+        complete = True
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    complete = line.endswith("\n")
+                    try:
+                        item = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Niedokończona linia po przerwaniu
+                    self.entries[item["key"]] = item["result"]
+        self._file = open(path, "a", encoding="utf-8")
+        if not complete:
+            self._file.write("\n")
+
+    def key(self, listener_fingerprint, reference):
+        digest = self._bases[reference].copy()
+        digest.update(listener_fingerprint)
+        return digest.hexdigest()
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is None:
+            return None
+        self.hits += 1
+        return dict(result)
+
+    def put(self, key, record_id, result):
+        """Dopisuje wynik i zapisuje na dysk (checkpoint)."""
+        self.entries[key] = dict(result)
+        line = {"key": key, "record_id": str(record_id), "result": result}
+        self._file.write(json.dumps(line, default=lambda value: value.item()) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class GrangerEngine:
+    def __init__(self, listener, reverse_cache=None):
+        """
+        Test F (ssr) przyczynowości Grangera referencja -> słuchacz w numpy,
+        zgodny z grangercausalitytests (statsmodels): stała i lagi 1..p obu
+        szeregów, model ograniczony bez lagów referencji.
+
+        Część słuchacza (macierz lagów, dopasowanie modelu ograniczonego) jest
+        liczona raz na lag i wspólna dla wszystkich referencji; model pełny
+        z twierdzenia Frischa-Waugha-Lovella - lagi referencji zrzutowane na
+        dopełnienie modelu ograniczonego (jedno mnożenie dla wszystkich naraz).
+
+        Test odwrotny (słuchacz -> referencja) ma ten sam model pełny
+        [1, lagi słuchacza, lagi referencji]: jedno rozwiązanie lstsq z dwiema
+        prawymi stronami daje SSR obu kierunków, a model ograniczony
+        referencji zależy tylko od (referencja, lag) - wspólny dla słuchaczy.
+
+        Args:
+            listener: szereg różnicowy słuchacza (T,)
+            reverse_cache: dict (referencja, lag) -> SSR modelu ograniczonego
+                referencji; podanie włącza test odwrotny (wyniki w reverse_stats)
+        """
+        self.listener = np.asarray(listener, dtype=float)
+        self.reverse_cache = reverse_cache
+        self.reverse_stats = {}  # Referencja -> {lag: (F, p-value, BIC)}
+
+    @staticmethod
+    def lag_matrix(series, lag):
+        """Widok (T - lag) × lag: kolumny series[t-1], ..., series[t-lag]."""
+        return sliding_window_view(series, lag + 1)[:, -2::-1]
+
+    @staticmethod
+    def _bic(ssr_full, lag, n_obs):
+        """BIC modelu pełnego (2 * lag + 1 parametrów) z SSR i liczby obserwacji."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            llf = -n_obs / 2.0 * (np.log(2 * np.pi) + np.log(ssr_full / n_obs) + 1)
+        return float(-2 * llf + np.log(n_obs) * (2 * lag + 1))
+
+    @classmethod
+    def _f_test(cls, ssr_restricted, ssr_full, lag, n_obs):
+        """Statystyka F, p-value i BIC modelu pełnego (2 * lag + 1 parametrów)."""
+        from scipy.stats import f as f_dist
+
+        df_resid = n_obs - 2 * lag - 1
+        with np.errstate(invalid="ignore", divide="ignore"):
+            f_stat = (ssr_restricted - ssr_full) / ssr_full / lag * df_resid
+        p_value = f_dist.sf(f_stat, lag, df_resid)
+        return float(f_stat), float(p_value), cls._bic(ssr_full, lag, n_obs)
+
+    def _reverse_restricted(self, reference, series, lag):
+        """SSR modelu referencja ~ 1 + własne lagi (raz na referencję i lag)."""
+        key = (reference, lag)
+        if key not in self.reverse_cache:
+            design = np.column_stack(
+                [self.lag_matrix(series, lag), np.ones(len(series) - lag)]
+            )
+            q, _ = np.linalg.qr(design)
+            target = series[lag:]
+            resid = target - q @ (q.T @ target)
+            self.reverse_cache[key] = resid @ resid
+        return self.reverse_cache[key]
+
+    def test(self, lag, references):
+        """
+        Test dla jednego lagu i wielu referencji.
+
+        Args:
+            lag: liczba opóźnień p
+            references: dict referencja -> szereg różnicowy (T,)
+
+        Returns:
+            dict: referencja -> (F, p-value, BIC modelu pełnego)
+        """
+        # Model ograniczony: y_t ~ 1 + y_{t-1..t-p} (baza ortonormalna Q)
+        target = self.listener[lag:]
+        n_obs = len(target)
+        restricted = np.column_stack(
+            [self.lag_matrix(self.listener, lag), np.ones(n_obs)]
+        )
+        q, _ = np.linalg.qr(restricted)
+        resid = target - q @ (q.T @ target)
+        ssr_restricted = resid @ resid
+
+        refs = list(references)
+        series = {r: np.asarray(references[r], dtype=float) for r in refs}
+        x_lags = np.hstack([self.lag_matrix(series[r], lag) for r in refs])
+        x_lags -= q @ (q.T @ x_lags)
+
+        results = {}
+        for i, reference in enumerate(refs):
+            x_block = x_lags[:, i * lag : (i + 1) * lag]
+            if self.reverse_cache is None:
+                coef = np.linalg.lstsq(x_block, resid, rcond=None)[0]
+                ssr_full = np.sum((resid - x_block @ coef) ** 2)
+                results[reference] = self._f_test(ssr_restricted, ssr_full, lag, n_obs)
+                continue
+
+            # Kierunek odwrotny: cel x_t, ten sam model pełny (FWL względem Q)
+            reverse_target = series[reference][lag:]
+            targets = np.column_stack(
+                [resid, reverse_target - q @ (q.T @ reverse_target)]
+            )
+            coef = np.linalg.lstsq(x_block, targets, rcond=None)[0]
+            ssr_full, reverse_ssr_full = np.sum((targets - x_block @ coef) ** 2, axis=0)
+            results[reference] = self._f_test(ssr_restricted, ssr_full, lag, n_obs)
+
+            reverse_restricted = self._reverse_restricted(
+                reference, series[reference], lag
+            )
+            self.reverse_stats.setdefault(reference, {})[lag] = self._f_test(
+                reverse_restricted, reverse_ssr_full, lag, n_obs
+            )
+        return results
+
+    def common_bic(self, lag, references, maxlag):
+        """
+        BIC modelu pełnego dopasowanego na wspólnej próbie t >= maxlag.
+
+        BIC z test() liczony jest na T - lag obserwacjach (jak statsmodels),
+        więc nie jest porównywalny między lagami; tu każdy lag 1..maxlag
+        dopasowany jest na tych samych T - maxlag obserwacjach.
+
+        Returns:
+            dict: referencja -> BIC
+        """
+        skip = maxlag - lag  # Pierwsze wiersze macierzy lagów poza wspólną próbą
+        target = self.listener[maxlag:]
+        n_obs = len(target)
+        restricted = np.column_stack(
+            [self.lag_matrix(self.listener, lag)[skip:], np.ones(n_obs)]
+        )
+        q, _ = np.linalg.qr(restricted)
+        resid = target - q @ (q.T @ target)
+
+        refs = list(references)
+        x_lags = np.hstack(
+            [
+                self.lag_matrix(np.asarray(references[r], dtype=float), lag)[skip:]
+                for r in refs
+            ]
+        )
+        x_lags -= q @ (q.T @ x_lags)
+
+        results = {}
+        for i, reference in enumerate(refs):
+            x_block = x_lags[:, i * lag : (i + 1) * lag]
+            coef = np.linalg.lstsq(x_block, resid, rcond=None)[0]
+            ssr_full = np.sum((resid - x_block @ coef) ** 2)
+            results[reference] = self._bic(ssr_full, lag, n_obs)
+        return results
 
 
 class GrangerModule:
@@ -13,81 +244,233 @@ class GrangerModule:
         self.results_df = None
 
     def run_analysis(self):
-        print("--- [Moduł Granger] Analiza Przyczynowości ---")
+        from tqdm import tqdm
 
-        composer_id = self.cfg["COMPOSER_ID"]
+        print("--- [Moduł Granger] Analiza Przyczynowości ---")
 
-        if composer_id not in self.df_diff.columns:
-            print(f"BŁĄD: Brak ID kompozytora '{composer_id}'")
+        references = []
+        for reference in self.parent.get_reference_ids():
+            if reference in self.df_diff.columns:
+                references.append(reference)
+            else:
+                print(f"BŁĄD: Brak ID referencji '{reference}'")
+        if not references:
             return {}
 
-        maxlag = int(self.cfg["GRANGER_MAX_LAG_SEC"] * self.cfg["SAMPLING_RATE_HZ"])
+        maxlag = self.parent.seconds_to_samples(self.cfg["GRANGER_MAX_LAG_SEC"])
         p_threshold = self.cfg["GRANGER_P_VALUE_THRESHOLD"]
-        listeners = [c for c in self.df_diff.columns if c != composer_id]
+        strategy = self.cfg.get("GRANGER_LAG_SEARCH", "full")
+        if strategy not in LAG_SEARCH_STRATEGIES:
+            print(f"   (!) Nieznana strategia '{strategy}', używam 'full'.")
+            strategy = "full"
+        self.lag_search = strategy
+        self.bidirectional = bool(self.cfg.get("GRANGER_BIDIRECTIONAL", False))
+        self._reverse_restricted = {}  # (referencja, lag) -> SSR, wspólne
+        listeners = [c for c in self.df_diff.columns if c not in references]
+        reference_series = {
+            ref: self.df_diff[ref].to_numpy(dtype=float) for ref in references
+        }
 
         stats_data = []
-        causal_map = {}
+        causal_maps = {ref: {} for ref in references}
 
-        print(f"   Parametry: Max Lag={maxlag} próbek, P-val < {p_threshold}")
+        print(
+            f"   Parametry: Max Lag={maxlag} próbek, P-val < {p_threshold}, "
+            f"Wyszukiwanie lagu: {strategy}, referencje: {len(references)}"
+            + (", oba kierunki" if self.bidirectional else "")
+        )
+
+        cache = self._open_cache(references, maxlag, p_threshold)
 
         for listener in tqdm(listeners, desc="   Analiza Granger", unit="listener"):
-            if self.df_diff[listener].std() < 1e-6:
-                stats_data.append(
-                    self._create_record(listener, False, "Flat Signal", 0, 1.0, 0.0)
+            entries, keys = {}, {}
+            if cache:
+                for ref in references:
+                    keys[ref] = cache.key(self._fingerprint(listener), ref)
+                    entries[ref] = cache.get(keys[ref])
+
+            # Referencje bez wyniku w cache - jeden przebieg na słuchacza
+            pending = {
+                ref: reference_series[ref]
+                for ref in references
+                if entries.get(ref) is None
+            }
+            if pending:
+                computed = self._analyze_listener(
+                    listener, pending, maxlag, p_threshold
                 )
-                continue
+                for ref, entry in computed.items():
+                    if cache and not entry["reason"].startswith("Error"):
+                        cache.put(keys[ref], listener, entry)
+                entries.update(computed)
 
-            data_pair = self.df_diff[[listener, composer_id]]
-            try:
-                gc_res = grangercausalitytests(data_pair, maxlag=maxlag, verbose=False)
-
-                best_lag = None
-                max_f_stat = -1.0
-                best_p_val = 1.0
-
-                for lag, result in gc_res.items():
-                    stats = result[0]["ssr_ftest"]
-                    if stats[1] < p_threshold:
-                        if stats[0] > max_f_stat:
-                            max_f_stat = stats[0]
-                            best_p_val = stats[1]
-                            best_lag = lag
-
-                if best_lag is not None:
-                    causal_map[listener] = best_lag
-                    stats_data.append(
-                        self._create_record(
-                            listener,
-                            True,
-                            "Significant",
-                            best_lag,
-                            best_p_val,
-                            max_f_stat,
-                        )
-                    )
-                else:
-                    stats_data.append(
-                        self._create_record(
-                            listener, False, "No Causality", 0, 1.0, 0.0
-                        )
-                    )
+            for ref in references:
+                entry = entries[ref]
+                entry["listener_id"] = self.parent.get_record_label(listener)
+                entry["reference"] = self.parent.get_record_label(ref)
+                if entry["is_causal"]:
+                    causal_maps[ref][listener] = entry["best_lag_samples"]
+                stats_data.append(entry)
+
+        if cache:
+            cache.close()
+            n_pairs = len(listeners) * len(references)
+            print(
+                f"   -> Cache: {cache.hits} z pliku, "
+                f"{n_pairs - cache.hits} policzonych ({cache.path})"
+            )
+
+        self.results_df = pd.DataFrame(stats_data)
+        if not self.results_df.empty:
+            self.results_df = self.results_df.sort_values(
+                by=["reference", "is_causal", "f_stat"],
+                ascending=[True, False, False],
+                kind="stable",
+            )
+
+        # Referencja główna - dotychczasowy interfejs dla modułów
+        self.parent.causal_lags_by_reference = causal_maps
+        self.parent.causal_listeners_lags = causal_maps[references[0]]
+        for ref, causal_map in causal_maps.items():
+            print(
+                f"   -> Zakończono ({self.parent.get_record_label(ref)}). "
+                f"Spójni: {len(causal_map)} / {len(listeners)}"
+            )
+            if self.bidirectional and not self.results_df.empty:
+                label = self.parent.get_record_label(ref)
+                directions = self.results_df.loc[
+                    self.results_df["reference"] == label, "direction"
+                ].value_counts()
+                counts = [
+                    f"{d}: {directions.get(d, 0)}" for d in NET_DIRECTIONS.values()
+                ]
+                print(f"      Kierunek netto: {', '.join(counts)}")
+        return self.parent.causal_listeners_lags
+
+    def _open_cache(self, references, maxlag, p_threshold):
+        """Cache wyników per słuchacz (GRANGER_CACHE) lub None."""
+        if not self.cfg.get("GRANGER_CACHE", True):
+            return None
+        path = self.cfg.get("GRANGER_CACHE_FILE") or self.parent.get_output_path(
+            base_name="granger_cache", prefix="01_", extension=".jsonl"
+        )
+        params = {
+            "maxlag": maxlag,
+            "p_threshold": p_threshold,
+            "lag_search": self.lag_search,
+            "coarse_step_sec": self.cfg.get("GRANGER_COARSE_STEP_SEC", 0.2),
+            "ic_patience": self.cfg.get("GRANGER_IC_PATIENCE", 10),
+            "sampling_rate_hz": self.cfg["SAMPLING_RATE_HZ"],
+            "analysis_rate_hz": self.parent.get_analysis_rate(),
+            "preprocessing": "float64",
+        }
+        # Ścieżki preprocessingu dają różne liczby przy tych samych próbkach
+        if self.cfg.get("OUT_OF_CORE", False):
+            params["preprocessing"] = "out_of_core"
+        elif self.cfg.get("LOW_MEMORY", False):
+            params["preprocessing"] = "low_memory"
+        if self.bidirectional:
+            params["bidirectional"] = True
+        if self.lag_search == "ic":
+            params["ic_sample"] = "common"  # BIC na wspólnej próbie t >= maxlag
+        references = {ref: self._fingerprint(ref) for ref in references}
+        return GrangerCache(path, references, params)
+
+    def _fingerprint(self, record_id):
+        """
+        Odcisk nagrania do klucza cache: surowe próbki sprzed pivotu
+        (record_fingerprints) - dodanie innych nagrań nie unieważnia wpisu,
+        choć zmienia wspólną oś czasu. Wyniki w cache pochodzą wtedy z siatki
+        z chwili obliczenia (różnica tylko w interpolacji na nowych
+        znacznikach czasu). Bez odcisku (dane spoza load_and_preprocess) -
+        bajty szeregu różnicowego.
+        """
+        fingerprint = self.parent.record_fingerprints.get(record_id)
+        if fingerprint is None:
+            series = self.df_diff[record_id].to_numpy(dtype=np.float64)
+            return np.ascontiguousarray(series).tobytes()
+        return json.dumps(fingerprint).encode()
+
+    def _analyze_listener(self, listener, references, maxlag, p_threshold):
+        """
+        Testy Grangera referencje -> słuchacz dla jednego nagrania
+        (z GRANGER_BIDIRECTIONAL także słuchacz -> referencja na tych samych
+        lagach).
 
-            except Exception as e:
-                stats_data.append(
+        Returns:
+            dict: referencja -> rekord wyniku
+        """
+        if self.df_diff[listener].std() < 1e-6:
+            return {
+                ref: self._add_reverse(
+                    self._create_record(listener, False, "Flat Signal", 0, 1.0, 0.0)
+                )
+                for ref in references
+            }
+
+        try:
+            engine = GrangerEngine(
+                self.df_diff[listener].to_numpy(dtype=float),
+                reverse_cache=self._reverse_restricted if self.bidirectional else None,
+            )
+            lag_stats = self._search_lags(engine, references, maxlag, p_threshold)
+        except Exception as e:
+            return {
+                ref: self._add_reverse(
                     self._create_record(
                         listener, False, f"Error: {str(e)}", 0, 1.0, 0.0
                     )
                 )
+                for ref in references
+            }
 
-        self.results_df = pd.DataFrame(stats_data)
-        if not self.results_df.empty:
-            self.results_df = self.results_df.sort_values(
-                by=["is_causal", "f_stat"], ascending=[False, False]
+        records = {}
+        for ref, stats in lag_stats.items():
+            best_lag, max_f_stat, best_p_val = self._select_best_lag(
+                stats, p_threshold
             )
+            if best_lag is not None:
+                records[ref] = self._create_record(
+                    listener,
+                    True,
+                    "Significant",
+                    best_lag,
+                    best_p_val,
+                    max_f_stat,
+                    len(stats),
+                )
+            else:
+                records[ref] = self._create_record(
+                    listener, False, "No Causality", 0, 1.0, 0.0, len(stats)
+                )
+            self._add_reverse(records[ref], engine.reverse_stats.get(ref), p_threshold)
+        return records
 
-        self.parent.causal_listeners_lags = causal_map
-        print(f"   -> Zakończono. Spójni: {len(causal_map)} / {len(listeners)}")
-        return causal_map
+    def _add_reverse(self, record, reverse_stats=None, p_threshold=None):
+        """
+        Kolumny kierunku słuchacz -> referencja i kierunek netto
+        (tylko z GRANGER_BIDIRECTIONAL).
+        """
+        if not self.bidirectional:
+            return record
+        best_lag, f_stat, p_val = None, 0.0, 1.0
+        if reverse_stats:
+            best_lag, f_stat, p_val = self._select_best_lag(reverse_stats, p_threshold)
+        reverse_causal = best_lag is not None
+        if not reverse_causal:
+            f_stat, p_val = 0.0, 1.0
+        record.update(
+            {
+                "reverse_is_causal": reverse_causal,
+                "reverse_best_lag_samples": best_lag or 0,
+                "reverse_best_lag_sec": (best_lag or 0)
+                / self.parent.get_analysis_rate(),
+                "reverse_p_value": round(p_val, 6),
+                "reverse_f_stat": round(f_stat, 2),
+                "direction": NET_DIRECTIONS[record["is_causal"], reverse_causal],
+            }
+        )
+        return record
 
     def export_results(self):
         """Zapisuje wyniki używając funkcji z klasy bazowej."""
@@ -110,14 +493,24 @@ class GrangerModule:
         - Średnią odpowiedź uczestników przyczynowych (niebieska linia)
         - Zakres odpowiedzi przyczynowych (zielony obszar)
         """
-        if not self.parent.causal_listeners_lags:
+        causal_maps = self.parent.causal_lags_by_reference
+        if not any(causal_maps.values()):
             print("   (!) Brak danych przyczynowych do wykresu.")
             return
-        
+
         print("   Generowanie wykresu przyczynowości Grangera...")
-        
-        composer_id = self.cfg["COMPOSER_ID"]
-        causal_ids = list(self.parent.causal_listeners_lags.keys())
+        for reference, causal_lags in causal_maps.items():
+            if causal_lags:
+                self._export_reference_graph(reference, causal_lags)
+
+    def _export_reference_graph(self, composer_id, causal_lags):
+        """Wykres przyczynowości dla jednej referencji (plik z sufiksem referencji)."""
+        import matplotlib.pyplot as plt
+
+        causal_ids = list(causal_lags.keys())
+        n_listeners = len(
+            self.parent.df_pivot.columns.difference(self.parent.get_reference_ids())
+        )
         
         # Używamy danych standaryzowanych (Z-Score) ponieważ analiza była na Z-Score
         df_pivot = self.parent.df_pivot
@@ -156,7 +549,7 @@ class GrangerModule:
         ax.set_ylabel("Wynik standaryzowany (Z-Score)", fontsize=11)
         ax.set_title(
             f"Przyczynowość w sensie Grangera\n{self.cfg.get('NAME', '')}\n"
-            f"Uczestnicy przyczynowi: {len(causal_ids)} / {len(df_pivot.columns)-1}",
+            f"Uczestnicy przyczynowi: {len(causal_ids)} / {n_listeners}",
             fontsize=13, fontweight='bold'
         )
         ax.legend(loc='upper right', fontsize=10)
@@ -164,20 +557,112 @@ class GrangerModule:
         
         # Zapis
         img_path = self.parent.get_output_path(
-            base_name="granger_causality_visual", prefix="01_", extension=".png"
+            base_name="granger_causality_visual",
+            prefix="01_",
+            suffix=self.parent.get_reference_suffix(composer_id),
+            extension=".png",
         )
         plt.tight_layout()
         plt.savefig(img_path, dpi=150, bbox_inches='tight')
         plt.close()
         print(f"   -> Wykres przyczynowości zapisany: {img_path}")
 
-    def _create_record(self, lid, is_c, reason, lag, p, f):
+    @staticmethod
+    def _test_lags(engine, references, lags):
+        """
+        Test F (ssr) dla wskazanych lagów i wszystkich referencji.
+
+        Returns:
+            dict: referencja -> {lag: (F, p-value, BIC modelu pełnego)}
+        """
+        lag_stats = {ref: {} for ref in references}
+        for lag in lags:
+            for ref, result in engine.test(lag, references).items():
+                lag_stats[ref][lag] = result
+        return lag_stats
+
+    def _search_lags(self, engine, references, maxlag, p_threshold):
+        """
+        Ewaluuje lagi zgodnie ze strategią GRANGER_LAG_SEARCH - dla każdego lagu
+        jeden model ograniczony, referencje wymagające tego lagu razem.
+        """
+        if self.lag_search == "coarse":
+            rate = self.parent.get_analysis_rate()
+            step_sec = self.cfg.get("GRANGER_COARSE_STEP_SEC", 0.2)
+            step = max(1, int(round(step_sec * rate)))
+
+            grid = sorted(set(range(step, maxlag + 1, step)) | {1, maxlag})
+            lag_stats = self._test_lags(engine, references, grid)
+
+            # Doprecyzowanie wokół najlepszego lagu z siatki
+            # (lub wokół max F, gdy żaden lag nie jest istotny)
+            local = {}
+            for ref, stats in lag_stats.items():
+                center, _, _ = self._select_best_lag(stats, p_threshold)
+                if center is None:
+                    center = max(stats, key=lambda lag: stats[lag][0])
+                low, high = max(1, center - step + 1), min(maxlag, center + step - 1)
+                local[ref] = {lag for lag in range(low, high + 1) if lag not in stats}
+
+            for lag in sorted(set().union(*local.values())):
+                needed = {
+                    ref: references[ref] for ref in references if lag in local[ref]
+                }
+                for ref, result in engine.test(lag, needed).items():
+                    lag_stats[ref][lag] = result
+            return lag_stats
+
+        if self.lag_search == "ic":
+            # BIC porównywany na wspólnej próbie (t >= maxlag) dla wszystkich lagów
+            patience = self.cfg.get("GRANGER_IC_PATIENCE", 10)
+            lag_stats = {ref: {} for ref in references}
+            best_bic = {ref: np.inf for ref in references}
+            since_best = {ref: 0 for ref in references}
+            active = dict(references)
+            for lag in range(1, maxlag + 1):
+                if not active:
+                    break
+                bics = engine.common_bic(lag, active, maxlag)
+                for ref, (f_stat, p_val, _) in engine.test(lag, active).items():
+                    bic = bics[ref]
+                    lag_stats[ref][lag] = (f_stat, p_val, bic)
+                    if bic < best_bic[ref]:
+                        best_bic[ref] = bic
+                        since_best[ref] = 0
+                    else:
+                        since_best[ref] += 1
+                        if since_best[ref] >= patience:
+                            del active[ref]
+            return lag_stats
+
+        return self._test_lags(engine, references, range(1, maxlag + 1))
+
+    @staticmethod
+    def _select_best_lag(lag_stats, p_threshold):
+        """Najwyższa statystyka F wśród istotnych lagów -> (lag, F, p)."""
+        best_lag = None
+        max_f_stat = -1.0
+        best_p_val = 1.0
+
+        for lag in sorted(lag_stats):
+            f_stat, p_val, _ = lag_stats[lag]
+            if p_val < p_threshold:
+                if f_stat > max_f_stat:
+                    max_f_stat = f_stat
+                    best_p_val = p_val
+                    best_lag = lag
+
+        return best_lag, max_f_stat, best_p_val
+
+    def _create_record(self, lid, is_c, reason, lag, p, f, evaluated=0):
         return {
             "listener_id": self.parent.get_record_label(lid),
             "is_causal": is_c,
             "reason": reason,
             "best_lag_samples": lag,
-            "best_lag_sec": lag / self.cfg["SAMPLING_RATE_HZ"],
+            "best_lag_sec": lag / self.parent.get_analysis_rate(),
             "p_value": round(p, 6),
             "f_stat": round(f, 2),
+            "lag_search": self.lag_search,
+            "lags_evaluated": evaluated,
         }
@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+from export import export_matrix
+from narrative import fill_trajectory_gaps
+
+# Słuchacze przetwarzani naraz (pamięć: 3 macierze sum prefiksowych T × blok)
+ISC_BLOCK = 64
+
+
+def _prefix(values):
+    """Sumy prefiksowe wzdłuż czasu z zerem na początku (okno = P[b] - P[a])."""
+    out = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=out[1:])
+    return out
+
+
+def leave_one_out_isc(values, window_size, block=ISC_BLOCK):
+    """
+    Korelacja Pearsona każdego słuchacza ze średnią pozostałych
+    (leave-one-out) w oknach przesuwnych oraz dla całego nagrania.
+
+    Średnia pozostałych m_i = (S - x_i) / (N - 1), gdzie S to suma wszystkich
+    sygnałów, więc sumy okien Σm, Σm², Σxm wynikają z sum prefiksowych x, x²,
+    S·x (na słuchacza) oraz S, S² (wspólne) - O(N·T) łącznie, niezależnie od
+    długości okna.
+
+    Args:
+        values: macierz (T × N) sygnałów, N >= 3
+        window_size: długość okna w próbkach (okno kończy się w próbce t)
+        block: liczba słuchaczy przetwarzanych naraz
+
+    Returns:
+        tuple: (macierz T × N - ISC w oknach, NaN przed pierwszym pełnym
+        oknem; wektor N - ISC dla całego nagrania)
+    """
+    values = np.asarray(values, dtype=float)
+    n_samples, n_listeners = values.shape
+    scale = 1.0 / (n_listeners - 1)
+
+    total = values.sum(axis=1)
+    total_sum, total_sq = _prefix(total), _prefix(total**2)
+
+    # Granice okien: wszystkie pełne okna + całe nagranie (ostatni wiersz)
+    first = np.append(np.arange(n_samples - window_size + 1), 0)
+    last = np.append(np.arange(window_size, n_samples + 1), n_samples)
+    n = (last - first).astype(float)[:, None]
+    s = (total_sum[last] - total_sum[first])[:, None]
+    ss = (total_sq[last] - total_sq[first])[:, None]
+
+    isc = np.empty((len(first), n_listeners))
+    for start in range(0, n_listeners, block):
+        x = values[:, start : start + block]
+        x_sum, x_sq, sx_sum = _prefix(x), _prefix(x * x), _prefix(total[:, None] * x)
+
+        sx = x_sum[last] - x_sum[first]
+        sxx = x_sq[last] - x_sq[first]
+        ssx = sx_sum[last] - sx_sum[first]
+
+        # Sumy średniej pozostałych słuchaczy
+        sm = (s - sx) * scale
+        smm = (ss - 2 * ssx + sxx) * scale**2
+        sxm = (ssx - sxx) * scale
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            spread = (n * sxx - sx * sx) * (n * smm - sm * sm)
+            isc[:, start : start + block] = (n * sxm - sx * sm) / np.sqrt(spread)
+
+    isc = np.clip(isc, -1.0, 1.0)
+    windowed = np.full((n_samples, n_listeners), np.nan)
+    windowed[window_size - 1 :] = isc[:-1]
+    return windowed, isc[-1]
+
+
+class ISCModule:
+    def __init__(self, analyzer_instance):
+        """
+        Korelacja międzyosobnicza (ISC) w czasie: każdy słuchacz względem
+        średniej pozostałych (leave-one-out), niezależnie od kompozytora.
+        """
+        self.parent = analyzer_instance
+        self.cfg = analyzer_instance.cfg
+        self.df_pivot = analyzer_instance.df_pivot  # Dane Z-Score
+
+        self.window_sec = None
+        self.listeners = []
+        self.timecourse = None  # Czas × słuchacze (ISC w oknie)
+        self.group = None  # Przebieg grupowy (średnia i kwartyle)
+        self.summary = None  # ISC na słuchacza
+
+    def run_analysis(self):
+        print("--- [Moduł ISC] Korelacja międzyosobnicza (leave-one-out) ---")
+
+        if self.df_pivot is None or self.df_pivot.empty:
+            print("   (!) Brak danych wejściowych.")
+            return None
+
+        # Słuchacze bez referencji; sygnały płaskie pomijane (jak w Clustering)
+        references = set(self.parent.get_reference_ids())
+        self.listeners = [
+            c
+            for c in self.df_pivot.columns
+            if c not in references and self.df_pivot[c].std() > 1e-4
+        ]
+        if len(self.listeners) < 3:
+            print("   (!) Zbyt mało aktywnych słuchaczy do ISC (< 3).")
+            return None
+
+        self.window_sec = self.cfg.get("ISC_WINDOW_SEC") or self.cfg["WINDOW_SECONDS"]
+        window_size = self.parent.seconds_to_samples(self.window_sec)
+        n_samples = len(self.df_pivot.index)
+        if not 3 <= window_size <= n_samples:
+            print("   (!) Okno krótsze niż 3 próbki lub dłuższe niż nagranie.")
+            return None
+
+        print(
+            f"   Przetwarzanie {len(self.listeners)} słuchaczy, "
+            f"okno {self.window_sec:g}s ({window_size} próbek)..."
+        )
+        windowed, overall = leave_one_out_isc(
+            self.df_pivot[self.listeners].to_numpy(dtype=float),
+            window_size,
+            block=self.cfg.get("ISC_BLOCK", ISC_BLOCK),
+        )
+
+        labels = [self.parent.get_record_label(rid) for rid in self.listeners]
+        raw = pd.DataFrame(windowed, index=self.df_pivot.index, columns=labels)
+        self.summary = pd.DataFrame(
+            {
+                "record_id": self.listeners,
+                "label": labels,
+                "isc": overall,
+                "isc_windowed_mean": raw.mean().to_numpy(),
+                "isc_windowed_std": raw.std().to_numpy(),
+            }
+        ).sort_values("isc", ascending=False, ignore_index=True)
+
+        self.timecourse = fill_trajectory_gaps(raw)
+        self.group = pd.DataFrame(
+            {
+                "isc_mean": self.timecourse.mean(axis=1),
+                "isc_q25": self.timecourse.quantile(0.25, axis=1),
+                "isc_q75": self.timecourse.quantile(0.75, axis=1),
+            }
+        )
+
+        print(
+            f"   -> ISC całego nagrania: średnia {np.nanmean(overall):.3f}, "
+            f"w oknach: {np.nanmean(windowed):.3f}"
+        )
+        return self.group
+
+    def export_results(self):
+        """Przebieg grupowy + ISC słuchaczy w czasie (EXPORT_FORMAT) i tabela CSV."""
+        if self.timecourse is None:
+            return
+
+        export_matrix(
+            self.parent,
+            pd.concat([self.group, self.timecourse], axis=1),
+            base_name="isc_timecourse",
+            prefix="08_",
+        )
+
+        csv_path = self.parent.get_output_path(base_name="isc_listeners", prefix="08_")
+        self.summary.to_csv(csv_path, index=False)
+        print(f"   -> ISC słuchaczy zapisane: {csv_path}")
+
+    def export_graph(self):
+        """
+        Wykres: grupowy ISC w czasie (średnia i rozstęp międzykwartylowy)
+        oraz ISC każdego słuchacza dla całego nagrania.
+        """
+        if self.group is None:
+            print("   (!) Brak danych ISC do wykresu.")
+            return
+
+        import matplotlib.pyplot as plt
+        from plotting import decimate_series
+
+        print("   Generowanie wykresu ISC...")
+        try:
+            fig, (ax_time, ax_bars) = plt.subplots(
+                2, 1, figsize=(16, 10), gridspec_kw={"height_ratios": [3, 2]}
+            )
+
+            time_seconds = self.parent.get_time_axis_seconds(self.group.index)
+            x, y = decimate_series(time_seconds, self.group.to_numpy(), self.cfg)
+            ax_time.plot(
+                x[:, 0],
+                y[:, 0],
+                color="darkblue",
+                linewidth=2.0,
+                label="Średni ISC (leave-one-out)",
+            )
+            for col, label in ((1, "Kwartyle 25% / 75%"), (2, None)):
+                ax_time.plot(
+                    x[:, col],
+                    y[:, col],
+                    color="darkblue",
+                    linewidth=0.8,
+                    alpha=0.5,
+                    linestyle=":",
+                    label=label,
+                )
+            ax_time.axhline(0, color="gray", linestyle="--", linewidth=0.8)
+            ax_time.set_ylim(-1.05, 1.05)
+            ax_time.set_ylabel("Korelacja Pearsona", fontsize=11)
+            ax_time.legend(loc="upper right", fontsize=9)
+            ax_time.set_title(
+                f"Korelacja międzyosobnicza (ISC)\n{self.cfg.get('NAME', '')} - "
+                f"okno {self.window_sec:g}s (n={len(self.listeners)})",
+                fontsize=13,
+                fontweight="bold",
+            )
+            self.parent.setup_time_axis(ax_time, self.group.index)
+
+            isc = self.summary["isc"].to_numpy()
+            ax_bars.bar(
+                range(len(isc)),
+                isc,
+                color=np.where(isc >= 0, "steelblue", "indianred"),
+            )
+            ax_bars.axhline(0, color="gray", linewidth=0.8)
+            ax_bars.set_ylabel("ISC całego nagrania", fontsize=11)
+            ax_bars.set_xlim(-0.5, len(isc) - 0.5)
+            max_labels = self.cfg.get("HEATMAP_LABELS_MAX", 150)
+            if len(isc) <= max_labels:
+                ax_bars.set_xticks(range(len(isc)))
+                ax_bars.set_xticklabels(self.summary["label"], rotation=90, fontsize=7)
+            else:
+                ax_bars.set_xticks([])
+                ax_bars.set_xlabel("Słuchacze (malejąco)", fontsize=11)
+
+            plt.tight_layout()
+            img_path = self.parent.get_output_path(
+                base_name="isc_visual", prefix="08_", extension=".png"
+            )
+            plt.savefig(img_path, dpi=150, bbox_inches="tight")
+            plt.close(fig)
+            print(f"   -> Wykres ISC zapisany: {img_path}")
+
+        except Exception as e:
+            plt.close("all")
+            print(f"   (!) Błąd wykresu ISC: {e}")
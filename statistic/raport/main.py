@@ -1,85 +1,383 @@
-import matplotlib.pyplot as plt
+import argparse
+import json
+import os
+import sys
 import warnings
 import time
 from core import MusicalMetaAnalyzer
-from granger import GrangerModule
-from narrative import NarrativeModule
-from clustering import ClusteringModule  # <--- NOWY IMPORT
+
+# Moduły analityczne (granger, narrative, clustering) oraz matplotlib, seaborn,
+# statsmodels i scipy są importowane dopiero, gdy dany etap jest uruchamiany.
 
 # --- KONFIGURACJA ---
-plt.style.use("seaborn-v0_8-whitegrid")
 warnings.filterwarnings("ignore")
 
+# Domyślne projekty (używane, gdy nie podano plików konfiguracyjnych --config)
 CONFIGS = [
-    { 
+    {
         "NAME": "K1 Łabowska",
         "CSV_FILE": "plik.csv", # Fill in with actual file path
         "SAMPLING_RATE_HZ": 50,
+        "ANALYSIS_RATE_HZ": None,  # np. 10 -> decymacja przed analizą (None = bez)
         "WINDOW_SECONDS": 15,
-        "COMPOSER_ID": "", # Fill in with actual ID
+        "COMPOSER_ID": "", # Fill in with actual ID (lub lista referencji)
         "GRANGER_MAX_LAG_SEC": 4.0,
         "GRANGER_P_VALUE_THRESHOLD": 0.05,
+        "GRANGER_LAG_SEARCH": "full",  # full | coarse | ic
+        "GRANGER_COARSE_STEP_SEC": 0.2,  # Krok siatki lagów (tryb coarse)
+        "GRANGER_IC_PATIENCE": 10,  # Lagi bez poprawy BIC przed stopem (tryb ic)
+        "GRANGER_CACHE": True,  # Wyniki per słuchacz w 01_granger_cache.jsonl
+        "GRANGER_CACHE_FILE": None,  # Własna ścieżka cache (np. wspólna dla sezonu)
+        "GRANGER_BIDIRECTIONAL": False,  # Także słuchacz -> referencja (kontrola)
+        "NARRATIVE_CHUNK": 2048,  # Okna Rolling Spearman przetwarzane naraz
+        "NARRATIVE_WINDOWS_SEC": [5, 15, 30, 60],  # Skale etapu multiscale
+        "NARRATIVE_MULTISCALE_RANKS": "global",  # global (1 przebieg, ≈Spearman) | local
         "OUTPUT_DIR": "analysis_results",
         "USE_LABEL": True,  # Use label column instead of record_id in graphs and exports
         "GRID_SIZE": 10,  # Grid size for time axis in seconds
+        "EXPORT_FORMAT": "csv",  # csv | parquet (zstd) | npy (float32 + JSON)
+        "LOW_MEMORY": False,  # float32, przetwarzanie w miejscu, df_raw odtwarzane
+        "DROP_FRAMES": [],  # np. ["raw", "diff"] - ramki nieprzechowywane w pamięci
+        "OUT_OF_CORE": False,  # CSV porcjami, macierz memmap na dysku (duże sezony)
+        "MEMORY_BUDGET_MB": 512,  # Budżet pamięci roboczej trybu OUT_OF_CORE
+        "OUT_OF_CORE_DIR": None,  # Pliki memmap (domyślnie OUTPUT_DIR/NAME/_memmap)
+        "QUALITY_DROP": True,  # Odrzucanie nagrań niespełniających progów jakości
+        "QUALITY_GAP_SEC": 2.0,  # Przerwa między próbkami uznawana za lukę
+        "QUALITY_MIN_RATE_HZ": 1.0,  # Minimalna efektywna częstotliwość próbek
+        "QUALITY_MAX_INTERPOLATED": 0.5,  # Maks. odsetek czasu z interpolacji
+        "QUALITY_MAX_STUCK": 0.95,  # Maks. odsetek czasu bez zmiany wartości
+        "QUALITY_MIN_RANGE": 0.05,  # Minimalny wykorzystany zakres suwaka (0-1)
+        "HEATMAP_ANNOT_MAX": 40,  # Wartości w komórkach heatmapy do N sygnałów
+        "HEATMAP_LABELS_MAX": 150,  # Etykiety osi heatmapy do N sygnałów
+        "HEATMAP_MAX_CELLS": 1000,  # Powyżej - uśrednianie blokami
+        "HEATMAP_TILE_SIZE": None,  # np. 200 -> kafle w pełnej rozdzielczości
+        "HEATMAP_EXPORT_MATRIX": False,  # Zapis pełnej uporządkowanej macierzy
+        "PLOT_DECIMATION": "minmax",  # minmax | lttb | None - decymacja przebiegów
+        "PLOT_MAX_POINTS": 2400,  # Punkty na serię (~ szerokość wykresu w px)
+        "CLUSTER_THRESHOLD_RATIO": 0.7,  # Próg cięcia = ratio × najwyższe połączenie
+        "CLUSTER_THRESHOLD_SWEEP": False,  # Automatyczny wybór progu (jeden linkage)
+        "CLUSTER_SWEEP_CRITERION": "silhouette",  # silhouette | dunn
+        "CLUSTER_SWEEP_MAX_CLUSTERS": 20,
+        "CLUSTER_SWEEP_STEPS": 50,  # Maks. liczba ocenianych cięć
+        "STABILITY_BOOTSTRAP": 200,  # Liczba replikacji bootstrapu blokowego
+        "STABILITY_BLOCK_SEC": 10.0,  # Długość bloku czasu
+        "STABILITY_BLOCK_SHIFTS": 4,  # Przesunięcia bloku (pod-bloki na blok)
+        "STABILITY_WORKERS": None,  # Procesy robocze (None = liczba CPU, maks. 4)
+        "STABILITY_SEED": 0,
+        "SEGMENT_SECONDS": 30,  # Długość segmentu (klasteryzacja w czasie)
+        "SEGMENT_BOUNDARIES_SEC": None,  # np. [0, 42.5, 95] - granice sekcji utworu
+        "SEGMENT_N_CLUSTERS": None,  # None = liczba klastrów z podziału globalnego
+        "SEGMENT_RANKS": "global",  # global | local (rangi w obrębie segmentu)
+        # Siatka wrażliwości, np. {"WINDOW_SECONDS": [10, 15, 30],
+        # "GRANGER_P_VALUE_THRESHOLD": [0.01, 0.05]} (None = etap pomijany)
+        "SWEEP_GRID": None,
+        "SWEEP_WORKERS": None,  # Procesy robocze (None = liczba CPU)
+        "PYRAMID_FACTOR": 4,  # Kolejny poziom piramidy = 4 × dłuższe kubełki
+        "PYRAMID_CHUNK": 4096,  # Kubełki w jednym pliku binarnym
+        "PYRAMID_DTYPE": "float32",  # float32 | float16
+        "ISC_WINDOW_SEC": None,  # Okno ISC (None = WINDOW_SECONDS)
+        "EPOCH_EVENTS_FILE": None,  # Eksport zdarzeń koncertu (.json / .csv)
+        "EPOCH_TIME_FIELD": "timestamp",  # Pole czasu zdarzenia (lub w payload)
+        "EPOCH_TIME_UNIT": "ms",  # ms (UTC jak w danych) | s (od początku nagrania)
+        "EPOCH_PRE_SEC": 2.0,  # Linia bazowa przed zdarzeniem
+        "EPOCH_POST_SEC": 8.0,
+        "EPOCH_LATENCY_THRESHOLD": 0.5,  # Próg reakcji (zmiana Z-Score)
     },
-   
+
 ]
 
-if __name__ == "__main__":
-    print(f"Uruchamianie przetwarzania dla {len(CONFIGS)} projektów...\n")
+# Etapy w kolejności wykonania oraz ich zależności
+STAGES = (
+    "adf",
+    "granger",
+    "narrative",
+    "multiscale",
+    "clustering",
+    "stability",
+    "segmented",
+    "sweep",
+    "pyramid",
+    "isc",
+    "epochs",
+)
+STAGE_DEPENDENCIES = {
+    "narrative": ("granger",),  # Narrative korzysta z lagów Grangera
+    "multiscale": ("granger",),
+    "stability": ("clustering",),  # Bootstrap względem podziału referencyjnego
+    "segmented": ("clustering",),  # Numeracja klastrów od podziału globalnego
+    "sweep": ("clustering",),  # Progi podziału na gotowym linkage
+    "pyramid": ("narrative", "clustering"),  # Trajektorie i profile klastrów
+}
+# Etapy domyślne (bez --stages): sweep i epochs działają tylko przy ustawionym
+# SWEEP_GRID / EPOCH_EVENTS_FILE; kosztowne stability, multiscale, segmented,
+# pyramid i isc trzeba wskazać jawnie, np. --stages clustering,stability
+DEFAULT_STAGES = ("adf", "granger", "narrative", "clustering", "sweep", "epochs")
 
-    total_start = time.time()
 
-    for config in CONFIGS:
-        config_start = time.time()
-        print(f"\n{'='*60}")
-        print(f"Projekt: {config['NAME']}")
-        print(f"{'='*60}\n")
+def load_config_file(path):
+    """
+    Wczytuje konfiguracje projektów z pliku JSON lub TOML.
+
+    Plik może zawierać jeden projekt (obiekt / tabelę), listę projektów (JSON)
+    albo tablicę tabel ``[[projects]]`` (TOML).
+
+    Returns:
+        list: lista słowników konfiguracji
+    """
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+    if isinstance(data, dict) and "projects" in data:
+        data = data["projects"]
+    return data if isinstance(data, list) else [data]
+
+
+def resolve_stages(requested):
+    """
+    Uzupełnia wybrane etapy o zależności (także pośrednie) i zwraca je
+    w kolejności STAGES.
+    """
+    selected = set(requested)
+    pending = list(requested)
+    while pending:
+        stage = pending.pop()
+        for dependency in STAGE_DEPENDENCIES.get(stage, ()):
+            if dependency not in selected:
+                print(f"   (i) Etap '{stage}' wymaga '{dependency}' - dodano.")
+                selected.add(dependency)
+                pending.append(dependency)
+    return [stage for stage in STAGES if stage in selected]
+
+
+def setup_plotting():
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.style.use("seaborn-v0_8-whitegrid")
 
-        # 1. Inicjalizacja i Preprocessing
-        step_start = time.time()
-        analyzer = MusicalMetaAnalyzer(config)
-        analyzer.load_and_preprocess()
-        print(f"  [✓] Preprocessing: {time.time() - step_start:.2f}s")
 
-        # 1.5. Podstawowe wykresy odpowiedzi
+def run_project(config, stages, figures=True):
+    config_start = time.time()
+    print(f"\n{'='*60}")
+    print(f"Projekt: {config['NAME']}")
+    print(f"{'='*60}\n")
+
+    config.setdefault("RUN_ADF", "adf" in stages)
+
+    # 1. Inicjalizacja i Preprocessing
+    step_start = time.time()
+    analyzer = MusicalMetaAnalyzer(config)
+    analyzer.load_and_preprocess()
+    print(f"  [✓] Preprocessing: {time.time() - step_start:.2f}s")
+
+    # 1.5. Podstawowe wykresy odpowiedzi
+    if figures:
         step_start = time.time()
         analyzer.graph()
         print(f"  [✓] Podstawowe wykresy: {time.time() - step_start:.2f}s")
 
-        # 2. Moduł 1: Granger (Filtrowanie i Lagi)
+    # 2. Moduł 1: Granger (Filtrowanie i Lagi)
+    if "granger" in stages:
+        from granger import GrangerModule
+
         step_start = time.time()
         granger_module = GrangerModule(analyzer)
         granger_module.run_analysis()
         granger_module.export_results()
-        granger_module.export_graph()
+        if figures:
+            granger_module.export_graph()
         print(f"  [✓] Analiza Granger: {time.time() - step_start:.2f}s")
 
-        # 3. Moduł 2: Narrative (Trajektorie Spójności)
+    # 3. Moduł 2: Narrative (Trajektorie Spójności)
+    if "narrative" in stages:
+        from narrative import NarrativeModule
+
         step_start = time.time()
         narrative_module = NarrativeModule(analyzer)
         narrative_module.run_analysis()
         narrative_module.export_results()
-        narrative_module.export_graph()
+        if figures:
+            narrative_module.export_graph()
         print(f"  [✓] Analiza Narrative: {time.time() - step_start:.2f}s")
 
-        # 4. Moduł 3: Clustering (Podgrupy)
+    # 3.5. Narrative w wielu skalach czasu (okna NARRATIVE_WINDOWS_SEC)
+    if "multiscale" in stages:
+        from multiscale import MultiScaleNarrativeModule
+
+        step_start = time.time()
+        multiscale_module = MultiScaleNarrativeModule(analyzer)
+        multiscale_module.run_analysis()
+        multiscale_module.export_results()
+        if figures:
+            multiscale_module.export_graph()
+        print(f"  [✓] Analiza MultiScale: {time.time() - step_start:.2f}s")
+
+    # 4. Moduł 3: Clustering (Podgrupy)
+    if "clustering" in stages:
+        from clustering import ClusteringModule
+
         step_start = time.time()
         clustering_module = ClusteringModule(analyzer)
         clustering_module.run_analysis()
         clustering_module.export_results()
-        clustering_module.export_heatmap()
-        clustering_module.export_cluster_means_graph()
+        if figures:
+            clustering_module.export_heatmap()
+            clustering_module.export_cluster_means_graph()
         print(f"  [✓] Analiza Clustering: {time.time() - step_start:.2f}s")
 
-        config_time = time.time() - config_start
-        print(
-            f"\n--- Zakończono: {config['NAME']} (Łączny czas: {config_time:.2f}s) ---\n"
-        )
+    # 5. Moduł 4: Stability (Bootstrap profili)
+    if "stability" in stages:
+        from stability import StabilityModule
+
+        step_start = time.time()
+        stability_module = StabilityModule(analyzer, clustering_module)
+        stability_module.run_analysis()
+        stability_module.export_results()
+        if figures:
+            stability_module.export_graph()
+        print(f"  [✓] Analiza Stability: {time.time() - step_start:.2f}s")
+
+    # 6. Moduł 5: Segmented (Profile w segmentach utworu)
+    if "segmented" in stages:
+        from segmented import SegmentedClusteringModule
+
+        step_start = time.time()
+        segmented_module = SegmentedClusteringModule(analyzer, clustering_module)
+        segmented_module.run_analysis()
+        segmented_module.export_results()
+        if figures:
+            segmented_module.export_graph()
+        print(f"  [✓] Analiza Segmented: {time.time() - step_start:.2f}s")
+
+    # 7. Wrażliwość na parametry (SWEEP_GRID) - własny Granger, linkage z etapu 4.
+    if "sweep" in stages:
+        from sweep import SweepModule
+
+        step_start = time.time()
+        sweep_module = SweepModule(analyzer, clustering_module)
+        sweep_module.run_analysis()
+        sweep_module.export_results()
+        print(f"  [✓] Analiza Sweep: {time.time() - step_start:.2f}s")
+
+    # 8. Piramida wielorozdzielcza dla przeglądarki web-analysis
+    if "pyramid" in stages:
+        from pyramid import PyramidModule
+
+        step_start = time.time()
+        pyramid_module = PyramidModule(analyzer, narrative_module, clustering_module)
+        pyramid_module.run_analysis()
+        pyramid_module.export_results()
+        print(f"  [✓] Eksport Pyramid: {time.time() - step_start:.2f}s")
+
+    # 9. Korelacja międzyosobnicza (ISC, leave-one-out) - bez referencji
+    if "isc" in stages:
+        from isc import ISCModule
+
+        step_start = time.time()
+        isc_module = ISCModule(analyzer)
+        isc_module.run_analysis()
+        isc_module.export_results()
+        if figures:
+            isc_module.export_graph()
+        print(f"  [✓] Analiza ISC: {time.time() - step_start:.2f}s")
+
+    # 10. Epoki względem zdarzeń koncertu (EPOCH_EVENTS_FILE)
+    if "epochs" in stages:
+        from epochs import EpochModule
+
+        step_start = time.time()
+        epoch_module = EpochModule(analyzer)
+        epoch_module.run_analysis()
+        epoch_module.export_results()
+        if figures:
+            epoch_module.export_graph()
+        print(f"  [✓] Analiza Epochs: {time.time() - step_start:.2f}s")
+
+    config_time = time.time() - config_start
+    print(
+        f"\n--- Zakończono: {config['NAME']} (Łączny czas: {config_time:.2f}s) ---\n"
+    )
+    return analyzer
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Meta-analiza odpowiedzi słuchaczy (Granger/Narrative/Clustering)."
+    )
+    parser.add_argument(
+        "-c",
+        "--config",
+        action="append",
+        default=[],
+        help="Plik konfiguracji projektu (.json / .toml). Można podać kilka razy.",
+    )
+    parser.add_argument(
+        "-s",
+        "--stages",
+        default=",".join(DEFAULT_STAGES),
+        help=(
+            "Etapy do uruchomienia, po przecinku "
+            f"(domyślnie: {','.join(DEFAULT_STAGES)}; dostępne: {','.join(STAGES)})."
+        ),
+    )
+    parser.add_argument(
+        "--no-figures",
+        action="store_true",
+        help="Pomija generowanie wykresów (tylko wyniki).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    requested = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in requested if s not in STAGES]
+    if unknown:
+        print(f"BŁĄD: Nieznane etapy: {unknown}. Dostępne: {list(STAGES)}")
+        return 2
+    stages = resolve_stages(requested)
+
+    configs = CONFIGS
+    if args.config:
+        configs = []
+        for path in args.config:
+            if not os.path.exists(path):
+                print(f"BŁĄD: Plik konfiguracji {path} nie istnieje.")
+                return 2
+            configs.extend(load_config_file(path))
+
+    figures = not args.no_figures
+    if figures:
+        setup_plotting()
+
+    print(f"Uruchamianie przetwarzania dla {len(configs)} projektów...")
+    print(f"Etapy: {', '.join(stages) or '-'} | Wykresy: {'tak' if figures else 'nie'}")
+    print()
+
+    total_start = time.time()
+
+    for config in configs:
+        run_project(config, stages, figures=figures)
 
     total_time = time.time() - total_start
     print(f"\n{'='*60}")
     print(f"=== WSZYSTKIE ZADANIA UKOŃCZONE ===")
     print(f"Całkowity czas wykonania: {total_time:.2f}s ({total_time/60:.2f} min)")
     print(f"{'='*60}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+import numpy as np
+import pandas as pd
+from narrative import (
+    NARRATIVE_CHUNK,
+    fill_trajectory_gaps,
+    pair_series,
+    rolling_spearman,
+)
+
+# Rangi w trybie wieloskalowym: "global" (domyślnie) - rangi z całego nagrania
+# i sumy prefiksowe wspólne dla wszystkich okien (jeden przebieg, przybliżenie
+# Spearmana, jak SEGMENT_RANKS="global"), "local" - rangi w każdym oknie
+# (dokładny Spearman jak NarrativeModule, osobny przebieg na długość okna -
+# koszt rośnie z sumą długości wszystkich okien)
+MULTISCALE_RANK_MODES = ("global", "local")
+MULTISCALE_WINDOWS_SEC = (5, 15, 30, 60)
+
+# Arytmetyka całkowitoliczbowa (dokładna) dopóki okno × T mieści się w int64
+INT64_SAFE_PRODUCT = 3.0e9
+
+
+def _prefix(values, dtype):
+    """Sumy prefiksowe z zerem na początku (suma okna = P[end + 1] - P[start])."""
+    out = np.zeros(len(values) + 1, dtype=dtype)
+    np.cumsum(values, out=out[1:])
+    return out
+
+
+def multiscale_global_ranks(series, lags_by_reference, windows):
+    """
+    Korelacja rang globalnych w oknach przesuwnych dla wielu długości okien
+    naraz: rangi liczone raz dla całego nagrania, sumy prefiksowe (rangi,
+    kwadraty, iloczyny par) raz na sygnał / parę - każde okno to różnice sum.
+
+    Rangi podwojone i wycentrowane (liczby całkowite także przy remisach),
+    więc sumy okien i liczniki korelacji liczone są dokładnie w int64.
+    Przybliżenie Spearmana (rangi nie są liczone ponownie w oknie), jak
+    w module Stability.
+
+    Args:
+        series: dict record_id -> szereg (T,)
+        lags_by_reference: dict referencja -> {słuchacz: lag}
+        windows: długości okien w próbkach
+
+    Returns:
+        dict: referencja -> numpy array (okna × T × słuchacze referencji)
+    """
+    from scipy.stats import rankdata
+
+    n_samples = len(next(iter(series.values())))
+    exact = max(windows) * n_samples < INT64_SAFE_PRODUCT
+    dtype = np.int64 if exact else np.float64
+
+    ranks = {
+        rid: (2 * rankdata(values) - (n_samples + 1)).astype(dtype)
+        for rid, values in series.items()
+    }
+    own = {rid: (_prefix(r, dtype), _prefix(r * r, dtype)) for rid, r in ranks.items()}
+    ends = np.arange(n_samples)
+
+    cubes = {}
+    for ref, lags in lags_by_reference.items():
+        cube = np.full((len(windows), n_samples, len(lags)), np.nan)
+        for j, (listener, lag) in enumerate(lags.items()):
+            # Pary (x[t], y[t - lag]) dla t >= lag; sumy prefiksowe po t
+            x_sum, x_sq = own[listener]
+            y_sum, y_sq = own[ref]
+            cross = np.zeros(n_samples, dtype=dtype)
+            cross[lag:] = ranks[listener][lag:] * ranks[ref][: n_samples - lag]
+            xy_sum = _prefix(cross, dtype)
+
+            for w, window in enumerate(windows):
+                t = ends[window - 1 :]
+                first = np.maximum(t - window + 1, lag)
+                n = t + 1 - first
+                valid = n > 2
+                t, first, n = t[valid], first[valid], n[valid].astype(dtype)
+
+                sx = x_sum[t + 1] - x_sum[first]
+                sxx = x_sq[t + 1] - x_sq[first]
+                sy = y_sum[t + 1 - lag] - y_sum[first - lag]
+                syy = y_sq[t + 1 - lag] - y_sq[first - lag]
+                sxy = xy_sum[t + 1] - xy_sum[first]
+
+                numerator = (n * sxy - sx * sy).astype(float)
+                spread = (n * sxx - sx * sx).astype(float) * (n * syy - sy * sy)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    cube[w, t, j] = numerator / np.sqrt(spread)
+        cubes[ref] = np.clip(cube, -1.0, 1.0)
+    return cubes
+
+
+class MultiScaleNarrativeModule:
+    def __init__(self, analyzer_instance):
+        """
+        Spójność narracyjna w wielu skalach czasu (NARRATIVE_WINDOWS_SEC).
+
+        Wynik: kostka (okna × czas × słuchacze) dla każdej referencji z par
+        Grangera. Tryb "global" (domyślny) liczy wszystkie okna w jednym
+        przebiegu z sum prefiksowych rang globalnych - to przybliżenie
+        Spearmana (wartości różnią się od 02_narrative_trajectories), oznaczone
+        w komunikacie, pliku JSON kostki i na wykresie. Tryb "local" - dokładny
+        rolling Spearman (jak NarrativeModule), osobno dla każdej długości okna.
+        """
+        self.parent = analyzer_instance
+        self.cfg = analyzer_instance.cfg
+        self.df_pivot = analyzer_instance.df_pivot
+        self.lags_by_reference = dict(analyzer_instance.causal_lags_by_reference)
+
+        self.windows_sec = None
+        self.rank_mode = None
+        self.cubes = {}  # Referencja -> (okna × czas × słuchacze)
+        self.columns = {}  # Referencja -> etykiety słuchaczy
+
+    def run_analysis(self):
+        print("--- [Moduł MultiScale] Spójność w wielu skalach czasu ---")
+
+        if not any(self.lags_by_reference.values()):
+            print("   (!) Brak danych z Grangera. Pomijam.")
+            return None
+
+        windows_sec = self.cfg.get("NARRATIVE_WINDOWS_SEC") or MULTISCALE_WINDOWS_SEC
+        windows_sec = sorted(set(float(w) for w in windows_sec))
+        windows = [self.parent.seconds_to_samples(w) for w in windows_sec]
+        n_samples = len(self.df_pivot.index)
+        keep = [i for i, w in enumerate(windows) if 3 <= w <= n_samples]
+        if len(keep) < len(windows):
+            print(
+                "   (!) Pominięto okna krótsze niż 3 próbki lub dłuższe niż nagranie."
+            )
+        if not keep:
+            return None
+        self.windows_sec = [windows_sec[i] for i in keep]
+        windows = [windows[i] for i in keep]
+
+        mode = self.cfg.get("NARRATIVE_MULTISCALE_RANKS", "global")
+        if mode not in MULTISCALE_RANK_MODES:
+            print(f"   (!) Nieznany tryb rang '{mode}', używam global.")
+            mode = "global"
+        self.rank_mode = mode
+
+        lags = {ref: lags for ref, lags in self.lags_by_reference.items() if lags}
+        series = pair_series(self.df_pivot, lags)
+        print(
+            f"   Okna: {self.windows_sec} s, rangi: {mode}, "
+            f"referencje: {len(lags)}, sygnałów: {len(series)}"
+        )
+
+        if mode == "global":
+            print(
+                "   (!) Rangi globalne: przybliżenie Spearmana, wartości różnią się "
+                "od 02_narrative_trajectories. Dokładnie (przebieg na każde okno): "
+                'NARRATIVE_MULTISCALE_RANKS="local".'
+            )
+            cubes = multiscale_global_ranks(series, lags, windows)
+        else:
+            chunk = self.cfg.get("NARRATIVE_CHUNK", NARRATIVE_CHUNK)
+            per_window = [rolling_spearman(series, lags, w, chunk) for w in windows]
+            cubes = {ref: np.stack([r[ref] for r in per_window]) for ref in lags}
+
+        for ref, cube in cubes.items():
+            for w in range(len(windows)):
+                cube[w] = fill_trajectory_gaps(pd.DataFrame(cube[w])).to_numpy()
+            self.cubes[ref] = cube
+            self.columns[ref] = [self.parent.get_record_label(rid) for rid in lags[ref]]
+
+            means = np.nanmean(cube, axis=(1, 2))
+            summary = ", ".join(
+                f"{w:g}s: {m:.3f}" for w, m in zip(self.windows_sec, means)
+            )
+            print(
+                f"   -> {self.parent.get_record_label(ref)}: średnia spójność {summary}"
+            )
+        return self.cubes
+
+    def export_results(self):
+        """Kostka float32 (.npy) + osie w JSON dla każdej referencji."""
+        from export import export_cube
+
+        for ref, cube in self.cubes.items():
+            suffix = self.parent.get_reference_suffix(ref)
+            export_cube(
+                self.parent,
+                cube,
+                axes={
+                    "window_sec": self.windows_sec,
+                    "timestamp": np.asarray(self.df_pivot.index).tolist(),
+                    "listener": self.columns[ref],
+                },
+                base_name=f"narrative_multiscale{suffix}",
+                prefix="02_",
+                attrs={
+                    "ranks": self.rank_mode,
+                    "statistic": (
+                        "spearman"
+                        if self.rank_mode == "local"
+                        else "global-rank approximation of spearman"
+                    ),
+                },
+            )
+
+    def export_graph(self):
+        """
+        Wykres zbiorczy: średnia spójność w czasie dla każdej skali (linie)
+        i mapa skala × czas (średnia po słuchaczach).
+        """
+        if not self.cubes:
+            print("   (!) Brak danych wieloskalowych do wykresu.")
+            return
+
+        import matplotlib.pyplot as plt
+        from plotting import PLOT_MAX_POINTS, decimate_series
+
+        print("   Generowanie wykresu wieloskalowego...")
+
+        time_seconds = self.parent.get_time_axis_seconds(self.df_pivot.index)
+        for ref, cube in self.cubes.items():
+            try:
+                mean = cube.mean(axis=2)  # okna × czas
+                fig, (ax_lines, ax_map) = plt.subplots(
+                    2,
+                    1,
+                    figsize=(16, 9),
+                    sharex=True,
+                    gridspec_kw={"height_ratios": [3, 2]},
+                )
+                colors = plt.cm.viridis(np.linspace(0, 0.9, len(self.windows_sec)))
+                for w, window_sec in enumerate(self.windows_sec):
+                    x, y = decimate_series(time_seconds, mean[w], self.cfg)
+                    ax_lines.plot(
+                        x,
+                        y,
+                        color=colors[w],
+                        linewidth=1.6,
+                        label=f"okno {window_sec:g}s",
+                    )
+                ax_lines.set_ylim(-1.05, 1.05)
+                ax_lines.axhline(0, color="gray", linestyle="--", linewidth=0.8)
+                ax_lines.set_ylabel("Średnia korelacja rang", fontsize=11)
+                ax_lines.legend(loc="upper right", fontsize=9)
+                approximation = (
+                    ", rangi globalne - przybliżenie Spearmana"
+                    if self.rank_mode == "global"
+                    else ""
+                )
+                ax_lines.set_title(
+                    f"Spójność w wielu skalach czasu\n{self.cfg.get('NAME', '')} - "
+                    f"referencja: {self.parent.get_record_label(ref)} "
+                    f"(n={cube.shape[2]}{approximation})",
+                    fontsize=13,
+                    fontweight="bold",
+                )
+
+                # Mapa: kolumny uśrednione blokami do szerokości wykresu
+                max_points = self.cfg.get("PLOT_MAX_POINTS", PLOT_MAX_POINTS)
+                factor = max(1, int(np.ceil(mean.shape[1] / max_points)))
+                padded = np.pad(
+                    mean,
+                    ((0, 0), (0, (-mean.shape[1]) % factor)),
+                    constant_values=np.nan,
+                )
+                image = np.nanmean(padded.reshape(len(mean), -1, factor), axis=2)
+                mesh = ax_map.imshow(
+                    image,
+                    aspect="auto",
+                    cmap="RdBu_r",
+                    vmin=-1,
+                    vmax=1,
+                    origin="lower",
+                    extent=(time_seconds[0], time_seconds[-1], -0.5, len(mean) - 0.5),
+                    interpolation="nearest",
+                )
+                ax_map.set_yticks(range(len(self.windows_sec)))
+                ax_map.set_yticklabels([f"{w:g}s" for w in self.windows_sec])
+                ax_map.set_ylabel("Okno", fontsize=11)
+                fig.colorbar(mesh, ax=[ax_lines, ax_map], shrink=0.6, pad=0.01)
+                self.parent.setup_time_axis(ax_map, self.df_pivot.index)
+
+                img_path = self.parent.get_output_path(
+                    base_name="narrative_multiscale_visual",
+                    prefix="02_",
+                    suffix=self.parent.get_reference_suffix(ref),
+                    extension=".png",
+                )
+                plt.savefig(img_path, dpi=150, bbox_inches="tight")
+                plt.close(fig)
+                print(f"   -> Wykres wieloskalowy zapisany: {img_path}")
+
+            except Exception as e:
+                plt.close("all")
+                print(f"   (!) Błąd wykresu wieloskalowego: {e}")
@@ -1,8 +1,116 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import warnings
-from tqdm import tqdm
+from export import export_matrix
+
+
+# Liczba okien (końców okien) przetwarzanych naraz - ogranicza pamięć macierzy
+# rang (okna × WINDOW_SECONDS)
+NARRATIVE_CHUNK = 2048
+
+
+def partial_window_spearman(listener, reference, lag, window_size, end):
+    """
+    Okno kończące się w próbce end, częściowo przed początkiem przesuniętej
+    referencji - Spearman na parach bez braków (min. 3 próbki).
+    """
+    from scipy.stats import rankdata
+
+    first = max(lag, end - window_size + 1)
+    if end - first + 1 <= 2:
+        return np.nan
+    x = rankdata(listener[first : end + 1])
+    y = rankdata(reference[first - lag : end - lag + 1])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.corrcoef(x, y)[0, 1]
+
+
+def pair_series(df_pivot, lags_by_reference):
+    """Szeregi słuchaczy i referencji z par Grangera (record_id -> float64)."""
+    record_ids = dict.fromkeys(
+        rid for ref, lags in lags_by_reference.items() for rid in [ref, *lags]
+    )
+    return {rid: df_pivot[rid].to_numpy(dtype=float) for rid in record_ids}
+
+
+def rolling_spearman(
+    series, lags_by_reference, window_size, chunk=NARRATIVE_CHUNK, progress=True
+):
+    """
+    Rolling Spearman (Pearson na rangach w oknie) słuchacz vs przesunięta
+    referencja. Rangi słuchacza liczone raz na porcję okien i wspólne dla
+    wszystkich referencji; rangi przesuniętej referencji - raz na parę
+    (referencja, lag) w porcji.
+
+    Args:
+        series: dict record_id -> szereg (T,) (słuchacze i referencje)
+        lags_by_reference: dict referencja -> {słuchacz: lag}
+        window_size: długość okna w próbkach
+        chunk: liczba okien w porcji
+        progress: pasek postępu (wyłączany w procesach roboczych)
+
+    Returns:
+        dict: referencja -> numpy array (T × słuchacze referencji), NaN przed
+        pierwszym pełnym oknem
+    """
+    from tqdm import tqdm
+    from ranks import window_ranks
+
+    n_samples = len(next(iter(series.values())))
+    listeners = list(
+        dict.fromkeys(
+            listener for lags in lags_by_reference.values() for listener in lags
+        )
+    )
+    trajectories = {
+        ref: np.full((n_samples, len(lags)), np.nan)
+        for ref, lags in lags_by_reference.items()
+    }
+    columns = {ref: list(lags) for ref, lags in lags_by_reference.items()}
+
+    for start in tqdm(
+        range(window_size - 1, n_samples, chunk),
+        desc="   Rolling Spearman",
+        unit="chunk",
+        disable=not progress,
+    ):
+        stop = min(start + chunk, n_samples)
+        reference_ranks = {}
+        for listener in listeners:
+            listener_ranks = window_ranks(series[listener], window_size, start, stop)
+            for ref, lags in lags_by_reference.items():
+                if listener not in lags:
+                    continue
+                lag = lags[listener]
+                # Okna z brakami po przesunięciu liczone osobno
+                first = max(start, window_size - 1 + lag)
+                if first >= stop:
+                    continue
+                if (ref, lag) not in reference_ranks:
+                    reference_ranks[ref, lag] = window_ranks(
+                        series[ref], window_size, first - lag, stop - lag
+                    )
+                x = listener_ranks[first - start :]
+                y = reference_ranks[ref, lag]
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    corr = np.einsum("ij,ij->i", x, y) / np.sqrt(
+                        np.einsum("ij,ij->i", x, x) * np.einsum("ij,ij->i", y, y)
+                    )
+                trajectories[ref][first:stop, columns[ref].index(listener)] = corr
+
+    for ref, lags in lags_by_reference.items():
+        for j, (listener, lag) in enumerate(lags.items()):
+            end = min(window_size - 1 + lag, n_samples)
+            for i in range(window_size - 1, end):
+                trajectories[ref][i, j] = partial_window_spearman(
+                    series[listener], series[ref], lag, window_size, i
+                )
+    return trajectories
+
+
+def fill_trajectory_gaps(trajectories):
+    """Imputacja liniowa braków trajektorii (dla ciągłości wykresów)."""
+    trajectories = trajectories.interpolate(method="linear", limit_direction="both")
+    return trajectories.ffill().bfill().fillna(0)
 
 
 class NarrativeModule:
@@ -14,86 +122,68 @@ class NarrativeModule:
         self.cfg = analyzer_instance.cfg
         self.df_pivot = analyzer_instance.df_pivot  # Dane Z-Score
         self.lags = analyzer_instance.causal_listeners_lags
-        self.results_df = None
+        self.lags_by_reference = dict(analyzer_instance.causal_lags_by_reference)
+        if not self.lags_by_reference and self.lags:
+            references = analyzer_instance.get_reference_ids()
+            self.lags_by_reference = {references[0]: self.lags}
+        self.results_df = None  # Referencja główna
+        self.results_by_reference = {}
 
     def run_analysis(self):
         print("--- [Moduł Narrative] Analiza Spójności (Rolling) ---")
 
-        if not self.lags:
+        if not any(self.lags_by_reference.values()):
             print("   (!) Brak danych z Grangera. Pomijam.")
             return None
 
-        composer_id = self.cfg["COMPOSER_ID"]
-        window_size = int(self.cfg["WINDOW_SECONDS"] * self.cfg["SAMPLING_RATE_HZ"])
-        composer_series = self.df_pivot[composer_id]
-
-        rolling_results = pd.DataFrame(index=self.df_pivot.index)
-
-        print(f"   Przetwarzanie {len(self.lags)} słuchaczy...")
-
-        for idx, (listener, lag_samples) in enumerate(tqdm(self.lags.items(), desc="   Rolling Spearman", unit="listener")):
-            # 1. Synchronizacja
-            comp_shifted = composer_series.shift(lag_samples)
-            listener_series = self.df_pivot[listener]
-
-            # 2. Rolling Spearman Correlation (Custom Implementation)
-            # Pandas rolling().corr() nie obsługuje method="spearman" w starszych wersjach
-            # Implementujemy własną funkcję Rolling Spearman
-            
-            def rolling_spearman(x, y, window):
-                """Oblicza rolling Spearman correlation używając rankowania."""
-                result = pd.Series(index=x.index, dtype=float)
-                for i in range(window - 1, len(x)):
-                    window_x = x.iloc[i - window + 1:i + 1]
-                    window_y = y.iloc[i - window + 1:i + 1]
-                    
-                    # Usuń NaN
-                    valid_mask = ~(window_x.isna() | window_y.isna())
-                    valid_x = window_x[valid_mask]
-                    valid_y = window_y[valid_mask]
-                    
-                    if len(valid_x) > 2:
-                        # Spearman = Pearson na rankach
-                        rank_x = valid_x.rank()
-                        rank_y = valid_y.rank()
-                        corr = rank_x.corr(rank_y)
-                        result.iloc[i] = corr
-                    else:
-                        result.iloc[i] = np.nan
-                
-                return result
-            
-            rc = rolling_spearman(listener_series, comp_shifted, window_size)
-
-            # 3. Imputacja Liniowa (dla ciągłości wykresów)
-            rc = rc.interpolate(method="linear", limit_direction="both")
-            rc = rc.ffill().bfill().fillna(0)
-
-            # Use label instead of record_id if configured
-            listener_label = self.parent.get_record_label(listener)
-            rolling_results[listener_label] = rc
-
-        self.results_df = rolling_results
-
-        # Przekazanie wyników do pamięci rodzica (dla modułu Meta)
-        self.parent.narrative_trajectories = rolling_results
+        window_size = self.parent.seconds_to_samples(self.cfg["WINDOW_SECONDS"])
+        series = pair_series(self.df_pivot, self.lags_by_reference)
+        listeners = {rid for lags in self.lags_by_reference.values() for rid in lags}
 
         print(
-            f"   -> Obliczono trajektorie dla {len(rolling_results.columns)} słuchaczy."
+            f"   Przetwarzanie {len(listeners)} słuchaczy, "
+            f"referencje: {len(self.lags_by_reference)}..."
+        )
+        trajectories = rolling_spearman(
+            series,
+            self.lags_by_reference,
+            window_size,
+            chunk=self.cfg.get("NARRATIVE_CHUNK", NARRATIVE_CHUNK),
         )
-        return rolling_results
 
-    def export_results(self):
-        """Zapisuje trajektorie do CSV."""
-        if self.results_df is None or self.results_df.empty:
-            return
+        for ref, lags in self.lags_by_reference.items():
+            rolling_results = pd.DataFrame(
+                trajectories[ref],
+                index=self.df_pivot.index,
+                # Use label instead of record_id if configured
+                columns=[self.parent.get_record_label(rid) for rid in lags],
+            )
+            self.results_by_reference[ref] = fill_trajectory_gaps(rolling_results)
+
+        primary = next(iter(self.lags_by_reference))
+        self.results_df = self.results_by_reference[primary]
+        self.lags = self.lags_by_reference[primary]
+
+        # Przekazanie wyników do pamięci rodzica (dla modułu Meta)
+        self.parent.narrative_trajectories = self.results_df
 
-        file_path = self.parent.get_output_path(
-            base_name="narrative_trajectories", prefix="02_", extension=".csv"
+        print(
+            f"   -> Obliczono trajektorie dla {len(self.results_df.columns)} słuchaczy."
         )
+        return self.results_df
 
-        self.results_df.to_csv(file_path, index=True)
-        print(f"   -> Wyniki zapisano: {file_path}")
+    def export_results(self):
+        """Zapisuje trajektorie każdej referencji (format wg EXPORT_FORMAT)."""
+        for reference, trajectories in self.results_by_reference.items():
+            if trajectories.empty:
+                continue
+            suffix = self.parent.get_reference_suffix(reference)
+            export_matrix(
+                self.parent,
+                trajectories,
+                base_name=f"narrative_trajectories{suffix}",
+                prefix="02_",
+            )
     
     def export_graph(self):
         """
@@ -102,23 +192,39 @@ class NarrativeModule:
         - Kompozytor (Z-Score)
         - Średnia uczestników przyczynowych (Z-Score)
         """
-        if self.results_df is None or self.results_df.empty:
+        if not any(not df.empty for df in self.results_by_reference.values()):
             print("   (!) Brak danych trajektorii do wykresu.")
             return
-        
+
         print("   Generowanie wykresu trajektorii Spearmana...")
-        
-        composer_id = self.cfg["COMPOSER_ID"]
+        for reference, trajectories in self.results_by_reference.items():
+            if not trajectories.empty:
+                self._export_reference_graph(reference, trajectories)
+
+    def _export_reference_graph(self, composer_id, trajectories):
+        """Wykres trajektorii dla jednej referencji (plik z sufiksem referencji)."""
+        import matplotlib.pyplot as plt
+        from plotting import cached_decimation, decimate_series
+
+        lags = self.lags_by_reference[composer_id]
         df_pivot = self.parent.df_pivot  # Z-Score data
-        time_seconds = self.parent.get_time_axis_seconds(self.results_df.index)
+        time_seconds = self.parent.get_time_axis_seconds(trajectories.index)
         
         # Średnia korelacja Spearmana w czasie
-        spearman_mean = self.results_df.mean(axis=1)
+        spearman_mean = trajectories.mean(axis=1)
         
         # Dane Z-Score kompozytora i uczestników
-        causal_ids = list(self.lags.keys())
-        composer_zscore = df_pivot[composer_id]
+        causal_ids = list(lags.keys())
         causal_zscore_mean = df_pivot[causal_ids].mean(axis=1)
+
+        # Serie zdecymowane do rozdzielczości wykresu (kompozytor z pamięci
+        # podręcznej analizatora - ten sam df_pivot co na wykresach Core)
+        spearman_x, spearman_y = decimate_series(time_seconds, spearman_mean, self.cfg)
+        causal_x, causal_y = decimate_series(time_seconds, causal_zscore_mean, self.cfg)
+        pivot = cached_decimation(self.parent, "pivot", time_seconds, df_pivot)
+        composer_idx = pivot["columns"].index(composer_id)
+        composer_x = pivot["x"][:, composer_idx]
+        composer_y = pivot["y"][:, composer_idx]
         
         # Tworzenie wykresu z podwójną skalą Y
         fig, ax1 = plt.subplots(figsize=(16, 8))
@@ -127,7 +233,7 @@ class NarrativeModule:
         color_spearman = 'darkblue'
         ax1.set_ylabel('Współczynnik korelacji rang Spearmana', 
                       color=color_spearman, fontsize=11, fontweight='bold')
-        ax1.plot(time_seconds, spearman_mean, 
+        ax1.plot(spearman_x, spearman_y, 
                 color=color_spearman, linewidth=2.5, alpha=0.9,
                 label='Średnia korelacja Spearmana (przyczynowi)')
         ax1.tick_params(axis='y', labelcolor=color_spearman)
@@ -142,21 +248,21 @@ class NarrativeModule:
                       color=color_responses, fontsize=11)
         
         comp_label = self.parent.get_record_label(composer_id)
-        ax2.plot(time_seconds, composer_zscore, 
+        ax2.plot(composer_x, composer_y, 
                 color='red', linewidth=1.8, alpha=0.6, linestyle='--',
                 label=f'Kompozytor: {comp_label}')
-        ax2.plot(time_seconds, causal_zscore_mean, 
+        ax2.plot(causal_x, causal_y, 
                 color='green', linewidth=1.8, alpha=0.6, linestyle=':',
                 label=f'Średnia przyczynowych')
         ax2.tick_params(axis='y', labelcolor=color_responses)
         
         # Konfiguracja osi X
-        self.parent.setup_time_axis(ax1, self.results_df.index)
+        self.parent.setup_time_axis(ax1, trajectories.index)
         
         # Tytuł
         ax1.set_title(
             f"Trajektorie spójności napięcia\n{self.cfg.get('NAME', '')}\n"
-            f"Rolling Spearman (okno: {self.cfg['WINDOW_SECONDS']}s, n={len(self.lags)})",
+            f"Rolling Spearman (okno: {self.cfg['WINDOW_SECONDS']}s, n={len(lags)})",
             fontsize=13, fontweight='bold', pad=20
         )
         
@@ -168,7 +274,10 @@ class NarrativeModule:
         
         # Zapis
         img_path = self.parent.get_output_path(
-            base_name="tension_trajectories_visual", prefix="02_", extension=".png"
+            base_name="tension_trajectories_visual",
+            prefix="02_",
+            suffix=self.parent.get_reference_suffix(composer_id),
+            extension=".png",
         )
         plt.tight_layout()
         plt.savefig(img_path, dpi=150, bbox_inches='tight')
@@ -0,0 +1,278 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from core import QUALITY_DEFAULTS, sample_fingerprints
+
+# Przetwarzanie poza pamięcią (OUT_OF_CORE): CSV czytany porcjami, wartości
+# rozpraszane do macierzy czas × nagrania na dysku (np.memmap, siatka
+# ANALYSIS_RATE_HZ), dalsze kroki blokami kolumn w granicach MEMORY_BUDGET_MB.
+MEMORY_BUDGET_MB = 512
+BYTES_PER_CSV_ROW = 200  # Szacunek pamięci parsera na wiersz CSV
+BYTES_PER_CELL = 32  # Sumy, liczniki i bufory robocze bloku kolumn
+GRID_EPS = 1e-6  # Tolerancja zaokrągleń przy przypisaniu próbki do komórki
+
+
+def _memmap(path, shape, dtype):
+    return np.lib.format.open_memmap(
+        path, mode="w+", dtype=dtype, shape=shape, fortran_order=True
+    )
+
+
+def _read_chunks(analyzer, chunk_rows, columns):
+    return pd.read_csv(
+        analyzer.cfg["CSV_FILE"],
+        usecols=lambda c: c in columns,
+        dtype={"value": "float32", "record_id": str, "label": str},
+        chunksize=chunk_rows,
+    )
+
+
+def _scan(analyzer, chunk_rows):
+    """
+    Przebieg 1: identyfikatory nagrań, zakres czasu, etykiety, odciski
+    surowych próbek oraz zakres czasu i wartości (0-100) każdego nagrania.
+
+    Returns:
+        tuple: (record_ids, t_min, t_max, n_rows, ranges) - ranges: DataFrame
+            (record_id) z t_first, t_last, value_min, value_max
+    """
+    labels, ranges = [], []
+    fingerprints = {}
+    t_min, t_max, n_rows = np.inf, -np.inf, 0
+    use_label = analyzer.cfg.get("USE_LABEL", False)
+
+    for chunk in _read_chunks(
+        analyzer, chunk_rows, ("timestamp", "record_id", "value", "label")
+    ):
+        t_min = min(t_min, chunk["timestamp"].min())
+        t_max = max(t_max, chunk["timestamp"].max())
+        n_rows += len(chunk)
+        if use_label and "label" in chunk.columns:
+            labels.append(chunk[["record_id", "label"]].drop_duplicates())
+
+        # Agregaty niezależne od kolejności wierszy - łączone między porcjami
+        for rid, (total, n) in sample_fingerprints(chunk).items():
+            previous_total, previous_n = fingerprints.get(rid, (0, 0))
+            fingerprints[rid] = ((previous_total + total) % 2**64, previous_n + n)
+        chunk = chunk.assign(value=chunk["value"].clip(0, 100))
+        ranges.append(
+            chunk.groupby("record_id").agg(
+                t_first=("timestamp", "min"),
+                t_last=("timestamp", "max"),
+                value_min=("value", "min"),
+                value_max=("value", "max"),
+            )
+        )
+
+    if labels:
+        label_df = pd.concat(labels).drop_duplicates("record_id")
+        analyzer.label_map = label_df.set_index("record_id")["label"].to_dict()
+        print(f"   -> Loaded {len(analyzer.label_map)} label mappings.")
+    analyzer.record_fingerprints = fingerprints
+
+    ranges = (
+        pd.concat(ranges)
+        .groupby(level=0)
+        .agg(
+            {"t_first": "min", "t_last": "max", "value_min": "min", "value_max": "max"}
+        )
+    )
+    return list(ranges.index), float(t_min), float(t_max), n_rows, ranges
+
+
+def _scatter(analyzer, chunk_rows, columns, t_min, step_ms, sums, counts):
+    """
+    Przebieg 2: każda próbka trafia do komórki siatki [k·krok, (k+1)·krok);
+    wiele próbek w jednej komórce jest uśrednianych (sumy + liczniki).
+    """
+    n_time = sums.shape[0]
+    column_of = {rid: i for i, rid in enumerate(columns)}
+    flat_sums = sums.reshape(-1, order="F")  # widok (macierz kolumnowa)
+    flat_counts = counts.reshape(-1, order="F")
+
+    for chunk in _read_chunks(
+        analyzer, chunk_rows, ("timestamp", "record_id", "value")
+    ):
+        offsets = (chunk["timestamp"].to_numpy(dtype=float) - t_min) / step_ms
+        rows = np.floor(offsets + GRID_EPS).astype(np.int64)
+        np.clip(rows, 0, n_time - 1, out=rows)
+        cols = chunk["record_id"].map(column_of).to_numpy(dtype=np.int64)
+
+        # Komórki porcji zsumowane w pamięci, potem jeden zapis na komórkę
+        cells, inverse = np.unique(cols * n_time + rows, return_inverse=True)
+        values = chunk["value"].to_numpy(dtype=np.float64)
+        flat_sums[cells] += np.bincount(inverse, weights=values).astype(np.float32)
+        flat_counts[cells] += np.bincount(inverse).astype(np.uint16)
+
+
+def _interpolate_block(block):
+    """Interpolacja liniowa braków w kolumnach bloku (brzegi stałą wartością)."""
+    positions = np.arange(block.shape[0])
+    for j in range(block.shape[1]):
+        column = block[:, j]
+        missing = np.isnan(column)
+        if missing.any() and not missing.all():
+            column[missing] = np.interp(
+                positions[missing], positions[~missing], column[~missing]
+            )
+
+
+def _grid_quality_stats(sums, counts, seconds, block_width, gap_sec):
+    """
+    Statystyki jakości nagrań (jak MusicalMetaAnalyzer._assess_quality) liczone
+    blokami kolumn na obsadzonych komórkach siatki zamiast surowych próbek:
+    przerwy i zastygnięcia z dokładnością do kroku siatki, wartości uśrednione
+    w komórkach (zakres czasu i wartości nadpisywany potem z przebiegu 1).
+
+    Returns:
+        DataFrame (nagrania w kolejności kolumn) dla _judge_quality
+    """
+    rows = []
+    for c0 in range(0, sums.shape[1], block_width):
+        c1 = min(c0 + block_width, sums.shape[1])
+        n_block = counts[:, c0:c1]
+        sums_block = sums[:, c0:c1]
+        for j in range(c1 - c0):
+            observed = np.flatnonzero(n_block[:, j])
+            if len(observed) == 0:
+                rows.append({"n_samples": 0, "start": 0.0, "end": 0.0})
+                continue
+            values = np.clip(sums_block[observed, j] / n_block[observed, j], 0, 100)
+            t = seconds[observed]
+            dt = np.diff(t)
+            is_gap = dt > gap_sec
+            unchanged = np.abs(np.diff(values)) < 1e-9
+            rows.append(
+                {
+                    "n_samples": int(n_block[:, j].sum(dtype=np.int64)),
+                    "start": t[0],
+                    "end": t[-1],
+                    "value_min": values.min(),
+                    "value_max": values.max(),
+                    "max_gap_sec": dt.max(initial=0.0),
+                    "n_gaps": int(is_gap.sum()),
+                    "gap_time": dt[is_gap].sum(),
+                    "stuck_time": dt[unchanged].sum(),
+                    "covered_time": dt[~is_gap].sum(),
+                }
+            )
+    return pd.DataFrame(rows).fillna(0.0)
+
+
+def preprocess_out_of_core(analyzer):
+    """
+    Buduje df_pivot (Z-Score) i df_diff jako ramki oparte na np.memmap.
+
+    Kroki: skan CSV (identyfikatory, zakres czasu) -> rozproszenie wartości na
+    siatkę ANALYSIS_RATE_HZ (średnia próbek w komórce zamiast filtru
+    antyaliasingowego) -> ocena jakości -> bloki kolumn: clip 0-100,
+    interpolacja, Z-Score, różnicowanie. Pamięć robocza ograniczona przez
+    MEMORY_BUDGET_MB; pliki .npy w OUT_OF_CORE_DIR.
+
+    Args:
+        analyzer: instancja MusicalMetaAnalyzer (wyniki zapisywane w jej polach)
+    """
+    cfg = analyzer.cfg
+    budget = cfg.get("MEMORY_BUDGET_MB", MEMORY_BUDGET_MB) * 1024**2
+    chunk_rows = max(10_000, budget // BYTES_PER_CSV_ROW)
+
+    work_dir = cfg.get("OUT_OF_CORE_DIR") or os.path.join(
+        os.path.dirname(analyzer.get_output_path(base_name="_")), "_memmap"
+    )
+    os.makedirs(work_dir, exist_ok=True)
+
+    start = time.time()
+    record_ids, t_min, t_max, n_rows, ranges = _scan(analyzer, chunk_rows)
+    rate = analyzer.get_analysis_rate()
+    step_ms = 1000.0 / rate
+    n_time = int(np.floor((t_max - t_min) / step_ms + GRID_EPS)) + 1
+    print(
+        f"   -> OUT_OF_CORE: {n_rows} próbek, {len(record_ids)} nagrań, "
+        f"siatka {n_time} × {rate} Hz (porcje po {chunk_rows} wierszy)"
+    )
+
+    # Sumy i liczniki próbek na siatce (pliki tymczasowe)
+    sums_path = os.path.join(work_dir, "scatter_sums.npy")
+    counts_path = os.path.join(work_dir, "scatter_counts.npy")
+    sums = _memmap(sums_path, (n_time, len(record_ids)), np.float32)
+    counts = _memmap(counts_path, (n_time, len(record_ids)), np.uint16)
+    _scatter(analyzer, chunk_rows, record_ids, t_min, step_ms, sums, counts)
+
+    block_width = max(1, int(budget // (n_time * BYTES_PER_CELL)))
+
+    # Ocena jakości (te same progi QUALITY_*): liczba próbek, zakres czasu
+    # i wartości z surowych próbek, przerwy / zastygnięcia / pokrycie z siatki
+    thresholds = {key: cfg.get(key, value) for key, value in QUALITY_DEFAULTS.items()}
+    seconds = np.arange(n_time) * step_ms / 1000.0
+    stats = _grid_quality_stats(
+        sums, counts, seconds, block_width, thresholds["QUALITY_GAP_SEC"]
+    )
+    stats.index = pd.Index(record_ids, name="record_id")
+    stats["start"] = (ranges["t_first"] - t_min) / 1000.0
+    stats["end"] = (ranges["t_last"] - t_min) / 1000.0
+    stats["value_min"] = ranges["value_min"]
+    stats["value_max"] = ranges["value_max"]
+    quality = analyzer._judge_quality(stats, seconds[-1], thresholds)
+    quality["gap_stats_basis"] = f"grid_{rate:g}hz"
+    analyzer.quality_df = quality
+    print(
+        f"   -> Jakość OUT_OF_CORE: przerwy, zastygnięcia i interpolacja liczone "
+        f"na siatce {rate:g} Hz (kolumna gap_stats_basis), pozostałe miary "
+        "z surowych próbek."
+    )
+    analyzer.export_quality_report()
+
+    excluded = set(analyzer.excluded_records)
+    keep = [i for i, rid in enumerate(record_ids) if rid not in excluded]
+    columns = pd.Index([record_ids[i] for i in keep], name="record_id")
+
+    # Wynik: Z-Score i różnice, blokami kolumn
+    pivot = _memmap(
+        os.path.join(work_dir, "pivot.npy"), (n_time, len(keep)), np.float32
+    )
+    diff = _memmap(os.path.join(work_dir, "diff.npy"), (n_time, len(keep)), np.float32)
+    mean = np.zeros(len(keep))
+    std = np.ones(len(keep))
+
+    for c0 in range(0, len(keep), block_width):
+        c1 = min(c0 + block_width, len(keep))
+        source = keep[c0:c1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            block = (sums[:, source] / counts[:, source]).astype(np.float32)
+        np.clip(block, 0, 100, out=block)
+        _interpolate_block(block)
+
+        block_mean = np.nanmean(block, axis=0, dtype=np.float64)
+        block_std = np.nanstd(block, axis=0, ddof=1, dtype=np.float64)
+        block_std[~(block_std > 0)] = 1.0
+        block -= block_mean.astype(np.float32)
+        block /= block_std.astype(np.float32)
+        np.nan_to_num(block, copy=False)
+
+        pivot[:, c0:c1] = block
+        diff[0, c0:c1] = 0
+        diff[1:, c0:c1] = block[1:] - block[:-1]
+        mean[c0:c1], std[c0:c1] = block_mean, block_std
+
+    pivot.flush()
+    diff.flush()
+    del sums, counts
+    for path in (sums_path, counts_path):
+        os.remove(path)
+
+    index = pd.Index(t_min + np.arange(n_time) * step_ms, name="timestamp")
+    analyzer.df_pivot = pd.DataFrame(pivot, index=index, columns=columns, copy=False)
+    analyzer.df_diff = pd.DataFrame(diff, index=index, columns=columns, copy=False)
+    analyzer.zscore_mean = pd.Series(mean, index=columns)
+    analyzer.zscore_std = pd.Series(std, index=columns)
+
+    print(
+        f"   -> Macierz memmap {pivot.shape} w {work_dir} "
+        f"({2 * pivot.nbytes / 1024**2:.1f} MB na dysku, {time.time() - start:.1f}s)"
+    )
+    print(
+        "   (!) pivot.npy i diff.npy pozostają w katalogu po zakończeniu biegu "
+        "(nadpisywane przy kolejnym) - można je usunąć ręcznie."
+    )
@@ -0,0 +1,474 @@
+import math
+import os
+
+import numpy as np
+
+# Wspólne funkcje rysujące dla modułów raportu. matplotlib i scipy są
+# importowane wewnątrz funkcji (uruchomienia bez wykresów ich nie ładują).
+
+# Progi heatmapy (nadpisywane przez konfigurację projektu)
+HEATMAP_ANNOT_MAX = 40  # Wartości liczbowe w komórkach tylko do tej liczby sygnałów
+HEATMAP_LABELS_MAX = 150  # Etykiety osi tylko do tej liczby sygnałów
+HEATMAP_MAX_CELLS = 1000  # Powyżej - uśrednianie blokami (downsampling)
+
+# Decymacja przebiegów czasowych do szerokości wykresu w pikselach
+PLOT_DECIMATION = "minmax"  # minmax | lttb | None (bez decymacji)
+PLOT_MAX_POINTS = 2400  # ~ figsize 16" × 150 dpi
+
+
+def block_mean(matrix, factor):
+    """Uśrednia macierz blokami factor × factor (brzegowe bloki niepełne)."""
+    n_rows, n_cols = matrix.shape
+    pad_rows = (-n_rows) % factor
+    pad_cols = (-n_cols) % factor
+    padded = np.pad(
+        matrix.astype(float), ((0, pad_rows), (0, pad_cols)), constant_values=np.nan
+    )
+    blocks = padded.reshape(
+        padded.shape[0] // factor, factor, padded.shape[1] // factor, factor
+    )
+    return np.nanmean(blocks, axis=(1, 3))
+
+
+def _draw_matrix(ax, data, labels, annotate, show_labels, value_range=(-1, 1)):
+    """Macierz jako pojedynczy zrasteryzowany obraz (zamiast setek tysięcy komórek)."""
+    im = ax.imshow(
+        data,
+        cmap="RdBu_r",
+        vmin=value_range[0],
+        vmax=value_range[1],
+        interpolation="nearest",
+        aspect="auto",
+        rasterized=True,
+    )
+
+    n = data.shape[0]
+    if show_labels:
+        font_size = max(3, min(8, int(600 / max(n, 1))))
+        ax.set_xticks(np.arange(n))
+        ax.set_yticks(np.arange(n))
+        ax.set_xticklabels(labels, rotation=90, fontsize=font_size)
+        ax.set_yticklabels(labels, fontsize=font_size)
+    else:
+        ax.set_xticks([])
+        ax.set_yticks([])
+
+    if annotate:
+        for i in range(n):
+            for j in range(n):
+                ax.text(j, i, f"{data[i, j]:.2f}", ha="center", va="center", fontsize=6)
+
+    return im
+
+
+def render_similarity_heatmap(
+    similarity,
+    linkage_matrix,
+    img_path,
+    title,
+    cfg,
+    value_label="Korelacja Rangowa Spearmana",
+    value_range=(-1, 1),
+):
+    """
+    Heatmapa macierzy podobieństwa z dendrogramami, skalowalna do dużych N.
+
+    - kolejność wierszy/kolumn z gotowej macierzy linkage (bez ponownej klasteryzacji),
+    - macierz rysowana jako jeden zrasteryzowany obraz,
+    - adnotacje i etykiety wyłączane powyżej progów z konfiguracji,
+    - bardzo duże macierze uśredniane blokami (HEATMAP_MAX_CELLS)
+      lub dzielone na kafle w pełnej rozdzielczości (HEATMAP_TILE_SIZE).
+
+    Args:
+        similarity: DataFrame (N × N) z etykietami
+        linkage_matrix: macierz linkage (scipy) dla tych samych sygnałów
+        img_path: ścieżka docelowa PNG
+        title: tytuł wykresu
+        cfg: konfiguracja projektu
+        value_label: opis skali kolorów
+        value_range: zakres skali kolorów (vmin, vmax)
+
+    Returns:
+        list: ścieżki zapisanych obrazów
+    """
+    import matplotlib.pyplot as plt
+    from scipy.cluster.hierarchy import dendrogram, leaves_list
+
+    annot_max = cfg.get("HEATMAP_ANNOT_MAX", HEATMAP_ANNOT_MAX)
+    labels_max = cfg.get("HEATMAP_LABELS_MAX", HEATMAP_LABELS_MAX)
+    max_cells = cfg.get("HEATMAP_MAX_CELLS", HEATMAP_MAX_CELLS)
+
+    order = leaves_list(linkage_matrix)
+    data = similarity.to_numpy()[np.ix_(order, order)]
+    labels = [str(label) for label in similarity.index[order]]
+    n = len(order)
+
+    factor = max(1, math.ceil(n / max_cells))
+    if factor > 1:
+        print(f"   -> Macierz {n}×{n} uśredniona blokami {factor}×{factor}.")
+        data = block_mean(data, factor)
+
+    fig = plt.figure(figsize=(16, 16))
+    grid = fig.add_gridspec(
+        2,
+        3,
+        width_ratios=(0.12, 0.85, 0.03),
+        height_ratios=(0.12, 0.88),
+        wspace=0.01,
+        hspace=0.01,
+    )
+    ax_top = fig.add_subplot(grid[0, 1])
+    ax_left = fig.add_subplot(grid[1, 0])
+    ax_matrix = fig.add_subplot(grid[1, 1])
+    ax_cbar = fig.add_subplot(grid[1, 2])
+
+    # Dendrogramy z tej samej macierzy linkage (liście w odstępach co 10 jednostek)
+    dendro_kw = dict(no_labels=True, color_threshold=0, above_threshold_color="k")
+    dendrogram(linkage_matrix, ax=ax_top, **dendro_kw)
+    dendrogram(linkage_matrix, ax=ax_left, orientation="left", **dendro_kw)
+    ax_top.set_xlim(0, 10 * n)
+    ax_left.set_ylim(10 * n, 0)
+    for ax in (ax_top, ax_left):
+        ax.set_axis_off()
+
+    im = _draw_matrix(
+        ax_matrix,
+        data,
+        labels,
+        annotate=factor == 1 and n <= annot_max,
+        show_labels=factor == 1 and n <= labels_max,
+        value_range=value_range,
+    )
+    fig.colorbar(im, cax=ax_cbar, label=value_label)
+    fig.suptitle(title, y=0.92, fontsize=14)
+
+    fig.savefig(img_path, dpi=150, bbox_inches="tight")
+    plt.close(fig)
+    saved = [img_path]
+
+    # Kafle w pełnej rozdzielczości (z etykietami) dla dużych macierzy
+    tile_size = cfg.get("HEATMAP_TILE_SIZE")
+    if tile_size and n > tile_size:
+        full = similarity.to_numpy()[np.ix_(order, order)]
+        base, extension = os.path.splitext(img_path)
+        for row_start in range(0, n, tile_size):
+            for col_start in range(0, n, tile_size):
+                rows = slice(row_start, row_start + tile_size)
+                cols = slice(col_start, col_start + tile_size)
+                tile = full[rows, cols]
+
+                fig, ax = plt.subplots(figsize=(12, 12))
+                ax.imshow(
+                    tile,
+                    cmap="RdBu_r",
+                    vmin=value_range[0],
+                    vmax=value_range[1],
+                    interpolation="nearest",
+                    aspect="auto",
+                    rasterized=True,
+                )
+                if tile_size <= labels_max:
+                    font_size = max(3, min(8, int(600 / tile_size)))
+                    ax.set_xticks(np.arange(tile.shape[1]))
+                    ax.set_yticks(np.arange(tile.shape[0]))
+                    ax.set_xticklabels(labels[cols], rotation=90, fontsize=font_size)
+                    ax.set_yticklabels(labels[rows], fontsize=font_size)
+                ax.set_title(
+                    f"{title}\nWiersze {row_start}-{row_start + tile.shape[0] - 1}, "
+                    f"kolumny {col_start}-{col_start + tile.shape[1] - 1}",
+                    fontsize=10,
+                )
+
+                tile_path = f"{base}_tile_r{row_start}_c{col_start}{extension}"
+                fig.savefig(tile_path, dpi=150, bbox_inches="tight")
+                plt.close(fig)
+                saved.append(tile_path)
+
+        print(
+            f"   -> Zapisano {len(saved) - 1} kafli heatmapy ({tile_size}×{tile_size})."
+        )
+
+    return saved
+
+
+def _bucket_edges(n_samples, n_buckets):
+    return np.linspace(0, n_samples, n_buckets + 1).astype(int)
+
+
+def minmax_decimate(x, values, n_buckets):
+    """
+    Decymacja min/max: z każdego kubełka próbek zostają wartość minimalna
+    i maksymalna (w kolejności czasowej) - obwiednia sygnału bez zmian.
+
+    Args:
+        x: oś czasu (T,)
+        values: macierz (T × N) - wszystkie serie naraz
+        n_buckets: liczba kubełków (wynik ma 2 × n_buckets punktów)
+
+    Returns:
+        tuple: (x_out, y_out), obie macierze (2 × n_buckets × N)
+    """
+    n_samples, n_series = values.shape
+    size = math.ceil(n_samples / n_buckets)
+    n_buckets = math.ceil(n_samples / size)
+    pad = n_buckets * size - n_samples
+
+    padded = np.pad(values.astype(float), ((0, pad), (0, 0)), constant_values=np.nan)
+    blocks = padded.reshape(n_buckets, size, n_series)
+    missing = np.isnan(blocks)
+
+    # NaN nie może wygrać min/max (kubełek w całości NaN zostaje przerwą w linii)
+    arg_min = np.where(missing, np.inf, blocks).argmin(axis=1)
+    arg_max = np.where(missing, -np.inf, blocks).argmax(axis=1)
+
+    offsets = (np.arange(n_buckets) * size)[:, None]
+    first = offsets + np.minimum(arg_min, arg_max)
+    second = offsets + np.maximum(arg_min, arg_max)
+    idx = np.stack([first, second], axis=1).reshape(2 * n_buckets, n_series)
+    idx = np.minimum(idx, n_samples - 1)
+
+    return np.asarray(x)[idx], np.take_along_axis(values, idx, axis=0)
+
+
+def lttb_decimate(x, values, n_out):
+    """
+    Largest-Triangle-Three-Buckets dla wszystkich serii naraz (wspólna oś x).
+    Pętla po kubełkach, obliczenia wektorowe po seriach.
+
+    Args:
+        x: oś czasu (T,)
+        values: macierz (T × N)
+        n_out: docelowa liczba punktów (łącznie z pierwszym i ostatnim)
+
+    Returns:
+        tuple: (x_out, y_out), obie macierze (n_out × N)
+    """
+    x = np.asarray(x, dtype=float)
+    raw = values
+    values = np.nan_to_num(values.astype(float))
+    n_samples, n_series = values.shape
+    columns = np.arange(n_series)
+
+    edges = _bucket_edges(n_samples - 2, n_out - 2) + 1
+    idx = np.empty((n_out, n_series), dtype=int)
+    idx[0] = 0
+    idx[-1] = n_samples - 1
+
+    for b in range(n_out - 2):
+        start, end = edges[b], edges[b + 1]
+        if b + 2 < n_out - 1:
+            next_start, next_end = edges[b + 1], edges[b + 2]
+        else:
+            next_start, next_end = n_samples - 1, n_samples
+        avg_x = x[next_start:next_end].mean()
+        avg_y = values[next_start:next_end].mean(axis=0)
+
+        prev = idx[b]
+        prev_x = x[prev]
+        prev_y = values[prev, columns]
+
+        # Pole trójkąta (poprzedni punkt, kandydat, średnia następnego kubełka)
+        area = np.abs(
+            (prev_x - avg_x) * (values[start:end] - prev_y)
+            - (prev_x[None, :] - x[start:end, None]) * (avg_y - prev_y)
+        )
+        idx[b + 1] = start + area.argmax(axis=0)
+
+    return x[idx], raw[idx, columns]
+
+
+def decimate_series(x, values, cfg):
+    """
+    Zmniejsza liczbę punktów serii do rozdzielczości wykresu (PLOT_DECIMATION,
+    PLOT_MAX_POINTS). Krótkie serie zwracane bez zmian.
+
+    Args:
+        x: oś czasu (T,)
+        values: macierz (T × N) lub wektor (T,)
+        cfg: konfiguracja projektu
+
+    Returns:
+        tuple: (x_out, y_out) o kształcie (P × N) lub (P,) dla wektora
+    """
+    method = cfg.get("PLOT_DECIMATION", PLOT_DECIMATION)
+    max_points = cfg.get("PLOT_MAX_POINTS", PLOT_MAX_POINTS)
+
+    values = np.asarray(values, dtype=float)
+    vector = values.ndim == 1
+    if vector:
+        values = values[:, None]
+    x = np.asarray(x, dtype=float)
+
+    if not method or len(x) <= 2 * max_points:
+        x_out = np.repeat(x[:, None], values.shape[1], axis=1)
+        y_out = values
+    elif method == "lttb":
+        x_out, y_out = lttb_decimate(x, values, 2 * max_points)
+    else:
+        x_out, y_out = minmax_decimate(x, values, max_points)
+
+    if vector:
+        return x_out[:, 0], y_out[:, 0]
+    return x_out, y_out
+
+
+def cached_decimation(analyzer, key, x, frame):
+    """
+    decimate_series z pamięcią podręczną na analizatorze - te same dane
+    (np. df_pivot) rysowane na kilku wykresach projektu są decymowane raz.
+
+    Returns:
+        dict: {"x": (P × N), "y": (P × N), "columns": list}
+    """
+    cache_key = (
+        key,
+        frame.shape,
+        analyzer.cfg.get("PLOT_DECIMATION", PLOT_DECIMATION),
+        analyzer.cfg.get("PLOT_MAX_POINTS", PLOT_MAX_POINTS),
+    )
+    if cache_key not in analyzer.plot_cache:
+        x_out, y_out = decimate_series(x, frame.to_numpy(dtype=float), analyzer.cfg)
+        analyzer.plot_cache[cache_key] = {
+            "x": x_out,
+            "y": y_out,
+            "columns": list(frame.columns),
+        }
+    return analyzer.plot_cache[cache_key]
+
+
+def draw_line_collection(ax, x, y, colors=None, linewidth=0.8, alpha=0.6, **kwargs):
+    """
+    Rysuje wszystkie serie jako jedną LineCollection (jeden artysta zamiast N).
+
+    Args:
+        ax: oś matplotlib
+        x, y: macierze (P × N) - kolumna = jedna seria
+        colors: kolor lub lista kolorów (domyślnie cykl kolorów matplotlib)
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    if y.shape[1] == 0:
+        return None
+
+    if colors is None:
+        cycle = plt.rcParams["axes.prop_cycle"].by_key()["color"]
+        colors = [cycle[i % len(cycle)] for i in range(y.shape[1])]
+
+    segments = np.stack([x.T, y.T], axis=-1)
+    collection = LineCollection(
+        segments, colors=colors, linewidths=linewidth, alpha=alpha, **kwargs
+    )
+    ax.add_collection(collection)
+    ax.autoscale_view()
+    return collection
+
+
+def render_alluvial(membership, img_path, title, highlight=None, node_width=0.12):
+    """
+    Wykres aluwialny przynależności do klastrów w kolejnych segmentach.
+    Węzły - klastry segmentu (wysokość = liczba słuchaczy), wstęgi - przejścia.
+
+    Args:
+        membership: DataFrame (słuchacze × segmenty) z numerami klastrów
+        img_path: ścieżka docelowa PNG
+        title: tytuł wykresu
+        highlight: etykieta słuchacza (np. kompozytora) zaznaczana linią
+        node_width: szerokość węzła (odstęp segmentów = 1)
+    """
+    import matplotlib.pyplot as plt
+
+    values = membership.to_numpy()
+    n_signals, n_segments = values.shape
+    cluster_ids = np.unique(values)
+    cmap = plt.get_cmap("tab10")
+    colors = {cid: cmap(i % 10) for i, cid in enumerate(cluster_ids)}
+    gap = max(1.0, 0.04 * n_signals)
+
+    # Pozycje węzłów: klastry w stałej kolejności, ułożone od góry
+    bottoms = []
+    for s in range(n_segments):
+        counts = {cid: int((values[:, s] == cid).sum()) for cid in cluster_ids}
+        y, positions = 0.0, {}
+        for cid in cluster_ids:
+            if counts[cid]:
+                positions[cid] = y
+                y += counts[cid] + gap
+        bottoms.append(positions)
+
+    fig, ax = plt.subplots(figsize=(max(10, 1.6 * n_segments), 8))
+    half = node_width / 2
+    t = np.linspace(0, 1, 30)
+    smooth = t * t * (3 - 2 * t)
+
+    for s in range(n_segments - 1):
+        out_offset = dict(bottoms[s])
+        in_offset = dict(bottoms[s + 1])
+        pairs, pair_counts = np.unique(values[:, s : s + 2], axis=0, return_counts=True)
+
+        # Pary posortowane wg (źródło, cel): wyjścia węzła ułożone wg celu,
+        # wejścia wg źródła - wstęgi nie krzyżują się w obrębie węzła
+        for (src, dst), n in zip(pairs, pair_counts):
+            y0 = out_offset[src]
+            y1 = in_offset[dst]
+            out_offset[src] += n
+            in_offset[dst] += n
+
+            x = s + half + (1 - node_width) * t
+            lower = y0 + (y1 - y0) * smooth
+            ax.fill_between(
+                x, lower, lower + n, color=colors[src], alpha=0.35, linewidth=0
+            )
+
+    for s, positions in enumerate(bottoms):
+        for cid, y in positions.items():
+            count = int((values[:, s] == cid).sum())
+            ax.add_patch(
+                plt.Rectangle(
+                    (s - half, y), node_width, count, color=colors[cid], zorder=3
+                )
+            )
+            ax.text(
+                s,
+                y + count / 2,
+                str(cid),
+                ha="center",
+                va="center",
+                fontsize=8,
+                color="white",
+                fontweight="bold",
+                zorder=6,
+            )
+
+    if highlight is not None and highlight in membership.index:
+        row = membership.index.get_loc(highlight)
+        centers = [
+            bottoms[s][values[row, s]] + (values[:, s] == values[row, s]).sum() / 2
+            for s in range(n_segments)
+        ]
+        ax.plot(
+            range(n_segments),
+            centers,
+            color="black",
+            linestyle="--",
+            marker="*",
+            markersize=12,
+            zorder=5,
+            label=f"KOMPOZYTOR: {highlight}",
+        )
+        ax.legend(loc="upper right", fontsize=10)
+
+    ax.set_xticks(range(n_segments))
+    ax.set_xticklabels(membership.columns, rotation=45, ha="right", fontsize=9)
+    ax.set_xlim(-0.5, n_segments - 0.5)
+    ax.invert_yaxis()
+    ax.set_yticks([])
+    ax.set_ylabel("Słuchacze (liczebność klastrów)", fontsize=11)
+    ax.set_title(title, fontsize=13, fontweight="bold")
+    for side in ("top", "right", "left"):
+        ax.spines[side].set_visible(False)
+
+    plt.tight_layout()
+    plt.savefig(img_path, dpi=150, bbox_inches="tight")
+    plt.close(fig)
+    return img_path
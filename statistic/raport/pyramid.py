@@ -0,0 +1,204 @@
+import json
+import os
+
+import numpy as np
+
+# Piramida wielorozdzielcza dla przeglądarki web-analysis: poziom k ma kubełki
+# PYRAMID_FACTOR^k próbek (poziom 0 - same próbki), kolejne poziomy liczone
+# z poprzedniego aż do PYRAMID_MIN_BUCKETS kubełków. Każdy poziom dzielony
+# w czasie na pliki binarne po PYRAMID_CHUNK kubełków.
+PYRAMID_FACTOR = 4
+PYRAMID_MIN_BUCKETS = 512
+PYRAMID_CHUNK = 4096
+PYRAMID_DTYPES = ("float32", "float16")
+PYRAMID_VERSION = 1
+
+
+def _blocks(matrix, factor, fill):
+    """(B × N) -> (ceil(B / factor) × factor × N), ostatni blok dopełniony fill."""
+    pad = (-len(matrix)) % factor
+    padded = np.pad(matrix, ((0, pad), (0, 0)), constant_values=fill)
+    return padded.reshape(-1, factor, matrix.shape[1])
+
+
+def pyramid_levels(values, factor=PYRAMID_FACTOR, min_buckets=PYRAMID_MIN_BUCKETS):
+    """
+    Poziomy min/max/mean dla wszystkich serii naraz (T × N).
+
+    Poziom k + 1 powstaje z poziomu k: min z minimów, max z maksimów, średnia
+    ważona liczbą próbek (ostatni kubełek może być niepełny).
+
+    Returns:
+        list: [(rozmiar kubełka w próbkach, {kanał: macierz (kubełki × N)})],
+        poziom 0 ma jeden kanał "value"
+    """
+    values = np.asarray(values, dtype=float)
+    levels = [(1, {"value": values})]
+
+    low, high, mean = values, values, values
+    counts = np.ones(len(values))
+    size = 1
+    while len(mean) > min_buckets:
+        low = _blocks(low, factor, np.inf).min(axis=1)
+        high = _blocks(high, factor, -np.inf).max(axis=1)
+        weights = _blocks(counts[:, None], factor, 0.0)
+        totals = (_blocks(mean, factor, 0.0) * weights).sum(axis=1)
+        counts = weights.sum(axis=1)[:, 0]
+        mean = totals / counts[:, None]
+        size *= factor
+        levels.append((size, {"min": low, "max": high, "mean": mean}))
+    return levels
+
+
+class PyramidModule:
+    def __init__(
+        self, analyzer_instance, narrative_module=None, clustering_module=None
+    ):
+        """
+        Eksport piramidy wielorozdzielczej dla przeglądarki web-analysis:
+        nagrania (skala suwaka 0-100), trajektorie Narrative (każda referencja)
+        i średnie profile klastrów. Przeglądarka pobiera tylko poziom i zakres
+        czasu, który wyświetla (manifest JSON + pliki binarne).
+        """
+        self.parent = analyzer_instance
+        self.cfg = analyzer_instance.cfg
+        self.narrative = narrative_module
+        self.clustering = clustering_module
+        self.layers = {}  # Nazwa warstwy -> (macierz T × N, opis serii)
+        self.manifest = None
+
+    def run_analysis(self):
+        print("--- [Moduł Pyramid] Piramida wielorozdzielcza ---")
+
+        df_raw = self.parent.df_raw
+        if df_raw is None or df_raw.empty:
+            print("   (!) Brak danych wejściowych.")
+            return None
+
+        clusters = {}
+        if self.clustering is not None and self.clustering.cluster_labels is not None:
+            clusters = dict(
+                zip(self.clustering.valid_cols, self.clustering.cluster_labels)
+            )
+
+        self.layers["records"] = (
+            df_raw.to_numpy(dtype=float),
+            [
+                {
+                    "id": str(rid),
+                    "label": self.parent.get_record_label(rid),
+                    "cluster_id": (int(clusters[rid]) if rid in clusters else None),
+                }
+                for rid in df_raw.columns
+            ],
+        )
+
+        if self.narrative is not None:
+            for ref, trajectories in self.narrative.results_by_reference.items():
+                if trajectories.empty:
+                    continue
+                suffix = self.parent.get_reference_suffix(ref)
+                self.layers[f"narrative{suffix}"] = (
+                    trajectories.to_numpy(dtype=float),
+                    [{"label": str(c)} for c in trajectories.columns],
+                )
+
+        if self.clustering is not None and self.clustering.stats is not None:
+            stats = self.clustering.stats
+            self.layers["cluster_means"] = (
+                stats.mean.to_numpy(dtype=float),
+                [
+                    {"cluster_id": int(cid), "n_members": int(n)}
+                    for cid, n in zip(stats.cluster_ids, stats.counts)
+                ],
+            )
+
+        print(
+            f"   Warstwy: {', '.join(self.layers)} "
+            f"({len(df_raw)} próbek, {self.parent.get_analysis_rate():g} Hz)"
+        )
+        return self.layers
+
+    def export_results(self):
+        """Pliki binarne poziomów (porcje w czasie) + manifest.json."""
+        if not self.layers:
+            return
+
+        factor = self.cfg.get("PYRAMID_FACTOR", PYRAMID_FACTOR)
+        min_buckets = self.cfg.get("PYRAMID_MIN_BUCKETS", PYRAMID_MIN_BUCKETS)
+        chunk = self.cfg.get("PYRAMID_CHUNK", PYRAMID_CHUNK)
+        dtype = self.cfg.get("PYRAMID_DTYPE", "float32")
+        if dtype not in PYRAMID_DTYPES:
+            print(f"   (!) Nieznany typ '{dtype}', używam float32.")
+            dtype = "float32"
+
+        root = self.parent.get_output_path(
+            base_name="pyramid", prefix="07_", extension=""
+        )
+        os.makedirs(root, exist_ok=True)
+
+        rate = self.parent.get_analysis_rate()
+        index = np.asarray(self.parent.df_raw.index, dtype=float)
+        self.manifest = {
+            "version": PYRAMID_VERSION,
+            "name": self.cfg.get("NAME", ""),
+            "dtype": dtype,
+            "byte_order": "little",
+            "layout": ["channel", "series", "bucket"],
+            "start_timestamp_ms": float(index[0]),
+            "sample_ms": 1000.0 / rate,
+            "n_samples": len(index),
+            "layers": {},
+        }
+
+        total_bytes = 0
+        for name, (values, series) in self.layers.items():
+            levels = []
+            for level, (size, channels) in enumerate(
+                pyramid_levels(values, factor, min_buckets)
+            ):
+                stacked = np.stack([channels[c].T for c in channels]).astype(
+                    np.dtype(dtype).newbyteorder("<")
+                )
+                n_buckets = stacked.shape[2]
+                folder = os.path.join(name, f"L{level}")
+                os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+                chunks = []
+                for i, start in enumerate(range(0, n_buckets, chunk)):
+                    part = np.ascontiguousarray(stacked[:, :, start : start + chunk])
+                    file_name = os.path.join(folder, f"c{i:04d}.bin")
+                    part.tofile(os.path.join(root, file_name))
+                    chunks.append(
+                        {
+                            "file": file_name.replace(os.sep, "/"),
+                            "start_bucket": start,
+                            "n_buckets": part.shape[2],
+                            "bytes": part.nbytes,
+                        }
+                    )
+                    total_bytes += part.nbytes
+
+                levels.append(
+                    {
+                        "level": level,
+                        "bucket_samples": size,
+                        "bucket_ms": size * 1000.0 / rate,
+                        "n_buckets": n_buckets,
+                        "channels": list(channels),
+                        "chunks": chunks,
+                    }
+                )
+            self.manifest["layers"][name] = {"series": series, "levels": levels}
+
+        manifest_path = os.path.join(root, "manifest.json")
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+
+        n_levels = sum(
+            len(layer["levels"]) for layer in self.manifest["layers"].values()
+        )
+        print(
+            f"   -> Piramida zapisana: {manifest_path} "
+            f"({n_levels} poziomów, {total_bytes / 1024**2:.1f} MB)"
+        )
@@ -0,0 +1,135 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Momenty rang w blokach czasu: korelacja rangowa dowolnej kombinacji bloków
+# (bootstrap, segmenty) z sum i iloczynów krzyżowych, bez ponownego rangowania.
+
+
+def rank_columns(values):
+    """
+    Rangi kolumnami (remisy - ranga średnia), wycentrowane wokół zera.
+
+    Args:
+        values: macierz (T × N)
+
+    Returns:
+        numpy array (T × N) float64
+    """
+    from scipy.stats import rankdata
+
+    ranks = rankdata(values, axis=0)
+    return ranks - (len(values) + 1) / 2.0
+
+
+def window_ranks(values, window, start, stop):
+    """
+    Rangi w oknach przesuwnych kończących się w próbkach start..stop-1
+    (remisy - ranga średnia), wycentrowane wokół zera.
+
+    Args:
+        values: szereg (T,)
+        window: długość okna (start >= window - 1)
+        start, stop: zakres końców okien
+
+    Returns:
+        numpy array ((stop - start) × window)
+    """
+    from scipy.stats import rankdata
+
+    windows = sliding_window_view(values[start - window + 1 : stop], window)
+    return rankdata(windows, axis=1) - (window + 1) / 2.0
+
+
+def correlation_from_moments(count, sums, cross):
+    """
+    Macierz korelacji Pearsona z momentów: liczby próbek, sum i iloczynów krzyżowych.
+    Na rangach - korelacja Spearmana. Kolumny stałe dają NaN.
+    """
+    mean = sums / count
+    cov = cross / count - np.outer(mean, mean)
+    std = np.sqrt(np.clip(np.diag(cov), 0, None))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = cov / np.outer(std, std)
+    np.fill_diagonal(corr, 1.0)
+    return np.clip(corr, -1.0, 1.0)
+
+
+class BlockRankMoments:
+    def __init__(self, values, block_len=None, ranks=None, starts=None, path=None):
+        """
+        Rangi liczone raz dla całego nagrania, następnie dla każdego bloku:
+        liczba próbek, sumy rang (N) i iloczyny krzyżowe (N × N).
+
+        Args:
+            values: macierz (T × N)
+            block_len: długość bloku w próbkach (ostatni, niepełny blok zachowany)
+            ranks: gotowe rangi (rank_columns) - pomija rangowanie
+            starts: początki bloków o dowolnych długościach (zamiast block_len)
+            path: plik .npy na iloczyny krzyżowe (memmap tylko do odczytu) -
+                kopia obiektu w procesie roboczym otwiera ten plik zamiast
+                dostawać tensor bloki × N × N w pickle
+        """
+        if ranks is None:
+            ranks = rank_columns(values)
+        n_samples, n_signals = ranks.shape
+
+        if starts is None:
+            starts = np.arange(0, n_samples, max(1, int(block_len)))
+        self.starts = np.asarray(starts, dtype=int)
+        ends = np.append(self.starts[1:], n_samples)
+
+        self.sizes = (ends - self.starts).astype(float)
+        self.sums = np.add.reduceat(ranks, self.starts, axis=0)
+
+        shape = (len(self.starts), n_signals, n_signals)
+        self.path = path
+        if path is None:
+            self.cross = np.empty(shape)
+        else:
+            self.cross = np.lib.format.open_memmap(
+                path, mode="w+", dtype=np.float64, shape=shape
+            )
+        for i, (start, end) in enumerate(zip(self.starts, ends)):
+            block = ranks[start:end]
+            self.cross[i] = block.T @ block
+        if path is not None:
+            self.cross.flush()
+            self.cross = np.load(path, mmap_mode="r")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.path is not None:
+            state["cross"] = None  # Odtwarzane z pliku w __setstate__
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.cross is None:
+            self.cross = np.load(self.path, mmap_mode="r")
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def block_correlation(self, i):
+        """Korelacja rang w pojedynczym bloku i."""
+        return correlation_from_moments(self.sizes[i], self.sums[i], self.cross[i])
+
+    def correlation(self, weights=None):
+        """
+        Korelacja rang dla kombinacji bloków z wagami (np. liczba wylosowań
+        bloku w bootstrapie; 0/1 - wybrany fragment nagrania).
+
+        Args:
+            weights: wagi bloków (domyślnie wszystkie = 1)
+
+        Returns:
+            numpy array (N × N)
+        """
+        if weights is None:
+            weights = np.ones(len(self))
+        weights = np.asarray(weights, dtype=float)
+        return correlation_from_moments(
+            weights @ self.sizes,
+            weights @ self.sums,
+            np.tensordot(weights, self.cross, axes=1),
+        )
@@ -0,0 +1,250 @@
+import numpy as np
+import pandas as pd
+from ranks import BlockRankMoments, rank_columns
+
+# Rangowanie w segmentach: "global" - rangi z całego nagrania (spójne ze
+# stabilnością), "local" - rangi w obrębie segmentu (dokładny Spearman segmentu)
+SEGMENT_RANK_MODES = ("global", "local")
+SEGMENT_MIN_SAMPLES = 3  # Krótsze segmenty dołączane do sąsiedniego
+
+
+def match_labels(previous, current):
+    """
+    Dopasowuje numery klastrów bieżącego segmentu do poprzedniego
+    (algorytm węgierski na macierzy wspólnych członków).
+    Klastry bez odpowiednika dostają nowe, wolne numery.
+
+    Args:
+        previous: etykiety w poprzednim segmencie (N,)
+        current: etykiety w bieżącym segmencie (N,)
+
+    Returns:
+        numpy array (N,) - etykiety bieżące w numeracji poprzednich
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    prev_ids, prev_codes = np.unique(previous, return_inverse=True)
+    cur_ids, cur_codes = np.unique(current, return_inverse=True)
+
+    overlap = np.zeros((len(prev_ids), len(cur_ids)), dtype=int)
+    np.add.at(overlap, (prev_codes, cur_codes), 1)
+    rows, cols = linear_sum_assignment(-overlap)
+
+    mapping = {cur_ids[c]: prev_ids[r] for r, c in zip(rows, cols)}
+    next_id = max(prev_ids.max(), cur_ids.max()) + 1
+    for cid in cur_ids:
+        if cid not in mapping:
+            mapping[cid] = next_id
+            next_id += 1
+
+    return np.array([mapping[c] for c in current])
+
+
+class SegmentedClusteringModule:
+    def __init__(self, analyzer_instance, clustering_module):
+        """
+        Klasteryzacja w segmentach czasu (dynamika profili w trakcie utworu).
+
+        Macierze podobieństwa segmentów z momentów rang (sumy i iloczyny krzyżowe
+        liczone raz dla każdego segmentu), klastry dopasowane między kolejnymi
+        segmentami, tabela przynależności i przejść oraz wykres aluwialny.
+        """
+        self.parent = analyzer_instance
+        self.cfg = analyzer_instance.cfg
+        self.clustering = clustering_module
+
+        self.segments = None  # DataFrame: start_sec, end_sec, samples
+        self.membership_df = None  # Słuchacze × segmenty
+        self.transitions_df = None
+
+    def _segment_starts(self, time_seconds):
+        """Początki segmentów (indeksy próbek): granice sekcji lub stałe okna."""
+        boundaries = self.cfg.get("SEGMENT_BOUNDARIES_SEC")
+        if boundaries:
+            edges = np.unique(np.concatenate([[0.0], np.asarray(boundaries, float)]))
+        else:
+            seconds = self.cfg.get("SEGMENT_SECONDS", 30)
+            edges = np.arange(0.0, time_seconds[-1], seconds)
+            # Zbyt krótka końcówka dołączana do ostatniego segmentu
+            if len(edges) > 1 and time_seconds[-1] - edges[-1] < seconds / 2:
+                edges = edges[:-1]
+
+        n_samples = len(time_seconds)
+        starts = np.unique(np.searchsorted(time_seconds, edges))
+        starts = starts[starts < n_samples]
+
+        # Segment krótszy niż SEGMENT_MIN_SAMPLES łączony z następnym
+        # (ostatni - z poprzednim)
+        kept = [0]
+        for start in starts:
+            if start - kept[-1] >= SEGMENT_MIN_SAMPLES:
+                kept.append(start)
+        if len(kept) > 1 and n_samples - kept[-1] < SEGMENT_MIN_SAMPLES:
+            kept.pop()
+        if len(kept) < len(starts):
+            print(
+                f"   (!) Połączono segmenty krótsze niż {SEGMENT_MIN_SAMPLES} próbek "
+                f"({len(starts)} -> {len(kept)})."
+            )
+        return np.array(kept, dtype=int)
+
+    def run_analysis(self):
+        from scipy.cluster.hierarchy import linkage, fcluster
+        from scipy.spatial.distance import squareform
+
+        print("--- [Moduł Segmented] Klasteryzacja w segmentach czasu ---")
+
+        clustering = self.clustering
+        if clustering is None or clustering.cluster_labels is None:
+            print("   (!) Brak wyników klasteryzacji - pomijam.")
+            return None
+
+        valid_cols = clustering.valid_cols
+        reference = np.asarray(clustering.cluster_labels)
+        n_clusters = self.cfg.get("SEGMENT_N_CLUSTERS") or len(np.unique(reference))
+
+        df_pivot = self.parent.df_pivot
+        time_seconds = self.parent.get_time_axis_seconds(df_pivot.index)
+        values = df_pivot[valid_cols].to_numpy(dtype=float)
+        starts = self._segment_starts(time_seconds)
+        ends = np.append(starts[1:], len(values))
+
+        mode = self.cfg.get("SEGMENT_RANKS", "global")
+        if mode not in SEGMENT_RANK_MODES:
+            print(f"   (!) Nieznany tryb rang '{mode}', używam global.")
+            mode = "global"
+
+        if mode == "local":
+            ranks = np.empty_like(values)
+            for start, end in zip(starts, ends):
+                ranks[start:end] = rank_columns(values[start:end])
+        else:
+            ranks = rank_columns(values)
+        moments = BlockRankMoments(values, ranks=ranks, starts=starts)
+
+        print(
+            f"   {len(starts)} segmentów, {len(valid_cols)} sygnałów, "
+            f"k={n_clusters}, rangi: {mode}"
+        )
+
+        # Klasteryzacja każdego segmentu, numeracja dopasowana do poprzedniego
+        previous = reference
+        columns = {}
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            corr = np.nan_to_num(moments.block_correlation(i))
+            dist = np.clip(1 - corr, 0, 2)
+            np.fill_diagonal(dist, 0.0)
+            tree = linkage(squareform(dist, checks=False), method="ward")
+            labels = fcluster(tree, t=n_clusters, criterion="maxclust")
+
+            labels = match_labels(previous, labels)
+            # Numer segmentu w kluczu - krótkie segmenty mają ten sam zakres sekund
+            label = f"S{i + 1}_{time_seconds[start]:.0f}-{time_seconds[end - 1]:.0f}s"
+            columns[label] = labels
+            previous = labels
+
+        self.segments = pd.DataFrame(
+            {
+                "segment": list(columns),
+                "start_sec": time_seconds[starts],
+                "end_sec": time_seconds[ends - 1],
+                "samples": ends - starts,
+            }
+        )
+
+        record_labels = [self.parent.get_record_label(rid) for rid in valid_cols]
+        self.membership_df = pd.DataFrame(columns, index=record_labels)
+        self.membership_df.index.name = "record_id"
+        self.membership_df.insert(0, "global_cluster", reference)
+
+        # Przejścia między kolejnymi segmentami
+        segment_labels = list(columns)
+        memberships = self.membership_df[segment_labels].to_numpy()
+        self.membership_df["n_switches"] = (
+            memberships[:, 1:] != memberships[:, :-1]
+        ).sum(axis=1)
+
+        rows = []
+        for i in range(len(segment_labels) - 1):
+            pairs = pd.DataFrame(
+                {"from_cluster": memberships[:, i], "to_cluster": memberships[:, i + 1]}
+            )
+            counts = pairs.value_counts().rename("n").reset_index()
+            counts.insert(0, "to_segment", segment_labels[i + 1])
+            counts.insert(0, "from_segment", segment_labels[i])
+            rows.append(counts)
+        self.transitions_df = (
+            pd.concat(rows, ignore_index=True)
+            if rows
+            else pd.DataFrame(
+                columns=[
+                    "from_segment",
+                    "to_segment",
+                    "from_cluster",
+                    "to_cluster",
+                    "n",
+                ]
+            )
+        )
+
+        switch_rate = self.membership_df["n_switches"].mean() / max(
+            1, len(segment_labels) - 1
+        )
+        print(
+            f"   -> Średni odsetek zmian klastra między segmentami: {switch_rate:.2f}"
+        )
+        return self.membership_df
+
+    def export_results(self):
+        if self.membership_df is None:
+            return
+
+        membership_path = self.parent.get_output_path(
+            base_name="segmented_membership", prefix="05_", extension=".csv"
+        )
+        self.membership_df.to_csv(membership_path)
+        print(f"   -> Przynależność w segmentach zapisana: {membership_path}")
+
+        transitions_path = self.parent.get_output_path(
+            base_name="segmented_transitions", prefix="05_", extension=".csv"
+        )
+        self.transitions_df.to_csv(transitions_path, index=False)
+        print(f"   -> Przejścia między segmentami zapisane: {transitions_path}")
+
+        segments_path = self.parent.get_output_path(
+            base_name="segmented_segments", prefix="05_", extension=".csv"
+        )
+        self.segments.to_csv(segments_path, index=False)
+
+    def export_graph(self):
+        """Wykres aluwialny: klastry w kolejnych segmentach i przepływy słuchaczy."""
+        if self.membership_df is None:
+            print("   (!) Brak danych segmentów do wykresu.")
+            return
+
+        from plotting import render_alluvial
+
+        print("   Generowanie wykresu aluwialnego...")
+
+        try:
+            img_path = self.parent.get_output_path(
+                base_name="segmented_alluvial", prefix="05_", extension=".png"
+            )
+            composer_id = (self.parent.get_reference_ids() or [None])[0]
+            composer_label = (
+                self.parent.get_record_label(composer_id)
+                if composer_id in self.clustering.valid_cols
+                else None
+            )
+            render_alluvial(
+                self.membership_df[list(self.segments["segment"])],
+                img_path,
+                title=(
+                    f"Profile słuchaczy w segmentach utworu\n{self.cfg.get('NAME', '')}"
+                ),
+                highlight=composer_label,
+            )
+            print(f"   -> Wykres aluwialny zapisany: {img_path}")
+
+        except Exception as e:
+            print(f"   (!) Błąd wykresu aluwialnego: {e}")
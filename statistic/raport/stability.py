@@ -0,0 +1,244 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+from export import export_matrix
+from ranks import BlockRankMoments
+
+# Domyślna liczba procesów roboczych: liczba CPU, ale nie więcej niż tyle
+STABILITY_MAX_WORKERS = 4
+
+# Stan procesów roboczych (ustawiany raz przez initializer puli)
+_WORKER_STATE = {}
+
+
+def _init_worker(moments, n_draws, blocks_per_draw, n_clusters):
+    _WORKER_STATE.update(
+        moments=moments,
+        n_draws=n_draws,
+        blocks_per_draw=blocks_per_draw,
+        n_clusters=n_clusters,
+    )
+
+
+def _run_replicates(seeds):
+    """
+    Replikacje bootstrapu dla listy ziaren: losowanie bloków, korelacja rang
+    z momentów bloków, linkage (Ward) i cięcie na tyle klastrów co referencja.
+
+    Returns:
+        numpy array (len(seeds) × N) - etykiety klastrów
+    """
+    from scipy.cluster.hierarchy import linkage, fcluster
+    from scipy.spatial.distance import squareform
+
+    moments = _WORKER_STATE["moments"]
+    n_draws = _WORKER_STATE["n_draws"]
+    blocks_per_draw = _WORKER_STATE["blocks_per_draw"]
+    n_clusters = _WORKER_STATE["n_clusters"]
+    n_starts = len(moments) - blocks_per_draw + 1
+
+    labels = []
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        # Blok przesuwny = blocks_per_draw kolejnych pod-bloków od losowego startu
+        starts = rng.integers(0, n_starts, size=n_draws)
+        covered = (starts[:, None] + np.arange(blocks_per_draw)).ravel()
+        weights = np.bincount(covered, minlength=len(moments))
+
+        corr = np.nan_to_num(moments.correlation(weights))
+        dist = np.clip(1 - corr, 0, 2)
+        np.fill_diagonal(dist, 0.0)
+        tree = linkage(squareform(dist, checks=False), method="ward")
+        labels.append(fcluster(tree, t=n_clusters, criterion="maxclust"))
+
+    return np.array(labels)
+
+
+class StabilityModule:
+    def __init__(self, analyzer_instance, clustering_module):
+        """
+        Stabilność profili słuchaczy (bootstrap blokowy).
+
+        Rangi i momenty (sumy, iloczyny krzyżowe) liczone są raz dla pod-bloków
+        czasu; replikacja to ważona suma momentów wylosowanych bloków, linkage
+        i cięcie na liczbę klastrów z ClusteringModule. Korelacja na rangach
+        globalnych (nie ponownie rangowanych w replikacji) - przybliżenie Spearmana.
+        """
+        self.parent = analyzer_instance
+        self.cfg = analyzer_instance.cfg
+        self.clustering = clustering_module
+
+        self.coassignment = None  # Odsetek replikacji z parą w jednym klastrze
+        self.consensus_tree = None
+        self.listener_df = None
+        self.cluster_summary = None
+
+    def run_analysis(self):
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor
+        from scipy.cluster.hierarchy import linkage, fcluster
+        from scipy.spatial.distance import squareform
+
+        print("--- [Moduł Stability] Bootstrap blokowy profili ---")
+
+        clustering = self.clustering
+        if clustering is None or clustering.cluster_labels is None:
+            print("   (!) Brak wyników klasteryzacji - pomijam.")
+            return None
+
+        valid_cols = clustering.valid_cols
+        reference = np.asarray(clustering.cluster_labels)
+        n_clusters = len(np.unique(reference))
+        n_signals = len(valid_cols)
+
+        n_boot = self.cfg.get("STABILITY_BOOTSTRAP", 200)
+        shifts = max(1, self.cfg.get("STABILITY_BLOCK_SHIFTS", 4))
+        block_len = self.parent.seconds_to_samples(
+            self.cfg.get("STABILITY_BLOCK_SEC", 10.0)
+        )
+        sub_block_len = max(1, block_len // shifts)
+
+        workers = self.cfg.get("STABILITY_WORKERS") or min(
+            os.cpu_count() or 1, STABILITY_MAX_WORKERS
+        )
+        values = self.parent.df_pivot[valid_cols].to_numpy(dtype=float)
+
+        counts = np.zeros((n_signals, n_signals), dtype=np.uint32)
+
+        def accumulate(labels):
+            for row in labels:
+                counts[:] += row[:, None] == row[None, :]
+
+        # Przy wielu procesach iloczyny krzyżowe bloków (bloki × N × N) trafiają
+        # do pliku tymczasowego - jedna kopia na dysku / w page cache, procesy
+        # robocze otwierają ją jako memmap zamiast dostawać tensor w pickle
+        with tempfile.TemporaryDirectory(prefix="stability_") as work_dir:
+            path = None if workers == 1 else os.path.join(work_dir, "cross.npy")
+            moments = BlockRankMoments(values, sub_block_len, path=path)
+            blocks_per_draw = min(shifts, len(moments))
+            n_draws = math.ceil(len(values) / (blocks_per_draw * sub_block_len))
+            print(
+                f"   {n_boot} replikacji, blok {block_len} próbek "
+                f"({len(moments)} pod-bloków, {moments.cross.nbytes / 1024**2:.0f} MB "
+                f"momentów), {n_signals} sygnałów, k={n_clusters}, "
+                f"procesy: {workers}"
+            )
+
+            # Ziarna w porcjach - wynik porcji to tylko etykiety (N na replikację)
+            seed_seq = np.random.SeedSequence(self.cfg.get("STABILITY_SEED", 0))
+            seeds = [s.generate_state(1)[0] for s in seed_seq.spawn(n_boot)]
+            chunk = max(1, math.ceil(n_boot / (4 * workers)))
+            batches = [seeds[i : i + chunk] for i in range(0, n_boot, chunk)]
+            init_args = (moments, n_draws, blocks_per_draw, n_clusters)
+
+            if workers == 1:
+                _init_worker(*init_args)
+                for batch in batches:
+                    accumulate(_run_replicates(batch))
+                _WORKER_STATE.clear()
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=workers, initializer=_init_worker, initargs=init_args
+                ) as pool:
+                    for labels in pool.map(_run_replicates, batches):
+                        accumulate(labels)
+            del moments
+
+        self.coassignment = counts / float(n_boot)
+
+        # Stabilność słuchacza: średnie współprzypisanie z członkami jego klastra
+        same = reference[:, None] == reference[None, :]
+        np.fill_diagonal(same, False)
+        n_peers = same.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stability = (self.coassignment * same).sum(axis=1) / n_peers
+
+        # Klasteryzacja konsensusowa na dystansie 1 - współprzypisanie
+        consensus_dist = 1.0 - self.coassignment
+        np.fill_diagonal(consensus_dist, 0.0)
+        self.consensus_tree = linkage(
+            squareform(consensus_dist, checks=False), method="average"
+        )
+        consensus = fcluster(self.consensus_tree, t=n_clusters, criterion="maxclust")
+
+        labels = [self.parent.get_record_label(rid) for rid in valid_cols]
+        self.listener_df = pd.DataFrame(
+            {
+                "record_id": labels,
+                "cluster_id": reference,
+                "stability": stability,
+                "consensus_cluster": consensus,
+            }
+        ).sort_values(by=["cluster_id", "record_id"])
+
+        self.cluster_summary = self.listener_df.groupby("cluster_id").agg(
+            n_members=("record_id", "size"),
+            stability=("stability", "mean"),
+            stability_min=("stability", "min"),
+        )
+
+        for cid, row in self.cluster_summary.iterrows():
+            print(
+                f"   -> Klaster {cid}: n={int(row['n_members'])}, "
+                f"stabilność={row['stability']:.2f} (min {row['stability_min']:.2f})"
+            )
+        return self.listener_df
+
+    def export_results(self):
+        if self.listener_df is None:
+            return
+
+        listeners_path = self.parent.get_output_path(
+            base_name="cluster_stability_listeners", prefix="04_", extension=".csv"
+        )
+        self.listener_df.to_csv(listeners_path, index=False)
+        print(f"   -> Stabilność słuchaczy zapisana: {listeners_path}")
+
+        summary_path = self.parent.get_output_path(
+            base_name="cluster_stability_summary", prefix="04_", extension=".csv"
+        )
+        self.cluster_summary.to_csv(summary_path)
+        print(f"   -> Stabilność klastrów zapisana: {summary_path}")
+
+        labels = [
+            self.parent.get_record_label(rid) for rid in self.clustering.valid_cols
+        ]
+        export_matrix(
+            self.parent,
+            pd.DataFrame(self.coassignment, index=labels, columns=labels),
+            base_name="cluster_coassignment",
+            prefix="04_",
+        )
+
+    def export_graph(self):
+        """Heatmapa współprzypisania (kolejność klasteryzacji konsensusowej)."""
+        if self.coassignment is None:
+            print("   (!) Brak danych stabilności do wykresu.")
+            return
+
+        from plotting import render_similarity_heatmap
+
+        print("   Generowanie heatmapy współprzypisania...")
+
+        try:
+            labels = [
+                self.parent.get_record_label(rid) for rid in self.clustering.valid_cols
+            ]
+            img_path = self.parent.get_output_path(
+                base_name="cluster_coassignment_visual", prefix="04_", extension=".png"
+            )
+            render_similarity_heatmap(
+                pd.DataFrame(self.coassignment, index=labels, columns=labels),
+                self.consensus_tree,
+                img_path,
+                title=f"Współprzypisanie (bootstrap): {self.cfg.get('NAME', '')}",
+                cfg=self.cfg,
+                value_label="Odsetek replikacji we wspólnym klastrze",
+                value_range=(0, 1),
+            )
+            print(f"   -> Heatmapa współprzypisania zapisana: {img_path}")
+
+        except Exception as e:
+            print(f"   (!) Błąd wykresu stabilności: {e}")
@@ -0,0 +1,380 @@
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+# Parametry siatki wrażliwości (SWEEP_GRID) - pozostałe klucze są ignorowane.
+# Wartości spoza siatki brane z konfiguracji projektu.
+SWEEP_PARAMETERS = (
+    "WINDOW_SECONDS",
+    "GRANGER_MAX_LAG_SEC",
+    "GRANGER_P_VALUE_THRESHOLD",
+    "CLUSTER_THRESHOLD_RATIO",
+)
+SWEEP_DEFAULTS = {"CLUSTER_THRESHOLD_RATIO": 0.7}
+
+# Słuchacze w jednym zadaniu puli (Granger i Rolling Spearman)
+SWEEP_BATCH = 8
+
+# Domyślna liczba procesów roboczych: liczba CPU, ale nie więcej niż tyle
+SWEEP_MAX_WORKERS = 4
+
+# Stan procesów roboczych (ustawiany raz przez initializer puli)
+_WORKER_STATE = {}
+
+
+def _init_worker(diff, pivot, columns, references):
+    """
+    diff, pivot: macierze (T × N) lub ścieżki plików .npy - procesy robocze
+    otwierają wspólny memmap zamiast dostawać kopię danych w pickle.
+    """
+    if isinstance(diff, str):
+        diff, pivot = np.load(diff, mmap_mode="r"), np.load(pivot, mmap_mode="r")
+    _WORKER_STATE.update(
+        diff=diff,
+        pivot=pivot,
+        column_of={rid: i for i, rid in enumerate(columns)},
+        references=references,
+    )
+
+
+def _column(name, rid):
+    """Kolumna nagrania z macierzy procesu roboczego (kopia float64)."""
+    matrix = _WORKER_STATE[name]
+    return np.asarray(matrix[:, _WORKER_STATE["column_of"][rid]], dtype=float)
+
+
+def _shared_matrix(frame, path):
+    """Zapisuje ramkę do .npy (kolumnami) i zwraca ścieżkę dla procesów."""
+    out = np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.float64, shape=frame.shape, fortran_order=True
+    )
+    out[:] = frame.to_numpy(dtype=float)
+    out.flush()
+    del out
+    return path
+
+
+def _granger_tables(task):
+    """
+    Pełna tablica testów Grangera (lagi 1..maxlag) dla porcji słuchaczy.
+
+    Returns:
+        dict: słuchacz -> (F, p) - tablice (referencje × maxlag), NaN dla
+        sygnałów płaskich i błędów
+    """
+    from granger import GrangerEngine
+
+    listeners, maxlag = task
+    references = {ref: _column("diff", ref) for ref in _WORKER_STATE["references"]}
+
+    tables = {}
+    for listener in listeners:
+        f_stat = np.full((len(references), maxlag), np.nan)
+        p_value = np.full((len(references), maxlag), np.nan)
+        series = _column("diff", listener)
+        if np.std(series, ddof=1) >= 1e-6:
+            engine = GrangerEngine(series)
+            try:
+                for lag in range(1, maxlag + 1):
+                    results = engine.test(lag, references)
+                    for i, (f, p, _) in enumerate(results.values()):
+                        f_stat[i, lag - 1], p_value[i, lag - 1] = f, p
+            except Exception:
+                f_stat[:], p_value[:] = np.nan, np.nan
+        tables[listener] = (f_stat, p_value)
+    return tables
+
+
+def _coherence_sums(task):
+    """
+    Rolling Spearman dla par (referencja, słuchacz, lag) przy jednym oknie.
+    Kilka lagów tego samego słuchacza trafia do kolejnych warstw - rangi okien
+    słuchacza liczone raz i wspólne dla wszystkich jego par.
+
+    Returns:
+        tuple: (okno, dict para -> (suma rho, liczba okien))
+    """
+    from narrative import rolling_spearman
+
+    window_size, pairs = task
+
+    layers = {}  # (referencja, warstwa) -> {słuchacz: lag}
+    for ref, listener, lag in pairs:
+        layer = 0
+        while listener in layers.get((ref, layer), {}):
+            layer += 1
+        layers.setdefault((ref, layer), {})[listener] = lag
+
+    series = {key: _column("pivot", key[0]) for key in layers}
+    series.update(
+        {rid: _column("pivot", rid) for lags in layers.values() for rid in lags}
+    )
+    trajectories = rolling_spearman(series, layers, window_size, progress=False)
+
+    sums = {}
+    for key, lags in layers.items():
+        values = trajectories[key]
+        counts = (~np.isnan(values)).sum(axis=0)
+        totals = np.nansum(values, axis=0)
+        for j, (listener, lag) in enumerate(lags.items()):
+            sums[key[0], listener, lag] = (totals[j], int(counts[j]))
+    return window_size, sums
+
+
+class SweepModule:
+    def __init__(self, analyzer_instance, clustering_module=None):
+        """
+        Analiza wrażliwości na parametry (SWEEP_GRID) z ponownym użyciem
+        kosztownych etapów pośrednich:
+        - preprocessing - raz na projekt (wspólny analizator),
+        - Granger - pełna tablica F/p do największego lagu siatki; próg p
+          i maksymalny lag to tylko ponowne filtrowanie tablicy,
+        - klasteryzacja - macierz Spearmana i linkage z ClusteringModule
+          (etap clustering); próg to tylko fcluster,
+        - Narrative - rangi okien słuchacza raz na długość okna, wspólne dla
+          wszystkich lagów i referencji wymaganych przez punkty siatki.
+
+        Zadania (porcje słuchaczy, okno × porcja) w puli procesów
+        (SWEEP_WORKERS); wynik - jedna tabela (punkt siatki × referencja).
+        """
+        self.parent = analyzer_instance
+        self.cfg = analyzer_instance.cfg
+        self.clustering = clustering_module
+        self.results_df = None
+
+    def _grid(self):
+        """Lista punktów siatki (dict parametr -> wartość)."""
+        grid = dict(self.cfg.get("SWEEP_GRID") or {})
+        unknown = [key for key in grid if key not in SWEEP_PARAMETERS]
+        if unknown:
+            print(f"   (!) Pomijam nieobsługiwane parametry siatki: {unknown}")
+
+        values = []
+        for key in SWEEP_PARAMETERS:
+            default = self.cfg.get(key, SWEEP_DEFAULTS.get(key))
+            options = grid.get(key, [default])
+            values.append(options if isinstance(options, list) else [options])
+        return [
+            dict(zip(SWEEP_PARAMETERS, point)) for point in itertools.product(*values)
+        ]
+
+    def run_analysis(self):
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor
+
+        print("--- [Moduł Sweep] Wrażliwość na parametry ---")
+
+        if not self.cfg.get("SWEEP_GRID"):
+            print("   (!) Brak SWEEP_GRID. Pomijam.")
+            return None
+
+        df_diff = self.parent.df_diff
+        references = [
+            ref for ref in self.parent.get_reference_ids() if ref in df_diff.columns
+        ]
+        if not references:
+            print("   (!) Brak referencji w danych. Pomijam.")
+            return None
+        listeners = [c for c in df_diff.columns if c not in references]
+
+        grid = self._grid()
+        maxlag = max(
+            self.parent.seconds_to_samples(p["GRANGER_MAX_LAG_SEC"]) for p in grid
+        )
+        workers = self.cfg.get("SWEEP_WORKERS") or min(
+            os.cpu_count() or 1, SWEEP_MAX_WORKERS
+        )
+        print(
+            f"   Punktów siatki: {len(grid)}, słuchaczy: {len(listeners)}, "
+            f"referencje: {len(references)}, max lag: {maxlag}, procesy: {workers}"
+        )
+
+        batches = [
+            listeners[i : i + SWEEP_BATCH]
+            for i in range(0, len(listeners), SWEEP_BATCH)
+        ]
+
+        # Dane dla procesów: jeden plik .npy na macierz (memmap), nie pickle
+        columns = list(df_diff.columns)
+        pivot_frame = self.parent.df_pivot[columns]
+        work_dir = None
+        if workers == 1:
+            _init_worker(
+                df_diff.to_numpy(dtype=float),
+                pivot_frame.to_numpy(dtype=float),
+                columns,
+                references,
+            )
+            pool = None
+            run = map
+        else:
+            work_dir = tempfile.TemporaryDirectory(prefix="sweep_")
+            init_args = (
+                _shared_matrix(df_diff, os.path.join(work_dir.name, "diff.npy")),
+                _shared_matrix(pivot_frame, os.path.join(work_dir.name, "pivot.npy")),
+                columns,
+                references,
+            )
+            pool = ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=init_args
+            )
+            run = pool.map
+
+        try:
+            # 1. Granger: pełna tablica F/p (słuchacze × referencje × lagi)
+            tables = {}
+            for part in run(_granger_tables, [(batch, maxlag) for batch in batches]):
+                tables.update(part)
+            f_stat = np.stack([tables[rid][0] for rid in listeners])
+            p_value = np.stack([tables[rid][1] for rid in listeners])
+            print(f"   -> Tablica Grangera: {len(listeners)} × {maxlag} lagów")
+
+            # 2. Wybór lagów dla każdej pary (max lag, próg) - filtrowanie
+            selections = {}
+            for point in grid:
+                key = (point["GRANGER_MAX_LAG_SEC"], point["GRANGER_P_VALUE_THRESHOLD"])
+                if key not in selections:
+                    selections[key] = self._select_lags(f_stat, p_value, *key)
+
+            # 3. Narrative: pary wymagane przez punkty siatki, zadania okno × porcja
+            pairs_by_window = {}
+            for point in grid:
+                window = self.parent.seconds_to_samples(point["WINDOW_SECONDS"])
+                key = (point["GRANGER_MAX_LAG_SEC"], point["GRANGER_P_VALUE_THRESHOLD"])
+                pairs = pairs_by_window.setdefault(window, set())
+                for r, ref in enumerate(references):
+                    lags = selections[key][r]
+                    pairs.update(
+                        (ref, listeners[i], int(lag))
+                        for i, lag in enumerate(lags)
+                        if lag
+                    )
+
+            tasks = []
+            for window, pairs in pairs_by_window.items():
+                for batch in batches:
+                    members = set(batch)
+                    batch_pairs = sorted(p for p in pairs if p[1] in members)
+                    if batch_pairs and window >= 3:
+                        tasks.append((window, batch_pairs))
+
+            coherence = {}
+            for window, sums in run(_coherence_sums, tasks):
+                for pair, value in sums.items():
+                    coherence[window, pair] = value
+            print(f"   -> Rolling Spearman: {len(coherence)} par (okno, słuchacz, lag)")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            _WORKER_STATE.clear()
+            if work_dir is not None:
+                work_dir.cleanup()
+
+        # 4. Klasteryzacja: linkage raz, próg per punkt siatki
+        clusters = self._cluster_cuts({p["CLUSTER_THRESHOLD_RATIO"] for p in grid})
+
+        # 5. Tabela wyników
+        rate = self.parent.get_analysis_rate()
+        rows = []
+        for point in grid:
+            window = self.parent.seconds_to_samples(point["WINDOW_SECONDS"])
+            key = (point["GRANGER_MAX_LAG_SEC"], point["GRANGER_P_VALUE_THRESHOLD"])
+            cut = clusters.get(point["CLUSTER_THRESHOLD_RATIO"], {})
+            for r, ref in enumerate(references):
+                lags = selections[key][r]
+                causal = np.flatnonzero(lags)
+                totals = [
+                    coherence.get((window, (ref, listeners[i], int(lags[i]))), (0.0, 0))
+                    for i in causal
+                ]
+                n_windows = sum(count for _, count in totals)
+                rows.append(
+                    {
+                        **point,
+                        "reference": self.parent.get_record_label(ref),
+                        "n_listeners": len(listeners),
+                        "n_causal": len(causal),
+                        "share_causal": len(causal) / max(1, len(listeners)),
+                        "median_lag_sec": (
+                            np.median(lags[causal]) / rate if len(causal) else np.nan
+                        ),
+                        "narrative_rho": (
+                            sum(total for total, _ in totals) / n_windows
+                            if n_windows
+                            else np.nan
+                        ),
+                        "n_clusters": cut.get("n_clusters", np.nan),
+                        "silhouette": cut.get("silhouette", np.nan),
+                        "reference_cluster_size": cut.get("sizes", {}).get(ref, np.nan),
+                    }
+                )
+
+        self.results_df = pd.DataFrame(rows)
+        print(f"   -> Zakończono: {len(self.results_df)} wierszy wyników.")
+        return self.results_df
+
+    def _select_lags(self, f_stat, p_value, max_lag_sec, p_threshold):
+        """
+        Najlepszy lag (najwyższe F wśród istotnych, jak GrangerModule) dla
+        wszystkich słuchaczy i referencji z gotowej tablicy.
+
+        Returns:
+            numpy array (referencje × słuchacze) - lag w próbkach, 0 = brak
+        """
+        maxlag = self.parent.seconds_to_samples(max_lag_sec)
+        with np.errstate(invalid="ignore"):
+            significant = p_value[:, :, :maxlag] < p_threshold
+        scores = np.where(significant, f_stat[:, :, :maxlag], -np.inf)
+        best = scores.argmax(axis=2) + 1
+        best[~significant.any(axis=2)] = 0
+        return best.T
+
+    def _cluster_cuts(self, ratios):
+        """
+        Liczba klastrów, sylwetka i klastry referencji dla progów ratio × max
+        z macierzy Spearmana i linkage modułu Clustering (bez ponownego liczenia).
+        """
+        from scipy.cluster.hierarchy import fcluster
+        from cluster_stats import silhouette_scores
+
+        clustering = self.clustering
+        if clustering is None or clustering.linkage_matrix is None:
+            print("   (!) Brak wyników klasteryzacji - pomijam progi podziału.")
+            return {}
+
+        distance = np.clip(1 - clustering.similarity_matrix.to_numpy(dtype=float), 0, 2)
+        np.fill_diagonal(distance, 0.0)
+        top = clustering.linkage_matrix[:, 2].max()
+
+        cuts = {}
+        for ratio in ratios:
+            labels = fcluster(
+                clustering.linkage_matrix, t=ratio * top, criterion="distance"
+            )
+            n_clusters = len(np.unique(labels))
+            cuts[ratio] = {
+                "n_clusters": n_clusters,
+                "silhouette": (
+                    silhouette_scores(distance, labels).mean()
+                    if 1 < n_clusters < len(labels)
+                    else np.nan
+                ),
+                "sizes": {
+                    ref: int((labels == labels[clustering.valid_cols.index(ref)]).sum())
+                    for ref in clustering.reference_clusters
+                },
+            }
+        return cuts
+
+    def export_results(self):
+        """Zapisuje tabelę wrażliwości (punkt siatki × referencja)."""
+        if self.results_df is None or self.results_df.empty:
+            return
+
+        file_path = self.parent.get_output_path(
+            base_name="sensitivity_sweep", prefix="06_", extension=".csv"
+        )
+        self.results_df.to_csv(file_path, index=False)
+        print(f"   -> Wyniki zapisano: {file_path}")
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+from cluster_stats import (
+    ClusterStatistics,
+    dunn_index,
+    silhouette_scores,
+    sweep_thresholds,
+)
+from scipy import stats
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import pdist, squareform
+
+
+def _clustered(seed=0, n_time=80, labels=(1, 2, 1, 3, 2, 1, 2)):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(
+        rng.normal(size=(n_time, len(labels))),
+        columns=[f"u{i}" for i in range(len(labels))],
+    )
+    data.iloc[5:9, 0] = np.nan
+    return data, np.array(labels)
+
+
+def test_bands_match_groupby_over_members():
+    data, labels = _clustered()
+
+    result = ClusterStatistics(data, labels, confidence=0.9)
+
+    np.testing.assert_array_equal(result.counts, [3, 3, 1])
+    for cid in (1, 2, 3):
+        members = data.loc[:, labels == cid]
+        n = members.notna().sum(axis=1)
+        mean, std = members.mean(axis=1), members.std(axis=1)
+        np.testing.assert_allclose(result.mean[cid], mean, atol=1e-12)
+        np.testing.assert_allclose(result.std[cid], std, atol=1e-12)
+        half = stats.t.ppf(0.95, n - 1) * std / np.sqrt(n)
+        np.testing.assert_allclose(result.ci_high[cid], mean + half, atol=1e-12)
+
+    bands = result.bands()
+    assert list(bands.columns[:4]) == [
+        "Profile_1_Mean",
+        "Profile_1_Std",
+        "Profile_1_CI_Low",
+        "Profile_1_CI_High",
+    ]
+
+
+def test_coherence_is_mean_pairwise_similarity():
+    data, labels = _clustered(seed=1)
+    similarity = data.corr(method="spearman").to_numpy()
+
+    result = ClusterStatistics(data, labels, similarity=similarity)
+
+    for k, cid in enumerate(result.cluster_ids):
+        idx = np.flatnonzero(labels == cid)
+        pairs = [similarity[i, j] for i in idx for j in idx if i != j]
+        expected = np.mean(pairs) if pairs else np.nan
+        assert result.coherence[k] == pytest.approx(expected, nan_ok=True)
+    between = similarity[np.ix_(labels == 1, labels == 2)].mean()
+    assert result.between.loc[1, 2] == pytest.approx(between)
+
+    summary = result.summary(composer_cluster=2)
+    assert summary["contains_composer"].tolist() == [False, True, False]
+
+
+def _blobs(seed=2, sizes=(5, 4, 6)):
+    rng = np.random.default_rng(seed)
+    centres = np.array([[0.0, 0.0], [10.0, 0.0], [0.0, 10.0]])
+    points = np.vstack([c + rng.normal(size=(n, 2)) for c, n in zip(centres, sizes)])
+    labels = np.repeat([1, 2, 3], sizes)
+    return squareform(pdist(points)), labels
+
+
+def test_silhouette_and_dunn_match_definitions():
+    distance, labels = _blobs()
+    labels = labels.copy()
+    labels[-1] = 4  # Singleton: sylwetka 0
+
+    scores = silhouette_scores(distance, labels)
+
+    for i in range(len(labels)):
+        own = (labels == labels[i]) & (np.arange(len(labels)) != i)
+        if not own.any():
+            assert scores[i] == 0.0
+            continue
+        a = distance[i, own].mean()
+        b = min(
+            distance[i, labels == other].mean()
+            for other in np.unique(labels)
+            if other != labels[i]
+        )
+        assert scores[i] == pytest.approx((b - a) / max(a, b))
+
+    same = labels[:, None] == labels[None, :]
+    expected = distance[~same].min() / distance[same].max()
+    assert dunn_index(distance, labels) == pytest.approx(expected)
+
+
+def test_sweep_thresholds_prefers_true_partition():
+    distance, labels = _blobs()
+    linkage_matrix = linkage(squareform(distance), method="average")
+
+    sweep = sweep_thresholds(linkage_matrix, distance, max_clusters=8)
+
+    assert sweep["threshold"].is_monotonic_increasing
+    assert set(sweep["n_clusters"]) == set(range(2, 9))
+    for criterion in ("silhouette", "dunn"):
+        best = sweep.loc[sweep[criterion].idxmax()]
+        assert best["n_clusters"] == 3
+        found = fcluster(linkage_matrix, t=best["threshold"], criterion="distance")
+        assert len(set(zip(found, labels))) == 3
+
+
+def test_summary_lists_references_per_cluster():
+    data, labels = _clustered()
+
+    summary = ClusterStatistics(data, labels).summary(
+        composer_cluster=1, references={"comp": 1, "rec2": 1, "rec3": 3}
+    )
+
+    assert summary["references"].tolist() == ["comp,rec2", "", "rec3"]
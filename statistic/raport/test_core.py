@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+import pytest
+from core import MusicalMetaAnalyzer
+
+
+def _tones(rate=20, seconds=30, frequencies=(0.2, 8.0)):
+    t = np.arange(int(rate * seconds)) / rate
+    index = pd.Index(1765194266519.0 + t * 1000, name="timestamp")
+    return pd.DataFrame(
+        {f"f{f:g}": np.sin(2 * np.pi * f * t) for f in frequencies}, index=index
+    )
+
+
+def test_decimate_keeps_slow_signal_and_suppresses_aliasing():
+    df = _tones()
+    analyzer = MusicalMetaAnalyzer({"SAMPLING_RATE_HZ": 20, "ANALYSIS_RATE_HZ": 10})
+
+    result = analyzer._decimate(df)
+
+    assert len(result) == len(df) // 2
+    np.testing.assert_array_equal(result.index, df.index[::2])
+    # 0.2 Hz poniżej nowej częstotliwości Nyquista - bez zmian (poza brzegami)
+    inner = slice(20, -20)
+    np.testing.assert_allclose(
+        result["f0.2"].to_numpy()[inner], df["f0.2"].to_numpy()[::2][inner], atol=0.02
+    )
+    # 8 Hz powyżej 5 Hz: zwykłe co-drugie próbkowanie daje alias o pełnej
+    # amplitudzie, filtr antyaliasingowy go tłumi
+    assert np.abs(df["f8"].to_numpy()[::2]).max() > 0.9
+    assert np.abs(result["f8"].to_numpy()[inner]).max() < 0.05
+
+
+def test_analysis_rate_is_clamped_without_changing_config(
+    make_analyzer, response_frame, capsys
+):
+    analyzer = make_analyzer(response_frame(seconds=20), ANALYSIS_RATE_HZ=50)
+
+    assert analyzer.get_analysis_rate() == 20
+    assert analyzer.cfg["ANALYSIS_RATE_HZ"] == 50
+    assert len(analyzer.df_pivot) == 400
+    assert capsys.readouterr().out.count("ANALYSIS_RATE_HZ=50") == 1
+
+
+def test_pipeline_decimates_to_analysis_rate(make_analyzer, response_frame):
+    analyzer = make_analyzer(response_frame(seconds=20), ANALYSIS_RATE_HZ=10)
+
+    assert len(analyzer.df_pivot) == 200
+    assert analyzer.seconds_to_samples(1.5) == 15
+    np.testing.assert_allclose(np.diff(analyzer.df_pivot.index), 100.0)
+
+
+def _quality_frame(response_frame):
+    """u1 i kompozytor stoją w miejscu, u3 ma 15 s przerwy."""
+    df = response_frame(seconds=30)
+    seconds = (df["timestamp"] - df["timestamp"].min()) / 1000.0
+    df.loc[df["record_id"].isin(["u1", "comp"]), "value"] = 40.0
+    return df[~((df["record_id"] == "u3") & (seconds > 5) & (seconds < 20))]
+
+
+def test_assess_quality_matches_per_record_loop(make_analyzer, response_frame):
+    df = _quality_frame(response_frame)
+    analyzer = make_analyzer(df, QUALITY_MAX_INTERPOLATED=0.4)
+
+    quality = analyzer.quality_df
+    for record, part in df.sort_values("timestamp").groupby("record_id"):
+        seconds = part["timestamp"].to_numpy() / 1000.0
+        dt = np.diff(seconds)
+        span = seconds[-1] - seconds[0]
+        row = quality.loc[record]
+        assert row["n_samples"] == len(part)
+        assert row["effective_rate_hz"] == pytest.approx((len(part) - 1) / span)
+        assert row["max_gap_sec"] == pytest.approx(dt.max())
+        assert row["n_gaps"] == (dt > 2.0).sum()
+        unchanged = np.diff(part["value"].to_numpy()) == 0
+        assert row["stuck_fraction"] == pytest.approx(dt[unchanged].sum() / span)
+        assert row["range_usage"] == pytest.approx(np.ptp(part["value"]) / 100)
+
+    assert quality.loc["u3", "interpolated_fraction"] == pytest.approx(0.5, abs=0.01)
+    assert quality.loc["u1", "reasons"] == "stuck,range"
+    assert quality.loc["u3", "reasons"] == "interpolated"
+    assert not quality.loc["comp", "usable"]
+    # Kompozytor zostaje mimo niespełnienia progów
+    assert sorted(analyzer.excluded_records) == ["u1", "u3"]
+    assert list(analyzer.df_pivot.columns) == ["comp", "u0", "u2", "u4", "u5"]
+
+    report = pd.read_csv(analyzer.get_output_path("data_quality", prefix="00_"))
+    assert report.set_index("record_id")["excluded"].sum() == 2
+
+
+def test_quality_drop_disabled_keeps_records(make_analyzer, response_frame):
+    analyzer = make_analyzer(
+        _quality_frame(response_frame), QUALITY_MAX_INTERPOLATED=0.4, QUALITY_DROP=False
+    )
+
+    assert analyzer.excluded_records == []
+    assert analyzer.df_pivot.shape[1] == 7
+    assert (~analyzer.quality_df["usable"]).sum() == 3
+
+
+def _with_missing(df):
+    """u0 zaczyna się później, u2 ma dziurę w środku (interpolacja i brzegi)."""
+    seconds = (df["timestamp"] - df["timestamp"].min()) / 1000.0
+    late = (df["record_id"] == "u0") & (seconds < 2)
+    hole = (df["record_id"] == "u2") & (seconds > 8) & (seconds < 9)
+    return df[~(late | hole)]
+
+
+@pytest.mark.parametrize("analysis_rate", [None, 10])
+def test_low_memory_matches_float64_pipeline(
+    make_analyzer, response_frame, analysis_rate
+):
+    df = _with_missing(response_frame(seconds=20))
+    reference = make_analyzer(df, ANALYSIS_RATE_HZ=analysis_rate)
+    low = make_analyzer(
+        df, csv_name="low.csv", LOW_MEMORY=True, ANALYSIS_RATE_HZ=analysis_rate
+    )
+
+    values = low.df_pivot.to_numpy()
+    assert values.dtype == np.float32 and values.flags.f_contiguous
+    assert low._df_raw is None  # Odtwarzane z Z-Score przy użyciu
+    pd.testing.assert_index_equal(low.df_pivot.columns, reference.df_pivot.columns)
+    np.testing.assert_allclose(low.df_pivot.index, reference.df_pivot.index)
+    for name in ("df_pivot", "df_diff"):
+        np.testing.assert_allclose(
+            getattr(low, name), getattr(reference, name), atol=2e-5
+        )
+    np.testing.assert_allclose(low.df_raw, reference.df_raw, atol=1e-3)
+
+
+def test_out_of_core_matches_in_memory(make_analyzer, response_frame, tmp_path):
+    # Wiersze przemieszane, dwie porcje CSV, bloki po jednej kolumnie
+    df = _with_missing(response_frame(seconds=120)).sample(frac=1, random_state=0)
+    reference = make_analyzer(df)
+    out = make_analyzer(
+        df,
+        csv_name="ooc.csv",
+        OUT_OF_CORE=True,
+        MEMORY_BUDGET_MB=1e-4,
+        OUT_OF_CORE_DIR=str(tmp_path / "mm"),
+    )
+
+    assert (tmp_path / "mm" / "pivot.npy").exists()
+    assert not (tmp_path / "mm" / "scatter_sums.npy").exists()
+    pd.testing.assert_index_equal(out.df_pivot.columns, reference.df_pivot.columns)
+    np.testing.assert_allclose(out.df_pivot.index, reference.df_pivot.index)
+    for name in ("df_pivot", "df_diff"):
+        np.testing.assert_allclose(
+            getattr(out, name), getattr(reference, name), atol=2e-5
+        )
+    np.testing.assert_allclose(out.zscore_std, reference.zscore_std, rtol=1e-5)
+
+    columns = ["n_samples", "effective_rate_hz", "range_usage", "usable"]
+    pd.testing.assert_frame_equal(
+        out.quality_df[columns], reference.quality_df[columns], check_dtype=False
+    )
@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pytest
+from epochs import EpochModule, baseline_correct, extract_epochs, reaction_latencies
+
+
+def test_extract_epochs_is_a_view_indexed_lazily():
+    values = np.arange(200, dtype=float).reshape(50, 4)
+    onsets = np.array([5, 17, 30])
+
+    windows, index = extract_epochs(values, onsets, pre=3, post=7)
+
+    assert np.shares_memory(windows, values)
+    assert not windows.flags.writeable
+    assert windows.shape == (41, 4, 10)
+    for e, onset in enumerate(onsets):
+        np.testing.assert_array_equal(
+            windows[index[e]], values[onset - 3 : onset + 7].T
+        )
+
+    corrected = baseline_correct(windows, 3, index)
+    expected = baseline_correct(np.stack([windows[i] for i in index]), 3)
+    np.testing.assert_array_equal(corrected, expected)
+    np.testing.assert_allclose(corrected[..., :3].mean(axis=-1), 0.0, atol=1e-12)
+    np.testing.assert_array_equal(values, np.arange(200).reshape(50, 4))
+
+
+def test_reaction_latencies_find_first_crossing_and_peak():
+    pre, post = 4, 12
+    epochs = np.zeros((2, 3, pre + post))
+    epochs[0, 0, pre + 3 :] = 1.0  # Skok o 1 po 3 próbkach
+    epochs[0, 1, pre + 5 :] = -2.0  # Spadek po 5 próbkach
+    epochs[1, 2, pre + 1] = 0.3  # Poniżej progu - brak reakcji
+    epochs += 7.0  # Stały poziom usuwany przez korektę linii bazowej
+
+    latency, peak = reaction_latencies(baseline_correct(epochs, pre), pre, 0.5)
+
+    assert latency[0, 0] == 3 and latency[0, 1] == 5
+    assert np.isnan(latency[1]).all() and np.isnan(latency[0, 2])
+    np.testing.assert_allclose(peak[0, :2], [1.0, -2.0])
+    assert peak[1, 2] == pytest.approx(0.3)
+
+
+def test_module_aligns_device_manager_events(make_analyzer, response_frame, tmp_path):
+    df = response_frame(seconds=30)
+    t0 = df["timestamp"].min()
+    events = [
+        {"eventType": "START", "label": "A", "payload": {"timestamp": t0 + 5000}},
+        {"eventType": "BREAK", "label": "B", "payload": {"timestamp": t0 + 12345}},
+        {"eventType": "EARLY", "label": "C", "payload": {"timestamp": t0 + 500}},
+        {"eventType": "NOTIME", "label": "D", "payload": {}},
+    ]
+    events_path = tmp_path / "events.json"
+    events_path.write_text(json.dumps(events), encoding="utf-8")
+    analyzer = make_analyzer(df, EPOCH_EVENTS_FILE=str(events_path))
+
+    module = EpochModule(analyzer)
+    module.run_analysis()
+
+    # C za blisko początku nagrania, D bez czasu
+    assert module.events["label"].tolist() == ["A", "B"]
+    listeners = [c for c in analyzer.df_pivot.columns if c != "comp"]
+    assert module.latencies.shape[0] == 2 * len(listeners)
+    timestamps = analyzer.df_pivot.index.to_numpy()
+    values = analyzer.df_pivot[listeners].to_numpy()
+    epochs = []
+    for t in (t0 + 5000, t0 + 12345):
+        onset = np.searchsorted(timestamps, t)
+        epochs.append(values[onset - 40 : onset + 160].T)
+    expected = baseline_correct(np.stack(epochs), 40)
+    np.testing.assert_allclose(module.average.to_numpy(), expected.mean(axis=0).T)
+    assert (
+        module.latencies["event_time"].iloc[-1]
+        == timestamps[np.searchsorted(timestamps, t0 + 12345)]
+    )
@@ -0,0 +1,89 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from export import export_cube, export_matrix, read_matrix
+
+
+class _Analyzer:
+    """Minimalny odpowiednik MusicalMetaAnalyzer: konfiguracja i ścieżki wyników."""
+
+    def __init__(self, directory, **cfg):
+        self.directory = directory
+        self.cfg = cfg
+
+    def get_output_path(self, base_name, prefix="", extension=".csv"):
+        return os.path.join(self.directory, f"{prefix}{base_name}{extension}")
+
+
+def _matrix():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(120, 5)) * 10.0 ** rng.integers(-6, 6, size=5)
+    values[:10, 1] = np.nan
+    index = pd.Index(1765194266519 + np.arange(120) * 33.333333333, name="timestamp")
+    return pd.DataFrame(values, index=index, columns=[f"u{i}" for i in range(5)])
+
+
+def test_csv_roundtrip_is_exact(tmp_path):
+    df = _matrix()
+    (path,) = export_matrix(_Analyzer(str(tmp_path)), df, "m", prefix="01_")
+
+    restored = read_matrix(path)
+
+    np.testing.assert_array_equal(restored.to_numpy(), df.to_numpy())
+    np.testing.assert_array_equal(restored.index.to_numpy(), df.index.to_numpy())
+    assert list(restored.columns) == list(df.columns)
+
+
+def test_csv_nan_is_empty_field_and_labels_untouched(tmp_path):
+    labels = ["nan", 'a,"b"', "c"]
+    df = pd.DataFrame(
+        [[1.0, np.nan, 0.5], [np.nan, 1.0, np.nan], [0.25, 2.0, 1.0]],
+        index=labels,
+        columns=labels,
+    )
+    (path,) = export_matrix(_Analyzer(str(tmp_path)), df, "s", index=True)
+
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+
+    assert lines[1] == "nan,1,,0.5"
+    assert lines[2] == '"a,""b""",,1,'
+    assert "nan" not in "".join(line.split(",", 1)[1] for line in lines[1:])
+
+
+def test_npy_roundtrip(tmp_path):
+    df = _matrix()
+    paths = export_matrix(_Analyzer(str(tmp_path), EXPORT_FORMAT="npy"), df, "m")
+
+    restored = read_matrix(paths[0])
+
+    np.testing.assert_allclose(restored.to_numpy(), df.to_numpy(), rtol=1e-6)
+    np.testing.assert_array_equal(restored.index.to_numpy(), df.index.to_numpy())
+    assert list(restored.columns) == list(df.columns)
+
+
+def test_parquet_roundtrip(tmp_path):
+    pytest.importorskip("pyarrow")
+    df = _matrix()
+    paths = export_matrix(_Analyzer(str(tmp_path), EXPORT_FORMAT="parquet"), df, "m")
+
+    pd.testing.assert_frame_equal(read_matrix(paths[0]), df)
+
+
+def test_cube_axes_and_attrs(tmp_path):
+    values = np.arange(24, dtype=float).reshape(2, 3, 4)
+    axes = {"window": [5, 10], "time": [0, 1, 2], "listener": list("abcd")}
+    npy_path, json_path = export_cube(
+        _Analyzer(str(tmp_path)), values, axes, "cube", attrs={"ranks": "local"}
+    )
+
+    with open(json_path, encoding="utf-8") as f:
+        meta = json.load(f)
+
+    np.testing.assert_array_equal(np.load(npy_path), values)
+    assert meta["shape"] == [2, 3, 4]
+    assert meta["axes"]["listener"] == list("abcd")
+    assert meta["ranks"] == "local"
@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+import pytest
+from granger import GrangerEngine, GrangerModule
+
+pytest.importorskip("statsmodels")
+
+
+def _pair(seed=0, n=600):
+    """Referencja x wpływa na słuchacza y z opóźnieniem 3 próbek."""
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=n)
+    y = np.zeros(n)
+    for t in range(3, n):
+        y[t] = 0.3 * y[t - 1] + 0.5 * x[t - 3] + rng.normal()
+    return y, x
+
+
+def _run_granger(analyzer, **cfg):
+    analyzer.cfg.update(GRANGER_CACHE=False, **cfg)
+    module = GrangerModule(analyzer)
+    module.run_analysis()
+    return module.results_df.set_index("listener_id")
+
+
+def test_common_bic_matches_ols_on_common_sample():
+    import statsmodels.api as sm
+
+    y, x = _pair(seed=3)
+    maxlag = 8
+    engine = GrangerEngine(y)
+    for lag in range(1, maxlag + 1):
+        columns = [y[maxlag - k : len(y) - k] for k in range(1, lag + 1)]
+        columns += [x[maxlag - k : len(x) - k] for k in range(1, lag + 1)]
+        model = sm.OLS(y[maxlag:], sm.add_constant(np.column_stack(columns))).fit()
+        bic = engine.common_bic(lag, {"x": x}, maxlag)["x"]
+        assert bic == pytest.approx(model.bic, rel=1e-12)
+
+
+def _statsmodels_ftest(target, cause, maxlag):
+    from statsmodels.tsa.stattools import grangercausalitytests
+
+    result = grangercausalitytests(
+        np.column_stack([target, cause]), maxlag=maxlag, verbose=False
+    )
+    return {lag: result[lag][0]["ssr_ftest"][:2] for lag in result}
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_engine_matches_grangercausalitytests():
+    y, x = _pair()
+    z = np.random.default_rng(1).normal(size=len(y))
+    expected = {
+        "x": _statsmodels_ftest(y, x, 6),
+        "z": _statsmodels_ftest(y, z, 6),
+    }
+
+    engine = GrangerEngine(y)
+    for lag in range(1, 7):
+        results = engine.test(lag, {"x": x, "z": z})
+        for ref in ("x", "z"):
+            f_stat, p_value, _ = results[ref]
+            f_ref, p_ref = expected[ref][lag]
+            assert f_stat == pytest.approx(f_ref, rel=1e-12, abs=1e-12)
+            assert p_value == pytest.approx(p_ref, rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_reverse_direction_matches_swapped_columns():
+    y, x = _pair(seed=2)
+    expected = _statsmodels_ftest(x, y, 4)
+
+    engine = GrangerEngine(y, reverse_cache={})
+    for lag in range(1, 5):
+        engine.test(lag, {"x": x})
+        f_stat, p_value, _ = engine.reverse_stats["x"][lag]
+        f_ref, p_ref = expected[lag]
+        assert f_stat == pytest.approx(f_ref, rel=1e-12, abs=1e-12)
+        assert p_value == pytest.approx(p_ref, rel=1e-9, abs=1e-12)
+
+
+def test_bidirectional_run_reports_net_direction(make_analyzer, response_frame):
+    analyzer = make_analyzer(response_frame(lag=3))
+    one_way = _run_granger(analyzer)
+    both = _run_granger(analyzer, GRANGER_BIDIRECTIONAL=True)
+
+    # Kierunek referencja -> słuchacz bez zmian, test odwrotny dopisany obok
+    pd.testing.assert_frame_equal(both[one_way.columns], one_way)
+    followers = ["u0", "u2", "u4"]  # Kompozytor wyprzedza ich o 3 próbki
+    assert (both.loc[followers, "direction"] == "reference->listener").all()
+    assert not both.loc[followers, "reverse_is_causal"].any()
+    assert "direction" not in one_way.columns
+
+
+def test_reference_list_gives_rows_per_reference(make_analyzer, response_frame):
+    analyzer = make_analyzer(response_frame(), COMPOSER_ID=["comp", "u0"])
+    results = _run_granger(analyzer).reset_index()
+
+    assert len(results) == 2 * 5  # Referencje nie są testowane jako słuchacze
+    assert set(results["reference"]) == {"comp", "u0"}
+    assert "u0" not in set(results["listener_id"])
+    assert set(analyzer.causal_lags_by_reference) == {"comp", "u0"}
+    assert analyzer.causal_listeners_lags == analyzer.causal_lags_by_reference["comp"]
+    assert {"u2", "u4"} <= set(analyzer.causal_listeners_lags)
+
+
+def test_coarse_search_finds_full_search_lags(make_analyzer, response_frame):
+    analyzer = make_analyzer(response_frame(lag=3))
+    full = _run_granger(analyzer, GRANGER_LAG_SEARCH="full")
+    coarse = _run_granger(analyzer, GRANGER_LAG_SEARCH="coarse")
+
+    maxlag = analyzer.seconds_to_samples(analyzer.cfg["GRANGER_MAX_LAG_SEC"])
+    assert (full["lags_evaluated"] == maxlag).all()
+    assert (coarse["lags_evaluated"] < maxlag).all()
+    causal = ["u0", "u2", "u4"]  # Słuchacze powtarzający kompozytora
+    assert full.loc[causal, "is_causal"].all()
+    assert coarse.loc[causal, "is_causal"].all()
+    # Doprecyzowanie wokół siatki trafia w maksimum F pełnego przeszukania
+    # (nie wcześniej niż rzeczywiste opóźnienie 3 próbek)
+    assert (full.loc[causal, "best_lag_samples"] >= 3).all()
+    np.testing.assert_array_equal(
+        coarse.loc[causal, "best_lag_samples"], full.loc[causal, "best_lag_samples"]
+    )
+    np.testing.assert_allclose(coarse.loc[causal, "f_stat"], full.loc[causal, "f_stat"])
+
+
+def test_ic_search_stops_early_on_common_sample_bic(make_analyzer, response_frame):
+    analyzer = make_analyzer(response_frame(lag=3), GRANGER_IC_PATIENCE=4)
+    ic = _run_granger(analyzer, GRANGER_LAG_SEARCH="ic")
+
+    maxlag = analyzer.seconds_to_samples(analyzer.cfg["GRANGER_MAX_LAG_SEC"])
+    assert (ic["lags_evaluated"] < maxlag).all()
+    assert ic.loc[["u0", "u2", "u4"], "is_causal"].all()
+
+    # Zatrzymanie: patience lagów po minimum BIC na wspólnej próbie
+    engine = GrangerEngine(analyzer.df_diff["u0"].to_numpy(dtype=float))
+    reference = {"comp": analyzer.df_diff["comp"].to_numpy(dtype=float)}
+    bics = [
+        engine.common_bic(lag, reference, maxlag)["comp"]
+        for lag in range(1, maxlag + 1)
+    ]
+    best, evaluated = 0, 0
+    for lag, bic in enumerate(bics, start=1):
+        evaluated = lag
+        if bic < bics[best]:
+            best = lag - 1
+        elif lag - 1 - best >= 4:
+            break
+    assert ic.loc["u0", "lags_evaluated"] == evaluated
+
+
+def _cached_run(analyzer, cache_file, capsys):
+    analyzer.cfg.update(GRANGER_CACHE=True, GRANGER_CACHE_FILE=str(cache_file))
+    module = GrangerModule(analyzer)
+    module.run_analysis()
+    summary = [
+        line for line in capsys.readouterr().out.splitlines() if "Cache:" in line
+    ]
+    return module.results_df.set_index("listener_id"), summary[0]
+
+
+def test_cache_resumes_interrupted_run(make_analyzer, response_frame, tmp_path, capsys):
+    analyzer = make_analyzer(response_frame(seconds=30))
+    cache_file = tmp_path / "cache.jsonl"
+    first, summary = _cached_run(analyzer, cache_file, capsys)
+    assert "0 z pliku, 6 policzonych" in summary
+
+    # Przerwanie w trakcie zapisu: dwa pełne wpisy i urwana linia
+    lines = cache_file.read_text(encoding="utf-8").splitlines(keepends=True)
+    cache_file.write_text("".join(lines[:2]) + lines[2][:20], encoding="utf-8")
+    resumed, summary = _cached_run(analyzer, cache_file, capsys)
+
+    assert "2 z pliku, 4 policzonych" in summary
+    pd.testing.assert_frame_equal(resumed.sort_index(), first.sort_index())
+    _, summary = _cached_run(analyzer, cache_file, capsys)
+    assert "6 z pliku, 0 policzonych" in summary
+
+
+def test_cache_key_survives_added_record(
+    make_analyzer, response_frame, tmp_path, capsys
+):
+    df = response_frame(seconds=30)
+    cache_file = tmp_path / "cache.jsonl"
+    _cached_run(make_analyzer(df), cache_file, capsys)
+
+    # Nowe nagranie poza wspólnym zegarem zmienia siatkę czasu wszystkich kolumn
+    extra = df[df["record_id"] == "u1"].assign(
+        record_id="u6", timestamp=lambda d: d["timestamp"] + 25.0
+    )
+    grown = make_analyzer(pd.concat([df, extra]), csv_name="grown.csv")
+    assert len(grown.df_pivot) > df["timestamp"].nunique()
+    results, summary = _cached_run(grown, cache_file, capsys)
+
+    assert "6 z pliku, 1 policzonych" in summary
+    assert "u6" in results.index
+
+    # Zmiana próbek jednego nagrania unieważnia tylko jego wpis
+    changed = df.copy()
+    changed.loc[changed["record_id"] == "u3", "value"] *= 0.5
+    _, summary = _cached_run(
+        make_analyzer(changed, csv_name="changed.csv"), cache_file, capsys
+    )
+    assert "5 z pliku, 1 policzonych" in summary
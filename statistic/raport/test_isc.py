@@ -0,0 +1,40 @@
+import numpy as np
+from isc import leave_one_out_isc
+
+
+def _brute_force(values, window):
+    """Wzorzec: np.corrcoef słuchacza ze średnią pozostałych, okno po oknie."""
+    n_samples, n_listeners = values.shape
+    windowed = np.full((n_samples, n_listeners), np.nan)
+    overall = np.empty(n_listeners)
+    for i in range(n_listeners):
+        others = np.delete(values, i, axis=1).mean(axis=1)
+        overall[i] = np.corrcoef(values[:, i], others)[0, 1]
+        for end in range(window - 1, n_samples):
+            part = slice(end - window + 1, end + 1)
+            windowed[end, i] = np.corrcoef(values[part, i], others[part])[0, 1]
+    return windowed, overall
+
+
+def test_leave_one_out_isc_matches_corrcoef():
+    rng = np.random.default_rng(0)
+    shared = np.cumsum(rng.normal(size=400))
+    values = shared[:, None] + 3 * rng.normal(size=(400, 7))
+
+    # Blok mniejszy niż liczba słuchaczy - sprawdza też podział na bloki
+    windowed, overall = leave_one_out_isc(values, 50, block=3)
+    expected_windowed, expected_overall = _brute_force(values, 50)
+
+    np.testing.assert_allclose(windowed, expected_windowed, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(overall, expected_overall, rtol=0, atol=1e-9)
+
+
+def test_constant_window_gives_nan():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(100, 4))
+    values[:30, 0] = 1.0
+
+    windowed, _ = leave_one_out_isc(values, 20)
+
+    assert np.isnan(windowed[19:30, 0]).all()
+    assert np.isfinite(windowed[19:, 1:]).all()
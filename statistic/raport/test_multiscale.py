@@ -0,0 +1,84 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from granger import GrangerModule
+from multiscale import MultiScaleNarrativeModule, multiscale_global_ranks
+from narrative import fill_trajectory_gaps, pair_series, rolling_spearman
+from scipy.stats import rankdata
+
+pytest.importorskip("statsmodels")
+
+
+def test_global_ranks_match_windowed_pearson_of_global_ranks():
+    rng = np.random.default_rng(0)
+    values = np.round(np.cumsum(rng.normal(size=(150, 3)), axis=0), 1)
+    series = {"ref": values[:, 0], "a": values[:, 1], "b": values[:, 2]}
+    lags = {"ref": {"a": 0, "b": 4}}
+    windows = [5, 20, 60]
+
+    cube = multiscale_global_ranks(series, lags, windows)["ref"]
+
+    ranks = {rid: rankdata(v) for rid, v in series.items()}
+    assert cube.shape == (3, 150, 2)
+    for w, window in enumerate(windows):
+        for j, (listener, lag) in enumerate(lags["ref"].items()):
+            for t in range(150):
+                first = max(t - window + 1, lag)
+                if t < window - 1 or t + 1 - first <= 2:
+                    assert np.isnan(cube[w, t, j])
+                    continue
+                x = ranks[listener][first : t + 1]
+                y = ranks["ref"][first - lag : t + 1 - lag]
+                expected = np.corrcoef(x, y)[0, 1]
+                assert cube[w, t, j] == pytest.approx(expected, abs=1e-12)
+
+
+def _multiscale(analyzer, **cfg):
+    analyzer.cfg.update(GRANGER_CACHE=False, NARRATIVE_WINDOWS_SEC=[2, 5], **cfg)
+    GrangerModule(analyzer).run_analysis()
+    module = MultiScaleNarrativeModule(analyzer)
+    module.run_analysis()
+    return module
+
+
+def test_default_is_one_sweep_global_ranks(make_analyzer, response_frame, capsys):
+    analyzer = make_analyzer(response_frame(seconds=30))
+    module = _multiscale(analyzer)
+
+    assert module.rank_mode == "global"
+    assert "przybliżenie Spearmana" in capsys.readouterr().out
+    lags = analyzer.causal_lags_by_reference
+    series = pair_series(analyzer.df_pivot, lags)
+    expected = multiscale_global_ranks(series, lags, [40, 100])["comp"]
+    for w in range(2):
+        np.testing.assert_allclose(
+            module.cubes["comp"][w],
+            fill_trajectory_gaps(pd.DataFrame(expected[w])),
+        )
+
+    module.export_results()
+    with open(
+        analyzer.get_output_path(
+            "narrative_multiscale", prefix="02_", extension=".json"
+        ),
+        encoding="utf-8",
+    ) as f:
+        meta = json.load(f)
+    assert meta["ranks"] == "global"
+    assert meta["statistic"] == "global-rank approximation of spearman"
+
+
+def test_local_mode_matches_narrative_rolling_spearman(make_analyzer, response_frame):
+    analyzer = make_analyzer(response_frame(seconds=30))
+    module = _multiscale(analyzer, NARRATIVE_MULTISCALE_RANKS="local")
+
+    lags = analyzer.causal_lags_by_reference
+    series = pair_series(analyzer.df_pivot, lags)
+    # Okno 5 s = WINDOW_SECONDS - ten sam wynik co NarrativeModule
+    narrative = rolling_spearman(series, lags, 100, progress=False)["comp"]
+    np.testing.assert_allclose(
+        module.cubes["comp"][1],
+        fill_trajectory_gaps(pd.DataFrame(narrative)),
+    )
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+from plotting import (
+    block_mean,
+    decimate_series,
+    lttb_decimate,
+    minmax_decimate,
+    render_similarity_heatmap,
+)
+
+
+def test_block_mean_averages_blocks_and_ignores_padding():
+    matrix = np.arange(35, dtype=float).reshape(5, 7)
+
+    result = block_mean(matrix, 3)
+
+    assert result.shape == (2, 3)
+    for i, rows in enumerate((slice(0, 3), slice(3, 5))):
+        for j, cols in enumerate((slice(0, 3), slice(3, 6), slice(6, 7))):
+            assert result[i, j] == pytest.approx(matrix[rows, cols].mean())
+
+
+def test_heatmap_uses_linkage_order_and_block_averaging(tmp_path, capsys):
+    pytest.importorskip("matplotlib")
+    from scipy.cluster.hierarchy import linkage
+
+    rng = np.random.default_rng(0)
+    signals = rng.normal(size=(50, 30))
+    labels = [f"u{i}" for i in range(30)]
+    similarity = pd.DataFrame(np.corrcoef(signals.T), index=labels, columns=labels)
+    linkage_matrix = linkage(signals.T, method="average", metric="correlation")
+    img_path = str(tmp_path / "heatmap.png")
+
+    saved = render_similarity_heatmap(
+        similarity,
+        linkage_matrix,
+        img_path,
+        "test",
+        {"HEATMAP_MAX_CELLS": 10, "HEATMAP_TILE_SIZE": 16},
+    )
+
+    assert "uśredniona blokami 3×3" in capsys.readouterr().out
+    # Obraz główny + kafle 2 × 2 w pełnej rozdzielczości
+    assert len(saved) == 5 and saved[0] == img_path
+    assert all((tmp_path / p).exists() for p in saved)
+
+
+def test_minmax_decimate_keeps_bucket_extremes_in_time_order():
+    rng = np.random.default_rng(1)
+    x = np.arange(1000) * 50.0
+    values = rng.normal(size=(1000, 3))
+    values[100:150, 2] = np.nan
+
+    x_out, y_out = minmax_decimate(x, values, 100)
+
+    assert x_out.shape == y_out.shape == (200, 3)
+    # Serie bez braków: para (min, max) każdego kubełka 10 próbek
+    blocks = values[:, :2].reshape(100, 10, 2)
+    pairs = np.sort(y_out[:, :2].reshape(100, 2, 2), axis=1)
+    np.testing.assert_array_equal(pairs[:, 0], blocks.min(axis=1))
+    np.testing.assert_array_equal(pairs[:, 1], blocks.max(axis=1))
+    assert (np.diff(x_out, axis=0) >= 0).all()
+    # Kubełek złożony z samych NaN zostaje przerwą w linii
+    assert np.isnan(y_out[20:30, 2]).all()
+    assert not np.isnan(y_out[:20, 2]).any()
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x = np.arange(2000, dtype=float)
+    values = np.zeros((2000, 2))
+    values[777, 0] = 10.0
+    values[1500, 1] = -10.0
+
+    x_out, y_out = lttb_decimate(x, values, 100)
+
+    assert x_out.shape == (100, 2)
+    np.testing.assert_array_equal(x_out[[0, -1]], [[0, 0], [1999, 1999]])
+    assert 777 in x_out[:, 0] and 1500 in x_out[:, 1]
+    assert (np.diff(x_out, axis=0) > 0).all()
+
+
+def test_decimate_series_passes_short_series_through():
+    x = np.arange(100, dtype=float)
+    values = np.sin(x / 10)
+
+    x_out, y_out = decimate_series(x, values, {"PLOT_MAX_POINTS": 50})
+    np.testing.assert_array_equal(y_out, values)
+
+    x_out, y_out = decimate_series(x, values, {"PLOT_MAX_POINTS": 20})
+    assert x_out.shape == y_out.shape == (40,)
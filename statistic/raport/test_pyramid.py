@@ -0,0 +1,59 @@
+import json
+import os
+
+import numpy as np
+from pyramid import PyramidModule, pyramid_levels
+
+
+def test_levels_match_direct_bucket_reductions():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(1000, 3))
+
+    levels = pyramid_levels(values, factor=4, min_buckets=20)
+
+    assert [size for size, _ in levels] == [1, 4, 16, 64]
+    np.testing.assert_array_equal(levels[0][1]["value"], values)
+    for size, channels in levels[1:]:
+        # Kubełki liczone wprost z próbek (ostatni niepełny)
+        n_buckets = -(-len(values) // size)
+        assert channels["mean"].shape == (n_buckets, 3)
+        for b in range(n_buckets):
+            bucket = values[b * size : (b + 1) * size]
+            np.testing.assert_allclose(channels["mean"][b], bucket.mean(axis=0))
+            np.testing.assert_array_equal(channels["min"][b], bucket.min(axis=0))
+            np.testing.assert_array_equal(channels["max"][b], bucket.max(axis=0))
+
+
+def test_export_writes_chunks_described_by_manifest(make_analyzer, response_frame):
+    analyzer = make_analyzer(
+        response_frame(seconds=30),
+        PYRAMID_FACTOR=4,
+        PYRAMID_MIN_BUCKETS=50,
+        PYRAMID_CHUNK=100,
+        PYRAMID_DTYPE="float16",
+    )
+    module = PyramidModule(analyzer)
+    module.run_analysis()
+    module.export_results()
+
+    root = analyzer.get_output_path(base_name="pyramid", prefix="07_", extension="")
+    with open(os.path.join(root, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    layer = manifest["layers"]["records"]
+    assert manifest["n_samples"] == 600 and manifest["sample_ms"] == 50.0
+    assert [level["bucket_samples"] for level in layer["levels"]] == [1, 4, 16]
+
+    # Odczyt jak w przeglądarce: porcje sklejone wzdłuż osi kubełków
+    level = layer["levels"][1]  # 150 kubełków w dwóch porcjach
+    parts = [
+        np.fromfile(os.path.join(root, c["file"]), dtype="<f2").reshape(
+            len(level["channels"]), len(layer["series"]), c["n_buckets"]
+        )
+        for c in level["chunks"]
+    ]
+    assert len(parts) == 2
+    data = np.concatenate(parts, axis=2)
+    expected = pyramid_levels(analyzer.df_raw.to_numpy(), 4, 50)[1][1]
+    for i, channel in enumerate(level["channels"]):
+        np.testing.assert_allclose(data[i], expected[channel].T, rtol=1e-3, atol=0.05)
+    assert [s["id"] for s in layer["series"]] == list(analyzer.df_raw.columns)
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+from narrative import rolling_spearman
+from ranks import BlockRankMoments, rank_columns, window_ranks
+from scipy.stats import rankdata
+
+
+def _series(seed=0, n=300, n_listeners=3):
+    """Szeregi z remisami (zaokrąglenie) - rangi średnie mają znaczenie."""
+    rng = np.random.default_rng(seed)
+    return np.round(np.cumsum(rng.normal(size=(n, n_listeners + 1)), axis=0), 1)
+
+
+def _rolling_rank_corr(x, y, window):
+    """Wzorzec: rolling().corr() pandas na rangach liczonych w każdym oknie."""
+    out = np.full(len(x), np.nan)
+    for end in range(window - 1, len(x)):
+        pair = pd.DataFrame(
+            {
+                "x": rankdata(x[end - window + 1 : end + 1]),
+                "y": rankdata(y[end - window + 1 : end + 1]),
+            }
+        )
+        out[end] = pair["x"].rolling(window).corr(pair["y"]).iloc[-1]
+    return out
+
+
+def test_window_ranks_match_rankdata():
+    values = _series()[:, 0]
+    window = 25
+    ranks = window_ranks(values, window, 40, 120)
+    for row, end in enumerate(range(40, 120)):
+        expected = rankdata(values[end - window + 1 : end + 1]) - (window + 1) / 2
+        np.testing.assert_allclose(ranks[row], expected, rtol=0, atol=1e-12)
+
+
+def test_rolling_spearman_matches_rolling_corr_on_ranks():
+    values = _series(seed=1)
+    window = 30
+    series = {"ref": values[:, 0], "a": values[:, 1], "b": values[:, 2]}
+    lags = {"ref": {"a": 0, "b": 5}}
+
+    result = rolling_spearman(series, lags, window, chunk=64, progress=False)["ref"]
+
+    np.testing.assert_allclose(
+        result[:, 0],
+        _rolling_rank_corr(series["a"], series["ref"], window),
+        rtol=0,
+        atol=1e-12,
+    )
+    # Lag 5: pełne okna od window - 1 + lag
+    shifted = pd.Series(series["ref"]).shift(5).to_numpy()
+    expected = _rolling_rank_corr(series["b"][5:], shifted[5:], window)
+    np.testing.assert_allclose(
+        result[window - 1 + 5 :, 1], expected[window - 1 :], rtol=0, atol=1e-12
+    )
+    # Wcześniej okna częściowe - Spearman na parach bez braków
+    for end in range(window - 1, window - 1 + 5):
+        pair = pd.DataFrame({"x": series["b"], "y": shifted})[: end + 1]
+        expected_partial = pair.iloc[-window:].dropna().corr("spearman").iloc[0, 1]
+        assert result[end, 1] == pytest.approx(expected_partial, abs=1e-12)
+    assert np.isnan(result[: window - 1]).all()
+
+
+def test_block_moments_give_spearman_of_selected_blocks():
+    values = _series(seed=2, n=240, n_listeners=4)
+    moments = BlockRankMoments(values, block_len=40)
+    ranks = rank_columns(values)
+
+    # Pojedynczy blok z rangami globalnymi = Pearson rang globalnych w bloku
+    np.testing.assert_allclose(
+        moments.block_correlation(2), np.corrcoef(ranks[80:120].T), atol=1e-12
+    )
+
+    # Wagi bootstrapu: blok 0 dwa razy, blok 3 raz
+    weights = np.zeros(len(moments))
+    weights[[0, 3]] = [2, 1]
+    sample = np.concatenate([ranks[0:40], ranks[0:40], ranks[120:160]])
+    np.testing.assert_allclose(
+        moments.correlation(weights), np.corrcoef(sample.T), atol=1e-12
+    )
+
+    # Wszystkie bloki - dokładny Spearman całego nagrania
+    np.testing.assert_allclose(
+        moments.correlation(), pd.DataFrame(values).corr("spearman"), atol=1e-12
+    )
+
+
+def test_block_moments_memmap_pickle(tmp_path):
+    import pickle
+
+    values = _series(seed=3, n=200)
+    moments = BlockRankMoments(values, block_len=50, path=str(tmp_path / "x.npy"))
+    restored = pickle.loads(pickle.dumps(moments))
+
+    assert isinstance(restored.cross, np.memmap)
+    np.testing.assert_array_equal(restored.correlation(), moments.correlation())
+    with pytest.raises(ValueError):
+        restored.cross[0, 0, 0] = 1.0  # Tylko do odczytu
@@ -0,0 +1,28 @@
+import numpy as np
+from segmented import match_labels
+
+
+def test_permuted_labels_are_mapped_back():
+    previous = np.array([1, 1, 2, 2, 3, 3])
+    current = np.array([3, 3, 1, 1, 2, 2])
+
+    np.testing.assert_array_equal(match_labels(previous, current), previous)
+
+
+def test_best_overlap_wins():
+    previous = np.array([1, 1, 1, 2, 2, 2])
+    current = np.array([5, 5, 7, 7, 7, 7])
+
+    # 7 ma 3 wspólnych z 2 (i 1 z 1) - dostaje numer 2, 5 dostaje 1
+    np.testing.assert_array_equal(match_labels(previous, current), [1, 1, 2, 2, 2, 2])
+
+
+def test_extra_cluster_gets_new_id():
+    previous = np.array([1, 1, 2, 2, 2, 2])
+    current = np.array([1, 1, 2, 2, 3, 3])
+
+    result = match_labels(previous, current)
+
+    np.testing.assert_array_equal(result[:4], [1, 1, 2, 2])
+    assert result[4] == result[5]
+    assert result[4] not in (1, 2)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from clustering import ClusteringModule
+from granger import GrangerModule
+from narrative import pair_series, rolling_spearman
+from scipy.cluster.hierarchy import fcluster
+from sweep import SweepModule
+
+pytest.importorskip("statsmodels")
+
+GRID = {
+    "WINDOW_SECONDS": [3, 5],
+    "GRANGER_MAX_LAG_SEC": [0.1, 1.0],
+    "GRANGER_P_VALUE_THRESHOLD": [0.05, 0.001],
+    "CLUSTER_THRESHOLD_RATIO": [0.2, 0.9],
+}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sweep_rows_match_separate_runs(make_analyzer, response_frame, workers):
+    analyzer = make_analyzer(
+        response_frame(n_listeners=8, seconds=40),
+        GRANGER_CACHE=False,
+        SWEEP_GRID=GRID,
+        SWEEP_WORKERS=workers,
+    )
+    clustering = ClusteringModule(analyzer)
+    clustering.run_analysis()
+    sweep = SweepModule(analyzer, clustering)
+    table = sweep.run_analysis()
+
+    assert len(table) == 16
+    # Siatka rozróżnia punkty (lag 3 próbek poza GRANGER_MAX_LAG_SEC=0.1)
+    assert table["n_causal"].nunique() > 1 and table["n_clusters"].nunique() > 1
+    top = clustering.linkage_matrix[:, 2].max()
+    for _, row in table.iterrows():
+        # Ten sam punkt siatki liczony osobnym biegiem etapów
+        analyzer.cfg.update(
+            GRANGER_MAX_LAG_SEC=row["GRANGER_MAX_LAG_SEC"],
+            GRANGER_P_VALUE_THRESHOLD=row["GRANGER_P_VALUE_THRESHOLD"],
+        )
+        causal = GrangerModule(analyzer).run_analysis()
+        assert row["n_causal"] == len(causal)
+        if causal:
+            lags = np.array(list(causal.values()))
+            assert row["median_lag_sec"] == pytest.approx(np.median(lags) / 20)
+
+            window = analyzer.seconds_to_samples(row["WINDOW_SECONDS"])
+            pairs = {"comp": causal}
+            rho = rolling_spearman(
+                pair_series(analyzer.df_pivot, pairs), pairs, window, progress=False
+            )["comp"]
+            assert row["narrative_rho"] == pytest.approx(np.nanmean(rho), abs=1e-12)
+        else:
+            assert np.isnan(row["narrative_rho"])
+
+        labels = fcluster(
+            clustering.linkage_matrix,
+            t=row["CLUSTER_THRESHOLD_RATIO"] * top,
+            criterion="distance",
+        )
+        assert row["n_clusters"] == len(np.unique(labels))
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from cohort import ALL_GROUPS, cohort_sweep
+
+
+def _records(n=80, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            # Zaokrąglenie daje remisy - sprawdza korektę remisów
+            "correlation": np.round(rng.normal(0.3, 0.2, size=n), 2),
+            "p_value": rng.uniform(size=n),
+            "gender": rng.choice(["k", "m"], size=n),
+            "age": rng.choice(["18-25", "25-35", "35-50"], size=n),
+        }
+    )
+
+
+def test_kruskal_matches_scipy_for_every_combination():
+    df = _records()
+    _, tests = cohort_sweep(df, ["gender", "age"])
+
+    for combo in (["gender"], ["age"], ["gender", "age"]):
+        samples = [g["correlation"].to_numpy() for _, g in df.groupby(combo)]
+        expected = stats.kruskal(*samples)
+        row = tests[tests["combination"] == " × ".join(combo)].iloc[0]
+        assert row["n_groups"] == len(samples)
+        assert row["kruskal_h"] == pytest.approx(expected.statistic, rel=1e-12)
+        assert row["kruskal_p"] == pytest.approx(expected.pvalue, rel=1e-9)
+
+    assert np.isnan(tests.loc[tests["combination"] == "all", "kruskal_h"]).all()
+
+
+def test_group_statistics_match_groupby():
+    df = _records(seed=1)
+    groups, _ = cohort_sweep(df, ["gender", "age"], alpha=0.1)
+
+    rows = groups[(groups["combination"] == "age")].set_index("age")
+    assert (rows["gender"] == ALL_GROUPS).all()
+    expected = df.groupby("age")["correlation"].agg(["size", "mean", "std"])
+    np.testing.assert_array_equal(rows["n"], expected["size"])
+    np.testing.assert_allclose(rows["mean_rho"], expected["mean"], atol=1e-12)
+    np.testing.assert_allclose(rows["std_rho"], expected["std"], atol=1e-12)
+    share = (df["p_value"] < 0.1).groupby(df["age"]).mean()
+    np.testing.assert_allclose(rows["share_significant"], share, atol=1e-12)
+
+
+@pytest.mark.parametrize("n", [0, 1])
+def test_too_few_records_skip_tests(n):
+    df = _records(n=n, seed=2)
+    with np.errstate(all="raise"):
+        _, tests = cohort_sweep(df, ["gender", "age"])
+    assert tests["kruskal_h"].isna().all()
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from func import batch_spearman_correlation, calculate_spearman_correlation
+
+
+def test_batch_spearman_matches_scipy_with_ties():
+    rng = np.random.default_rng(0)
+    reference = np.round(rng.normal(size=200), 1)
+    matrix = np.round(
+        reference[:, None] * [0.2, 0.8, -0.5] + rng.normal(size=(200, 3)), 1
+    )
+
+    rho, p_value = batch_spearman_correlation(matrix, reference)
+
+    for j in range(matrix.shape[1]):
+        expected = stats.spearmanr(matrix[:, j], reference)
+        assert rho[j] == pytest.approx(expected.statistic, abs=1e-12)
+        assert p_value[j] == pytest.approx(expected.pvalue, rel=1e-9, abs=1e-300)
+
+
+def test_batch_spearman_matches_single_pair_without_ties():
+    rng = np.random.default_rng(1)
+    reference = rng.normal(size=50)
+    matrix = rng.normal(size=(50, 4))
+
+    rho, p_value = batch_spearman_correlation(matrix, reference)
+
+    for j in range(matrix.shape[1]):
+        expected_rho, expected_p = calculate_spearman_correlation(
+            matrix[:, j], reference
+        )
+        assert rho[j] == pytest.approx(expected_rho, abs=1e-12)
+        assert p_value[j] == pytest.approx(expected_p, rel=1e-9)
+
+
+def test_batch_spearman_constant_column_and_short_input():
+    rng = np.random.default_rng(2)
+    matrix = np.column_stack([np.ones(30), rng.normal(size=30)])
+
+    rho, _ = batch_spearman_correlation(matrix, rng.normal(size=30))
+    assert np.isnan(rho[0]) and np.isfinite(rho[1])
+
+    rho, p_value = batch_spearman_correlation(matrix[:2], [1.0, 2.0])
+    np.testing.assert_array_equal(rho, [0.0, 0.0])
+    np.testing.assert_array_equal(p_value, [1.0, 1.0])
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from gemini import rolling_pearson
+
+
+def _expected(data, reference, lags, window):
+    """Reference: pandas rolling(window).corr with the composer shifted by lag."""
+    composer = pd.Series(reference)
+    return np.column_stack(
+        [
+            pd.Series(data[:, i]).rolling(window).corr(composer.shift(lag))
+            for i, lag in enumerate(lags)
+        ]
+    )
+
+
+@pytest.mark.parametrize("stable", [True, False])
+def test_rolling_pearson_matches_pandas(stable):
+    rng = np.random.default_rng(0)
+    reference = rng.normal(size=3000)
+    data = np.column_stack(
+        [np.roll(reference, lag) + rng.normal(size=3000) for lag in (0, 3, 10)]
+    )
+    data[500:520, 1] = np.nan  # Braki - okna z brakiem dają NaN jak w pandas
+    lags = [0, 3, 10]
+
+    result = rolling_pearson(data, reference, lags, 200, stable=stable)
+    expected = _expected(data, reference, lags, 200)
+
+    np.testing.assert_array_equal(np.isnan(result), np.isnan(expected))
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-10)
+
+
+def test_rolling_pearson_default_is_stable_on_offset_data():
+    rng = np.random.default_rng(1)
+    reference = np.cumsum(rng.normal(size=20000)) + 1e4
+    data = np.cumsum(rng.normal(size=(20000, 2)), axis=0) + 1e4
+    lags = [0, 40]
+
+    result = rolling_pearson(data, reference, lags, 750)
+    expected = _expected(data, reference, lags, 750)
+
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-8)
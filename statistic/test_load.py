@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+from load import RaggedSeries, difference_data, make_time_grid, standardize_data
+
+
+def _frame():
+    """Long frame in export order: rows shuffled, records interleaved."""
+    rng = np.random.default_rng(0)
+    rows = []
+    for record, label, n in [
+        ("global:a", "A", 5),
+        ("global:b", "B", 3),
+        ("global:c", "KOMPOZYTOR", 4),
+    ]:
+        times = np.sort(rng.choice(np.arange(0, 2000, 50), size=n, replace=False))
+        for t in times:
+            rows.append(
+                {
+                    "record_id": record,
+                    "label": label,
+                    "timestamp": float(t),
+                    "value": float(rng.integers(0, 100)),
+                }
+            )
+    return pd.DataFrame(rows).sample(frac=1, random_state=1).reset_index(drop=True)
+
+
+def test_from_frame_splits_sorted_segments():
+    df = _frame()
+    series = RaggedSeries.from_frame(df)
+
+    assert len(series) == 3
+    assert series.is_compact()
+    for (record, label), values in series.items():
+        part = df[(df["record_id"] == record) & (df["label"] == label)]
+        np.testing.assert_array_equal(values, part.sort_values("timestamp")["value"])
+
+
+def test_filtering_shares_buffer_and_compact_copies_once():
+    series = RaggedSeries.from_frame(_frame())
+
+    selected = series.xs("B")
+    assert selected.values is series.values
+    assert not selected.is_compact()
+    np.testing.assert_array_equal(selected.segment(0), series[("global:b", "B")])
+
+    compact = selected.compact()
+    assert compact.is_compact()
+    np.testing.assert_array_equal(compact.values, series[("global:b", "B")])
+    np.testing.assert_array_equal(
+        compact.timestamps,
+        series.timestamps[series.starts[1] : series.starts[1] + series.lengths[1]],
+    )
+
+
+def test_align_to_grid_is_sample_and_hold():
+    series = RaggedSeries.from_frame(_frame())
+    selected = series[np.array([True, False, True])]
+    grid = make_time_grid(0, 2000, 20)
+
+    aligned = selected.align_to_grid(grid)
+
+    assert aligned.shape == (len(grid), 2)
+    for j, i in enumerate(np.flatnonzero([True, False, True])):
+        start, length = series.starts[i], series.lengths[i]
+        ts = series.timestamps[start : start + length]
+        values = series.values[start : start + length]
+        # Ostatnia próbka w chwili t lub wcześniej; przed pierwszą - pierwsza
+        pos = np.maximum(np.searchsorted(ts, grid, side="right") - 1, 0)
+        np.testing.assert_array_equal(aligned[:, j], values[pos])
+
+
+def _standardize_array(arr):
+    """Per-record reference (Series-of-ndarrays ``.apply`` version)."""
+    arr = arr.astype(float)
+    std = arr.std()
+    return arr - arr.mean() if std == 0 else (arr - arr.mean()) / std
+
+
+def _diff_array(arr):
+    arr = arr.astype(float)
+    if len(arr) <= 1:
+        return arr
+    return np.concatenate([[0.0], np.diff(arr)])
+
+
+def _mixed_series():
+    """Random records plus a constant and a single-sample record."""
+    df = _frame()
+    extra = pd.DataFrame(
+        {
+            "record_id": ["global:d"] * 4 + ["global:e"],
+            "label": ["D"] * 4 + ["E"],
+            "timestamp": [0.0, 50.0, 100.0, 150.0, 0.0],
+            "value": [7.0, 7.0, 7.0, 7.0, 3.0],
+        }
+    )
+    return RaggedSeries.from_frame(pd.concat([df, extra], ignore_index=True))
+
+
+def test_segment_transforms_match_per_record_apply():
+    series = _mixed_series()
+    # Filtered container (non-contiguous segments) exercises compact()
+    for ragged in (series, series[np.array([True, False, True, True, True])]):
+        legacy = ragged.to_series()
+        for result, reference in (
+            (standardize_data(ragged), legacy.apply(_standardize_array)),
+            (difference_data(ragged), legacy.apply(_diff_array)),
+        ):
+            assert list(result.index) == list(reference.index)
+            for (_, values), expected in zip(result.items(), reference):
+                np.testing.assert_allclose(values, expected, rtol=0, atol=1e-12)